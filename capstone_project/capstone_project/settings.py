@@ -57,8 +57,14 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'movie_review.User'
 
+# the model backend, hashing passwords on a bounded pool of LOGIN_HASH_WORKERS threads when that is set
+AUTHENTICATION_BACKENDS = ['movie_review.authentication.HashingPoolModelBackend']
+
 MIDDLEWARE = [
+    'movie_review.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'movie_review.throttling.RateLimitHeadersMiddleware',
+    'movie_review.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,6 +107,55 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite runs everything, seeding and benchmarks included, on a local SQLite file instead of MySQL
+if env('DB_ENGINE', default='mysql') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+        # concurrent writers (the votes benchmark) queue for the write lock instead of failing as locked
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+    }
+
+# read replicas of the primary, their reads go through the router below: DB_REPLICA_HOSTS lists the hosts
+# of MySQL replicas, SQLITE_REPLICA_PATHS copies of the SQLite file to try the routing out locally
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    _replicas = [{**DATABASES['default'], 'NAME': path} for path in env.list('SQLITE_REPLICA_PATHS', default=[])]
+else:
+    _replicas = [
+        {**DATABASES['default'], 'HOST': host, 'OPTIONS': {'connect_timeout': 2}}
+        for host in env.list('DB_REPLICA_HOSTS', default=[])
+    ]
+for _number, _replica in enumerate(_replicas, 1):
+    # tests run against the test database of the primary, there is no replication to mirror them
+    DATABASES[f'replica{_number}'] = {**_replica, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['movie_review.routers.PrimaryReplicaRouter']
+
+# seconds a client reads from the primary after writing, longer than the replicas ever lag behind
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+
+# seconds a replica found up or down is taken as such before it is checked again
+REPLICA_HEALTH_CHECK_INTERVAL = env.float('REPLICA_HEALTH_CHECK_INTERVAL', default=5)
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default, point CACHE_URL at redis or memcached in production
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # resolved auth tokens, a bounded LRU whose entries expire after TIMEOUT seconds
+    'tokens': env.cache('TOKEN_CACHE_URL', default='locmemcache://tokens?timeout=300&max_entries=10000'),
+}
+
+TOKEN_CACHE_ALIAS = 'tokens'
+
+# the rate limit counters, point RATE_LIMIT_CACHE_URL at the redis or memcached every process shares in production
+CACHES['ratelimit'] = env.cache('RATE_LIMIT_CACHE_URL', default='locmemcache://ratelimit?max_entries=100000')
+
+RATE_LIMIT_CACHE_ALIAS = 'ratelimit'
 
 
 # Password validation
@@ -149,11 +204,122 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'movie_review.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'movie_review.throttling.RateLimitThrottle',
+    ],
+    # orjson backed JSON, byte for byte what DRF's own JSON renderer and parser give
+    'DEFAULT_RENDERER_CLASSES': [
+        'movie_review.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'movie_review.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Reverse proxies in front of the app, the throttles key clients on the address the outermost one saw.
+    # 0 keys them on REMOTE_ADDR, X-Forwarded-For is sent by the clients themselves then and is not trusted
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
+}
+
+# Number of latest reviews embedded in the movie detail response
+REVIEW_PREVIEW_SIZE = env.int('REVIEW_PREVIEW_SIZE', default=5)
+
+# Movie search backend: 'fulltext' (MySQL FULLTEXT), 'inverted' (term table, any database) or 'auto'
+MOVIE_SEARCH_BACKEND = env('MOVIE_SEARCH_BACKEND', default='auto')
+
+# Seconds the term index keeps the number of movies it ranks by, indexing or deleting movies drops it sooner
+MOVIE_SEARCH_COUNT_CACHE_TIMEOUT = env.int('MOVIE_SEARCH_COUNT_CACHE_TIMEOUT', default=600)
+
+# Reviews read per query when streaming an export
+REVIEW_EXPORT_CHUNK_SIZE = env.int('REVIEW_EXPORT_CHUNK_SIZE', default=2000)
+
+# Seconds an anonymous GET response stays cached, 0 turns the response cache off
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=300)
+
+# Serve movie and review lists from values() rows instead of model instances, the responses are the same
+FAST_READ_SERIALIZATION = env.bool('FAST_READ_SERIALIZATION', default=True)
+
+# Share of the requests profiled with Server-Timing headers and a log line, between 0 (off) and 1 (all)
+REQUEST_PROFILING_SAMPLE_RATE = env.float('REQUEST_PROFILING_SAMPLE_RATE', default=0.0)
+
+# Queries of the same shape run this many times in one profiled request are logged as a possible N+1
+REQUEST_PROFILING_REPEAT_THRESHOLD = env.int('REQUEST_PROFILING_REPEAT_THRESHOLD', default=5)
+
+# Neighbours stored per movie for the similar movies endpoint
+SIMILAR_MOVIES_COUNT = env.int('SIMILAR_MOVIES_COUNT', default=20)
+
+# Users who must have rated both movies before their similarity counts, fewer co-raters make it noise
+SIMILAR_MOVIES_MIN_CO_RATERS = env.int('SIMILAR_MOVIES_MIN_CO_RATERS', default=2)
+
+# Seconds the movie id a slug or title resolves to stays cached, renames and deletes drop it straight away
+MOVIE_RESOLVER_CACHE_TIMEOUT = env.int('MOVIE_RESOLVER_CACHE_TIMEOUT', default=3600)
+
+# Movies ranked on each leaderboard refreshed by refresh_leaderboards
+LEADERBOARD_SIZE = env.int('LEADERBOARD_SIZE', default=100)
+
+# Ratings of the catalog-wide mean every movie starts with on the top rated board, so a lone 5 star review does not win
+LEADERBOARD_PRIOR_RATINGS = env.int('LEADERBOARD_PRIOR_RATINGS', default=10)
+
+# Days in the sliding window the trending board measures review velocity over
+LEADERBOARD_TRENDING_DAYS = env.int('LEADERBOARD_TRENDING_DAYS', default=7)
+
+# Counter rows each review's upvotes are spread over, more shards let more voters write at once
+REVIEW_VOTE_SHARDS = env.int('REVIEW_VOTE_SHARDS', default=8)
+
+# Seconds the set of movie ids on a user's watchlist stays cached for the "in watchlist" flag on movies
+WATCHLIST_CACHE_TIMEOUT = env.int('WATCHLIST_CACHE_TIMEOUT', default=300)
+
+# Most movies added to or removed from a watchlist in one request
+WATCHLIST_BATCH_LIMIT = env.int('WATCHLIST_BATCH_LIMIT', default=100)
+
+# Most movies fetched or edited, or reviews deleted, by one request to the batch endpoints
+BATCH_REQUEST_LIMIT = env.int('BATCH_REQUEST_LIMIT', default=100)
+
+# Comments per page of a review's thread, the page is returned nested
+COMMENT_PAGE_SIZE = env.int('COMMENT_PAGE_SIZE', default=100)
+
+# Reviews kept on a user's feed timeline, trim_feeds drops the older ones
+FEED_LENGTH = env.int('FEED_LENGTH', default=500)
+
+# Followers from which an author's reviews are no longer copied to every follower's timeline on write,
+# the feeds of their followers read them at request time instead
+FEED_FANOUT_FOLLOWER_LIMIT = env.int('FEED_FANOUT_FOLLOWER_LIMIT', default=1000)
+
+# Login attempts allowed per client address, like '20/min', in a sliding window kept in the cache
+LOGIN_RATE_PER_IP = env('LOGIN_RATE_PER_IP', default='20/min')
+
+# Failed logins allowed per username from any address before it is refused without checking the password
+LOGIN_FAILURES_PER_USERNAME = env('LOGIN_FAILURES_PER_USERNAME', default='5/min')
+
+# Threads password hashes are checked on, so logins can never use every request worker. 0 hashes on the request thread
+LOGIN_HASH_WORKERS = env.int('LOGIN_HASH_WORKERS', default=0)
+
+# Seconds a login waits for a free hashing thread before it is answered 503
+LOGIN_HASH_TIMEOUT = env.float('LOGIN_HASH_TIMEOUT', default=2.0)
+
+# Requests allowed per rate limit scope, like '300/min' in a sliding window, by who is asking: 'anon' per address,
+# the roles per token. A view picks the scope of each method, reads and writes unless it names another. None is unlimited
+RATE_LIMITS = {
+    'read': {
+        'anon': env('RATE_LIMIT_ANON_READS', default='300/min'),
+        'member': env('RATE_LIMIT_MEMBER_READS', default='1200/min'),
+        'admin': env('RATE_LIMIT_ADMIN_READS', default=None),
+    },
+    'write': {
+        'anon': env('RATE_LIMIT_ANON_WRITES', default='30/min'),
+        'member': env('RATE_LIMIT_MEMBER_WRITES', default='120/min'),
+        'admin': env('RATE_LIMIT_ADMIN_WRITES', default=None),
+    },
+    'review_write': {
+        'member': env('RATE_LIMIT_MEMBER_REVIEW_WRITES', default='10/min'),
+        'admin': env('RATE_LIMIT_ADMIN_REVIEW_WRITES', default='60/min'),
+    },
 }
 
 SECURE_SSL_REDIRECT = True
@@ -0,0 +1,53 @@
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Movie, Review
+
+
+def apply_rating_delta(movie_id, count_delta, sum_delta):
+    '''Shifts the stored rating aggregates of a movie by the given deltas in a single UPDATE, flagging its similar movies stale'''
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    # average_rating has to be the first assignment: MySQL evaluates SET clauses left to right with the
+    # already updated values, every other backend uses the old ones, so both see the old count and sum here
+    Movie.objects.filter(pk=movie_id).update(
+        average_rating=Case(
+            When(Q(rating_count__lte=-count_delta), then=Value(0.0)),
+            default=Cast(new_sum, FloatField()) / Cast(new_count, FloatField()),
+            output_field=FloatField(),
+        ),
+        rating_count=new_count,
+        rating_sum=new_sum,
+        # the ratings moved, so the similar movies are recomputed on the next refresh
+        similar_movies_stale=True,
+    )
+
+
+def _actual_aggregates():
+    '''Correlated subqueries computing the real review count and rating sum of the outer movie'''
+    reviews = Review.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    actual_count = Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), 0)
+    actual_sum = Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0)
+    return actual_count, actual_sum
+
+
+def rebuild_rating_aggregates(movies=None):
+    '''Recomputes the rating aggregates from the Review table for the given movies (all of them by default)'''
+    movies = Movie.objects.all() if movies is None else movies
+    actual_count, actual_sum = _actual_aggregates()
+    updated = movies.update(rating_count=actual_count, rating_sum=actual_sum)
+    # a second statement so the average is computed from the freshly written count and sum
+    movies.update(average_rating=Case(
+        When(rating_count=0, then=Value(0.0)),
+        default=Cast('rating_sum', FloatField()) / Cast('rating_count', FloatField()),
+        output_field=FloatField(),
+    ))
+    return updated
+
+
+def drifted_movies():
+    '''Returns the movies whose stored aggregates no longer match their reviews'''
+    actual_count, actual_sum = _actual_aggregates()
+    return Movie.objects.annotate(actual_count=actual_count, actual_sum=actual_sum).exclude(
+        rating_count=F('actual_count'), rating_sum=F('actual_sum')
+    )
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MovieReviewConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movie_review'
+
+    def ready(self):
+        # connect the model signal receivers
+        from . import signals  # noqa: F401
@@ -0,0 +1,119 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework.response import Response
+
+from .cache import is_anonymous_request
+from .models import Movie, Review
+from .resolver import aresolve_movie_id
+from .views import MovieListCreateAPIView, MovieRetrieveUpdateDestroyAPIView, ReviewListCreateAPIView, ReviewRetrieveUpdateDestroyAPIView
+from .watchlists import watchlist_ids
+
+
+class AsyncAPIView:
+    '''Mixin running DRF's request handling on the event loop for views whose handlers are all coroutines.
+
+    Requests without credentials are authenticated and permission checked inline since that never touches
+    the database, the others do it in a worker thread. Only GET is served, the write methods of the sync
+    views these are mixed into stay on their sync routes.
+    '''
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            if is_anonymous_request(request):
+                await self.ainitial(request, *args, **kwargs)
+            else:
+                await sync_to_async(self.initial_with_watchlist)(request, *args, **kwargs)
+
+            method = request.method.lower()
+            if method == 'head':
+                method = 'get'
+            if method in self.http_method_names:
+                handler = getattr(self, method, self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        '''initial() for requests without credentials, only the throttles leave the event loop.
+
+        They count the request in the rate limit cache, which the cache backends only do blocking.
+        '''
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        self.perform_authentication(request)
+        self.check_permissions(request)
+        await sync_to_async(self.check_throttles)(request)
+
+    def initial_with_watchlist(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        # the movie serializers flag the user's watchlist, it is read in this same thread hop
+        watchlist_ids(request)
+
+    async def apaginate(self, queryset):
+        '''Fetches one keyset page of the queryset with the async ORM and returns the paginated response'''
+        paginator = self.paginator
+        page_queryset = paginator.prepare_queryset(queryset, self.request, view=self)
+        if page_queryset is None:
+            serializer = self.get_serializer([obj async for obj in queryset], many=True)
+            return Response(serializer.data)
+        page = paginator.finish_page([obj async for obj in page_queryset])
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class AsyncMovieListAPIView(AsyncAPIView, MovieListCreateAPIView):
+    '''This view lists the movies with the same filters, sort orders and response as the sync movie list'''
+
+    async def get(self, request, *args, **kwargs):
+        return await self.apaginate(self.filter_queryset(self.get_queryset()))
+
+
+class AsyncMovieRetrieveAPIView(AsyncAPIView, MovieRetrieveUpdateDestroyAPIView):
+    '''This view retrieves a movie with its review preview, like the sync movie detail'''
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            movie = await self.get_queryset().aget(pk=await aresolve_movie_id(self.kwargs['title']))
+        except Movie.DoesNotExist:
+            raise Http404('No Movie matches the given query.')
+        self.check_object_permissions(request, movie)
+        return Response(self.get_serializer(movie).data)
+
+
+class AsyncReviewListAPIView(AsyncAPIView, ReviewListCreateAPIView):
+    '''This view lists the reviews of a movie, like the sync review list'''
+
+    async def get(self, request, *args, **kwargs):
+        movie_id = await aresolve_movie_id(self.kwargs['title'])
+        if movie_id is None:
+            raise Http404('No Movie matches the given query.')
+        return await self.apaginate(self.reviews_of(movie_id))
+
+
+class AsyncReviewRetrieveAPIView(AsyncAPIView, ReviewRetrieveUpdateDestroyAPIView):
+    '''This view retrieves a single review, like the sync review detail'''
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            review = await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except Review.DoesNotExist:
+            raise Http404('No Review matches the given query.')
+        self.check_object_permissions(request, review)
+        return Response(self.get_serializer(review).data)
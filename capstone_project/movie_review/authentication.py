@@ -0,0 +1,133 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import delete_now_and_on_commit
+from .cache_keys import hashed_cache_key
+from .routers import replica_may_lag
+
+# what the views and throttles read of request.user, the other fields are loaded on first access
+CACHED_USER_FIELDS = ('id', 'username', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+_hashing_pool = None
+_hashing_pool_lock = threading.Lock()
+
+
+def get_token_cache():
+    return caches[settings.TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    return hashed_cache_key('movie_review:token:', key)
+
+
+def invalidate_tokens(keys):
+    delete_now_and_on_commit([token_cache_key(key) for key in keys], using=get_token_cache())
+
+
+def loaded_instance(model, values):
+    '''An instance of model with the given field values loaded and its other fields deferred'''
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(None, names, [values[name] for name in names])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''Token authentication that keeps resolved tokens, with the CACHED_USER_FIELDS of their users, in the token cache.
+
+    The token cache is a bounded LRU with a TTL configured in CACHES, the receivers in signals.py
+    drop an entry as soon as the token is deleted or its user changes. Neither the key nor the
+    password hash is cached, the token and user are rebuilt from the key the client sent.
+    '''
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        entry = token_cache.get(cache_key)
+        if entry is not None:
+            user = loaded_instance(get_user_model(), entry['user'])
+            token = loaded_instance(Token, {'key': key, 'user_id': user.pk, 'created': entry['created']})
+            token.user = user
+            return (user, token)
+
+        # only tokens that passed every check of the parent class are cached, and never a user read
+        # from a replica that may not have its latest change yet, it would outlive the invalidation
+        user, token = super().authenticate_credentials(key)
+        if not replica_may_lag(cache_key):
+            user_values = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+            token_cache.set(cache_key, {'user': user_values, 'created': token.created})
+        return (user, token)
+
+
+class PasswordHashingBusy(Exception):
+    '''No hashing worker was free within LOGIN_HASH_TIMEOUT seconds'''
+
+
+def hashing_pool():
+    global _hashing_pool
+    with _hashing_pool_lock:
+        if _hashing_pool is None:
+            _hashing_pool = ThreadPoolExecutor(
+                max_workers=settings.LOGIN_HASH_WORKERS, thread_name_prefix='password-hashing',
+            )
+        return _hashing_pool
+
+
+def _before_deadline(deadline, func, *args):
+    # a login that waited too long for a worker is turned away without spending the hash on it
+    if time.monotonic() > deadline:
+        raise PasswordHashingBusy
+    return func(*args)
+
+
+def run_hashing(func, *args):
+    '''Runs the password hashing func on the bounded pool when LOGIN_HASH_WORKERS is set, on this thread otherwise.
+
+    However many logins come in at once, at most LOGIN_HASH_WORKERS hashes run, and a login that
+    could not get a worker within LOGIN_HASH_TIMEOUT seconds raises PasswordHashingBusy.
+    '''
+    if not settings.LOGIN_HASH_WORKERS:
+        return func(*args)
+    deadline = time.monotonic() + settings.LOGIN_HASH_TIMEOUT
+    return hashing_pool().submit(_before_deadline, deadline, func, *args).result()
+
+
+def verify_password(password, encoded):
+    '''Checks the password against the stored hash, returns (matches, the hash to store instead when it is outdated)'''
+    upgraded = []
+    matches = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return matches, upgraded[0] if upgraded else None
+
+
+class HashingPoolModelBackend(ModelBackend):
+    '''The model backend with the password hashing, and only that, run through run_hashing.
+
+    The user is read and saved on the request thread, the workers never touch the database.
+    '''
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash all the same, so an unknown username takes as long to reject as a wrong password
+            run_hashing(make_password, password)
+            return None
+        matches, upgraded = run_hashing(verify_password, password, user.password)
+        if not matches or not self.user_can_authenticate(user):
+            return None
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        return user
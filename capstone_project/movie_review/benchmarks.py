@@ -0,0 +1,774 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+
+from .comments import add_comment
+from .feeds import apply_follower_delta, follow
+from .models import Follow, Movie, Review, ReviewComment, User
+from .renderers import FastJSONRenderer
+from .search import tokenize
+from .serializers import MovieSerializer, ReviewSerializer
+from .throttling import RateLimitThrottle, get_rate_limit_cache
+from .votes import cast_vote, fold_review_votes
+
+# benchmarks measure the views themselves, so the response cache is turned off and any host is accepted
+BENCHMARK_SETTINGS = {
+    'RESPONSE_CACHE_TIMEOUT': 0,
+    'ALLOWED_HOSTS': ['*'],
+    # every scenario comes from the same client, far more often than a client would be let
+    'LOGIN_RATE_PER_IP': None,
+    'RATE_LIMITS': {},
+    # scenarios read back what they just wrote, a local replica copy never catches up with it
+    'DATABASE_REPLICAS': [],
+}
+
+
+def percentile(sorted_values, fraction):
+    '''Nearest-rank percentile of an already sorted list'''
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    '''Turns per-request latencies in seconds into milliseconds percentiles and a throughput'''
+    ordered = sorted(latencies)
+    to_ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'p50_ms': to_ms(percentile(ordered, 0.50)),
+        'p95_ms': to_ms(percentile(ordered, 0.95)),
+        'p99_ms': to_ms(percentile(ordered, 0.99)),
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else None,
+    }
+
+
+SYNC_READ_ROUTES = {
+    'list': 'movie_list_api', 'detail': 'movie_detail', 'reviews': 'review-list', 'review': 'review-detail',
+}
+ASYNC_READ_ROUTES = {
+    'list': 'async-movie-list', 'detail': 'async-movie-detail', 'reviews': 'async-review-list', 'review': 'async-review-detail',
+}
+
+
+def read_paths(routes=SYNC_READ_ROUTES, limit=20):
+    '''The read requests benchmarked: the movie list plus detail and reviews of the most reviewed movies'''
+    titles = list(Movie.objects.order_by('-rating_count', 'pk').values_list('title', flat=True)[:limit])
+    review_ids = list(Review.objects.order_by('-pk').values_list('pk', flat=True)[:limit])
+    paths = [reverse(routes['list'])]
+    paths += [reverse(routes['detail'], kwargs={'title': title}) for title in titles]
+    paths += [reverse(routes['reviews'], kwargs={'title': title}) for title in titles]
+    paths += [reverse(routes['review'], kwargs={'pk': pk}) for pk in review_ids]
+    return paths
+
+
+def run_threads(send, requests, concurrency):
+    '''Calls send(client, index) for every request from `concurrency` threads, each with its own test client'''
+    def worker(indexes):
+        client = Client()
+        latencies = []
+        try:
+            for index in indexes:
+                started = time.perf_counter()
+                send(client, index)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            if concurrency > 1:
+                close_old_connections()
+        return latencies
+
+    shares = [range(offset, requests, concurrency) for offset in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        latencies = worker(shares[0])
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = [latency for result in pool.map(worker, shares) for latency in result]
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_wsgi(paths, requests, concurrency):
+    '''Sends the requests round robin through the WSGI handler from `concurrency` threads'''
+    return run_threads(lambda client, index: client.get(paths[index % len(paths)], secure=True), requests, concurrency)
+
+
+async def _run_asgi(paths, requests, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(index):
+        async with semaphore:
+            started = time.perf_counter()
+            await client.get(paths[index % len(paths)], secure=True)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_asgi(paths, requests, concurrency):
+    '''Sends the requests through the ASGI handler with at most `concurrency` in flight on one event loop'''
+    return async_to_sync(_run_asgi)(paths, requests, concurrency)
+
+
+def asgi_suite(requests=200, concurrency=10, **options):
+    '''Compares the sync read views under WSGI with their async versions under ASGI on the same data'''
+    with override_settings(**BENCHMARK_SETTINGS):
+        return {
+            'wsgi': run_wsgi(read_paths(), requests, concurrency),
+            'asgi': run_asgi(read_paths(ASYNC_READ_ROUTES), requests, concurrency),
+        }
+
+
+def run_votes(requests, concurrency):
+    '''Upvotes one review from `requests` distinct users, `concurrency` at a time, then folds the counter shards'''
+    run = uuid.uuid4().hex[:8]
+    movie = Movie.objects.create(title=f'Bench votes {run}', director='Bench')
+    author = User.objects.create_user(f'bench_author_{run}')
+    review = Review.objects.create(movie=movie, user=author, rating=5, comment='viral review')
+    User.objects.bulk_create([User(username=f'bench_voter_{run}_{i}') for i in range(requests)])
+    voters = User.objects.filter(username__startswith=f'bench_voter_{run}_')
+    tokens = [Token.generate_key() for _ in range(requests)]
+    Token.objects.bulk_create([Token(key=key, user=user) for key, user in zip(tokens, voters)])
+    path = reverse('review-vote', kwargs={'pk': review.pk})
+    errors = []
+
+    def vote(client, index):
+        response = client.post(path, secure=True, HTTP_AUTHORIZATION=f'Token {tokens[index]}')
+        if response.status_code != 201:
+            errors.append(response.status_code)
+
+    try:
+        result = run_threads(vote, requests, concurrency)
+        fold_review_votes()
+        review.refresh_from_db()
+        result.update({'errors': len(errors), 'counted': review.helpful_votes})
+        return result
+    finally:
+        voters.delete()
+        author.delete()
+        movie.delete()
+
+
+def votes_suite(requests=200, concurrency=10, **options):
+    '''Measures upvote throughput on one popular review with the counter sharded and with a single counter row.
+
+    The single row run is what a plain counter column on Review would do, every voter waiting on one row lock.
+    SQLite serialises all writes whatever the schema, the difference shows on MySQL.
+    '''
+    results = {}
+    for label, shards in (('sharded', settings.REVIEW_VOTE_SHARDS), ('single_row', 1)):
+        with override_settings(REVIEW_VOTE_SHARDS=shards, **BENCHMARK_SETTINGS):
+            results[label] = run_votes(requests, concurrency)
+    return results
+
+
+def scenario(route, method):
+    '''Marks an EndpointScenarios method as the request builder of a route name and HTTP method'''
+    def mark(function):
+        function.endpoint = (route, method)
+        return function
+    return mark
+
+
+# movies fetched or edited, and reviews deleted, by each request of the batch scenarios
+BATCH_SIZE = 10
+
+EndpointRequest = namedtuple('EndpointRequest', ['path', 'data', 'token'], defaults=[None, None])
+
+
+class EndpointScenarios:
+    '''Builds the request sent to every route and method of the API on each iteration.
+
+    A scenario is a method marked with the route name and HTTP method it covers. It does whatever setup
+    the request needs (a fresh user to register, a throwaway movie to delete) before the clock starts and
+    returns an EndpointRequest. Everything it creates lives in the suite's transaction and is rolled back.
+    '''
+    password = 'bench-password'
+
+    def __init__(self):
+        self.run = uuid.uuid4().hex[:8]
+        self.admin, self.admin_token = self.new_user('admin', role='admin')
+        self.member, self.member_token = self.new_user('member')
+        # the most reviewed movie is the heaviest detail and review list to serve
+        self.movie = Movie.objects.order_by('-rating_count', 'pk').first() or Movie.objects.create(
+            title=f'Bench movie {self.run}', director='Bench', description='benchmark movie',
+        )
+        self.review = Review.objects.create(movie=self.movie, user=self.member, rating=4, comment='benchmark review')
+        self.comment = add_comment(self.review, self.member, 'benchmark comment')
+        self.search_term = (tokenize(self.movie.description) or tokenize(self.movie.title) or ['movie'])[0]
+        self.batch_movie_ids = list(
+            Movie.objects.order_by('-rating_count', 'pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+
+    def new_user(self, name, role='member', token=True):
+        user = User.objects.create_user(
+            f'bench_{name}_{self.run}_{uuid.uuid4().hex[:6]}', password=self.password, role=role,
+        )
+        return user, Token.objects.create(user=user).key if token else None
+
+    def new_movie(self):
+        return Movie.objects.create(title=f'Bench movie {uuid.uuid4().hex}', director='Bench')
+
+    def scenarios(self):
+        '''Returns {(route name, method): scenario} for every scenario defined on the class'''
+        scenarios = {}
+        for attribute in dir(type(self)):
+            endpoint = getattr(getattr(type(self), attribute), 'endpoint', None)
+            if endpoint:
+                scenarios[endpoint] = getattr(self, attribute)
+        return scenarios
+
+    @scenario('register_api', 'POST')
+    def register_post(self, i):
+        username = f'bench_register_{self.run}_{i}'
+        return EndpointRequest(reverse('register_api'), {
+            'username': username, 'email': f'{username}@example.com', 'password': self.password,
+        })
+
+    @scenario('login_api', 'POST')
+    def login_post(self, i):
+        return EndpointRequest(reverse('login_api'), {'username': self.member.username, 'password': self.password})
+
+    @scenario('logout_api', 'POST')
+    def logout_post(self, i):
+        return EndpointRequest(reverse('logout_api'), token=self.new_user('logout')[1])
+
+    @scenario('create_admin', 'POST')
+    def create_admin_post(self, i):
+        username = f'bench_new_admin_{self.run}_{i}'
+        return EndpointRequest(reverse('create_admin'), {
+            'username': username, 'email': f'{username}@example.com', 'password': self.password,
+        }, self.admin_token)
+
+    @scenario('watchlist', 'GET')
+    def watchlist_get(self, i):
+        return EndpointRequest(reverse('watchlist'), token=self.member_token)
+
+    @scenario('watchlist', 'POST')
+    def watchlist_post(self, i):
+        return EndpointRequest(reverse('watchlist'), {'movies': [self.movie.title]}, self.member_token)
+
+    @scenario('watchlist', 'DELETE')
+    def watchlist_delete(self, i):
+        return EndpointRequest(reverse('watchlist'), {'movies': [self.movie.title]}, self.member_token)
+
+    @scenario('feed', 'GET')
+    def feed_get(self, i):
+        return EndpointRequest(reverse('feed'), token=self.member_token)
+
+    @scenario('user-follow', 'POST')
+    def user_follow_post(self, i):
+        followed = self.new_user('followed', token=False)[0]
+        return EndpointRequest(reverse('user-follow', kwargs={'username': followed.username}), token=self.member_token)
+
+    @scenario('user-follow', 'DELETE')
+    def user_follow_delete(self, i):
+        followed = self.new_user('unfollowed', token=False)[0]
+        follow(self.member, followed)
+        return EndpointRequest(reverse('user-follow', kwargs={'username': followed.username}), token=self.member_token)
+
+    @scenario('review-export', 'GET')
+    def review_export_get(self, i):
+        return EndpointRequest(f"{reverse('review-export')}?movie={self.movie.title}", token=self.admin_token)
+
+    @scenario('movie_list_api', 'GET')
+    def movie_list_get(self, i):
+        return EndpointRequest(f"{reverse('movie_list_api')}?sort=top_rated")
+
+    @scenario('movie_list_api', 'POST')
+    def movie_list_post(self, i):
+        return EndpointRequest(reverse('movie_list_api'), {
+            'title': f'Bench created {self.run} {i}', 'director': 'Bench', 'genre': 'Drama',
+        }, self.admin_token)
+
+    @scenario('movie-batch', 'GET')
+    def movie_batch_get(self, i):
+        ids = '&'.join(f'id={pk}' for pk in self.batch_movie_ids)
+        return EndpointRequest(f"{reverse('movie-batch')}?{ids}&title={self.movie.slug}")
+
+    @scenario('movie-batch', 'PATCH')
+    def movie_batch_patch(self, i):
+        edits = [{'id': pk, 'trailer_link': f'https://example.com/{i}'} for pk in self.batch_movie_ids]
+        return EndpointRequest(reverse('movie-batch'), {'movies': edits}, self.admin_token)
+
+    @scenario('movie-search', 'GET')
+    def movie_search_get(self, i):
+        return EndpointRequest(f"{reverse('movie-search')}?q={self.search_term}")
+
+    @scenario('leaderboard', 'GET')
+    def leaderboard_get(self, i):
+        return EndpointRequest(reverse('leaderboard', kwargs={'board': ['top_rated', 'trending'][i % 2]}))
+
+    @scenario('movie_detail', 'GET')
+    def movie_detail_get(self, i):
+        return EndpointRequest(reverse('movie_detail', kwargs={'title': self.movie.title}))
+
+    @scenario('movie_detail', 'PATCH')
+    def movie_detail_patch(self, i):
+        return EndpointRequest(
+            reverse('movie_detail', kwargs={'title': self.movie.title}), {'trailer_link': f'https://example.com/{i}'},
+            self.admin_token,
+        )
+
+    @scenario('movie_detail', 'DELETE')
+    def movie_detail_delete(self, i):
+        return EndpointRequest(reverse('movie_detail', kwargs={'title': self.new_movie().title}), token=self.admin_token)
+
+    @scenario('review-list', 'GET')
+    def review_list_get(self, i):
+        return EndpointRequest(reverse('review-list', kwargs={'title': self.movie.title}))
+
+    @scenario('review-list', 'POST')
+    def review_list_post(self, i):
+        # one review per member and movie, so every iteration needs a member who has not reviewed it yet
+        return EndpointRequest(
+            reverse('review-list', kwargs={'title': self.movie.title}),
+            {'movie': self.movie.pk, 'rating': 3, 'comment': 'benchmark'}, self.new_user('reviewer')[1],
+        )
+
+    @scenario('movie-similar', 'GET')
+    def movie_similar_get(self, i):
+        return EndpointRequest(reverse('movie-similar', kwargs={'title': self.movie.title}))
+
+    @scenario('review-detail', 'GET')
+    def review_detail_get(self, i):
+        return EndpointRequest(reverse('review-detail', kwargs={'pk': self.review.pk}))
+
+    @scenario('review-detail', 'PATCH')
+    def review_detail_patch(self, i):
+        return EndpointRequest(
+            reverse('review-detail', kwargs={'pk': self.review.pk}), {'rating': i % 5 + 1}, self.member_token,
+        )
+
+    @scenario('review-detail', 'DELETE')
+    def review_detail_delete(self, i):
+        user = self.new_user('deleted', token=False)[0]
+        review = Review.objects.create(movie=self.movie, user=user, rating=2, comment='to delete')
+        return EndpointRequest(reverse('review-detail', kwargs={'pk': review.pk}), token=self.admin_token)
+
+    @scenario('review-batch', 'DELETE')
+    def review_batch_delete(self, i):
+        reviews = [
+            Review.objects.create(movie=self.movie, user=self.new_user('deleted', token=False)[0], rating=2, comment='x')
+            for _ in range(BATCH_SIZE)
+        ]
+        return EndpointRequest(reverse('review-batch'), {'reviews': [review.pk for review in reviews]}, self.admin_token)
+
+    @scenario('review-vote', 'POST')
+    def review_vote_post(self, i):
+        return EndpointRequest(reverse('review-vote', kwargs={'pk': self.review.pk}), token=self.new_user('voter')[1])
+
+    @scenario('review-vote', 'DELETE')
+    def review_vote_delete(self, i):
+        user, token = self.new_user('unvoter')
+        cast_vote(self.review, user)
+        return EndpointRequest(reverse('review-vote', kwargs={'pk': self.review.pk}), token=token)
+
+    @scenario('review-comments', 'GET')
+    def review_comments_get(self, i):
+        return EndpointRequest(reverse('review-comments', kwargs={'pk': self.review.pk}))
+
+    @scenario('review-comments', 'POST')
+    def review_comments_post(self, i):
+        return EndpointRequest(
+            reverse('review-comments', kwargs={'pk': self.review.pk}),
+            {'body': f'benchmark comment {i}'},
+            self.member_token,
+        )
+
+    @scenario('comment-detail', 'GET')
+    def comment_detail_get(self, i):
+        return EndpointRequest(reverse('comment-detail', kwargs={'pk': self.comment.pk}))
+
+    @scenario('comment-detail', 'DELETE')
+    def comment_detail_delete(self, i):
+        comment = add_comment(self.review, self.member, 'to delete', self.comment)
+        return EndpointRequest(reverse('comment-detail', kwargs={'pk': comment.pk}), token=self.member_token)
+
+    @scenario('async-movie-list', 'GET')
+    def async_movie_list_get(self, i):
+        return EndpointRequest(f"{reverse('async-movie-list')}?sort=top_rated")
+
+    @scenario('async-movie-detail', 'GET')
+    def async_movie_detail_get(self, i):
+        return EndpointRequest(reverse('async-movie-detail', kwargs={'title': self.movie.title}))
+
+    @scenario('async-review-list', 'GET')
+    def async_review_list_get(self, i):
+        return EndpointRequest(reverse('async-review-list', kwargs={'title': self.movie.title}))
+
+    @scenario('async-review-detail', 'GET')
+    def async_review_detail_get(self, i):
+        return EndpointRequest(reverse('async-review-detail', kwargs={'pk': self.review.pk}))
+
+
+
+def uncovered_routes(scenarios):
+    '''Names of the routes in movie_review/urls.py that no scenario exercises'''
+    from . import urls
+
+    covered = {route for route, method in scenarios}
+    return sorted(pattern.name for pattern in urls.urlpatterns if pattern.name not in covered)
+
+
+def run_endpoint(client, scenario, requests):
+    '''Sends `requests` requests built by one scenario in turn, timing each and counting its queries'''
+    latencies, queries, errors = [], [], 0
+    for i in range(requests):
+        request = scenario(i)
+        extra = {'HTTP_AUTHORIZATION': f'Token {request.token}'} if request.token else {}
+        data = json.dumps(request.data) if request.data is not None else ''
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.generic(
+                scenario.endpoint[1], request.path, data, content_type='application/json', secure=True, **extra
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latency = time.perf_counter() - started
+        latencies.append(latency)
+        queries.append(len(captured))
+        errors += response.status_code >= 400
+    # only the time spent serving counts, not the untimed setup of each request
+    summary = summarize(latencies, sum(latencies))
+    queries.sort()
+    summary.update({
+        'queries_p50': percentile(queries, 0.50),
+        'queries_max': queries[-1] if queries else None,
+        'errors': errors,
+    })
+    return summary
+
+
+def endpoints_suite(requests=20, **options):
+    '''Times every route and method of the API one request at a time, with the SQL queries each one runs.
+
+    The writes really happen, inside a transaction that is rolled back once the suite is done,
+    so the suite can run against a seeded database without changing it.
+    '''
+    results = {}
+    with override_settings(**BENCHMARK_SETTINGS), transaction.atomic():
+        scenarios = EndpointScenarios().scenarios()
+        client = Client()
+        for (route, method), scenario in sorted(scenarios.items()):
+            results[f'{method} {route}'] = run_endpoint(client, scenario, requests)
+        transaction.set_rollback(True)
+    missing = uncovered_routes(scenarios)
+    if missing:
+        results['uncovered_routes'] = missing
+    return results
+
+
+def batch_suite(requests=20, size=20, **options):
+    '''Compares fetching `size` movies, and deleting `size` reviews, one request per item with one batch request.
+
+    Each measurement is the time and the queries of all the requests needed for the whole set. The
+    writes happen inside a transaction that is rolled back once the suite is done.
+    '''
+    results = {'items': size}
+    with override_settings(**BENCHMARK_SETTINGS), transaction.atomic():
+        bench = EndpointScenarios()
+        client = Client()
+        movies = list(Movie.objects.order_by('-rating_count', 'pk')[:size])
+        admin = bench.admin_token
+
+        def one_by_one(i):
+            return [EndpointRequest(reverse('movie_detail', kwargs={'title': movie.slug})) for movie in movies]
+
+        def batched(i):
+            return [EndpointRequest(f"{reverse('movie-batch')}?" + '&'.join(f'id={movie.pk}' for movie in movies))]
+
+        def reviews(i):
+            user = bench.new_user('batch_deleted', token=False)[0]
+            return [
+                Review.objects.create(movie=movie, user=user, rating=2, comment='to delete').pk for movie in movies
+            ]
+
+        def delete_one_by_one(i):
+            return [EndpointRequest(reverse('review-detail', kwargs={'pk': pk}), token=admin) for pk in reviews(i)]
+
+        def delete_batched(i):
+            return [EndpointRequest(reverse('review-batch'), {'reviews': reviews(i)}, admin)]
+
+        for name, method, build in (
+            ('fetch_one_by_one', 'GET', one_by_one), ('fetch_batched', 'GET', batched),
+            ('delete_one_by_one', 'DELETE', delete_one_by_one), ('delete_batched', 'DELETE', delete_batched),
+        ):
+            results[name] = run_request_sets(client, method, build, requests)
+        transaction.set_rollback(True)
+    return results
+
+
+def run_request_sets(client, method, build, requests):
+    '''Like run_endpoint, for scenarios needing a set of requests, timed and counted together, per iteration'''
+    latencies, queries, errors = [], [], 0
+    for i in range(requests):
+        request_set = build(i)
+        captured_queries, started = 0, time.perf_counter()
+        for request in request_set:
+            extra = {'HTTP_AUTHORIZATION': f'Token {request.token}'} if request.token else {}
+            data = json.dumps(request.data) if request.data is not None else ''
+            with CaptureQueriesContext(connection) as captured:
+                response = client.generic(
+                    method, request.path, data, content_type='application/json', secure=True, **extra
+                )
+            captured_queries += len(captured)
+            errors += response.status_code >= 400
+        latencies.append(time.perf_counter() - started)
+        queries.append(captured_queries)
+    summary = summarize(latencies, sum(latencies))
+    queries.sort()
+    summary.update({
+        'requests_per_set': len(request_set) if requests else None,
+        'queries_p50': percentile(queries, 0.50),
+        'queries_max': queries[-1] if queries else None,
+        'errors': errors,
+    })
+    return summary
+
+
+def build_thread(review, users, size, rng):
+    '''Comments `size` times on the review, each comment replying to a random earlier one, one in five starting a branch'''
+    comments = []
+    for i in range(size):
+        parent = rng.choice(comments) if comments and rng.random() >= 0.2 else None
+        if parent is not None and parent.depth >= ReviewComment.MAX_DEPTH:
+            parent = None
+        comments.append(add_comment(review, users[i % len(users)], f'benchmark comment {i}', parent))
+    return comments
+
+
+def comments_suite(requests=20, size=5000, **options):
+    '''Times reading a review's comment thread of `size` comments.
+
+    It measures the first page of the thread, walking every page of it, and the subtree of the first comment
+    in full and two levels deep, with the queries each request runs. The thread is built inside a transaction
+    that is rolled back once the suite is done.
+    '''
+    results = {'comments': size}
+    with override_settings(**BENCHMARK_SETTINGS), transaction.atomic():
+        run = uuid.uuid4().hex[:8]
+        users = [User.objects.create_user(f'bench_commenter_{run}_{i}') for i in range(20)]
+        movie = Movie.objects.create(title=f'Bench comments {run}', director='Bench')
+        review = Review.objects.create(movie=movie, user=users[0], rating=4, comment='much discussed review')
+        started = time.perf_counter()
+        root = build_thread(review, users, size, random.Random(0))[0]
+        results['build_s'] = round(time.perf_counter() - started, 3)
+
+        client = Client()
+        thread = reverse('review-comments', kwargs={'pk': review.pk})
+        subtree = reverse('comment-detail', kwargs={'pk': root.pk})
+        for name, path in (('first_page', thread), ('subtree', subtree), ('subtree_depth_2', f'{subtree}?depth=2')):
+            fetch = scenario(None, 'GET')(lambda i, path=path: EndpointRequest(path))
+            results[name] = run_endpoint(client, fetch, requests)
+
+        pages, queries, url = 0, [], thread
+        started = time.perf_counter()
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                url = client.get(url, secure=True).json()['next']
+            pages += 1
+            queries.append(len(captured))
+        results['whole_thread'] = {
+            'pages': pages, 'total_ms': round((time.perf_counter() - started) * 1000, 3), 'queries_max': max(queries),
+        }
+        transaction.set_rollback(True)
+    return results
+
+
+def time_calls(call, requests):
+    '''Times `requests` calls of call(i), with the queries each one runs'''
+    latencies, queries = [], []
+    for i in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            call(i)
+            latencies.append(time.perf_counter() - started)
+        queries.append(len(captured))
+    summary = summarize(latencies, sum(latencies))
+    queries.sort()
+    summary.update({'queries_p50': percentile(queries, 0.50), 'queries_max': queries[-1] if queries else None})
+    return summary
+
+
+def feeds_suite(requests=20, size=1000, **options):
+    '''Times the fan-out of a new review to an author's `size` followers, and reading a follower's feed.
+
+    The same author is then pulled from at read time, by lowering FEED_FANOUT_FOLLOWER_LIMIT to `size`,
+    to compare the cost of a review and of a feed read in both modes. The follower also follows the 50
+    most prolific reviewers of the database, each follow filling their timeline with that reviewer's
+    latest reviews. Everything is built inside a transaction that is rolled back once the suite is done.
+    '''
+    results = {'followers': size}
+    with override_settings(**BENCHMARK_SETTINGS), transaction.atomic():
+        bench = EndpointScenarios()
+        author = bench.new_user('author', token=False)[0]
+        followers = User.objects.bulk_create([User(username=f'bench_follower_{bench.run}_{i}') for i in range(size)])
+        Follow.objects.bulk_create([Follow(follower=follower, followed=author) for follower in followers])
+        # bulk_create skips the receivers counting the followers
+        apply_follower_delta(author.pk, size)
+        reader = followers[0]
+        token = Token.objects.create(user=reader).key
+        prolific = list(User.objects.exclude(pk=author.pk).annotate(written=Count('reviews')).order_by('-written')[:50])
+        results['follow'] = time_calls(lambda i: follow(reader, prolific[i]), len(prolific))
+        movies = [bench.new_movie() for _ in range(2 * requests)]
+
+        feed = scenario(None, 'GET')(lambda i: EndpointRequest(reverse('feed'), token=token))
+        client = Client()
+        for mode, limit, written in (('fanned_out', size + 1, movies[:requests]), ('pulled', size, movies[requests:])):
+            with override_settings(FEED_FANOUT_FOLLOWER_LIMIT=limit):
+                results[f'review_{mode}'] = time_calls(
+                    lambda i: Review.objects.create(movie=written[i], user=author, rating=4, comment='followed'),
+                    requests,
+                )
+                results[f'feed_{mode}'] = run_endpoint(client, feed, requests)
+        transaction.set_rollback(True)
+    return results
+
+
+def time_throttle(throttle_class, request, requests):
+    '''Times `requests` calls of a fresh throttle's allow_request, like DRF makes one per request'''
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        begun = time.perf_counter()
+        throttle_class().allow_request(request, None)
+        latencies.append(time.perf_counter() - begun)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+class HistoryRateThrottle(AnonRateThrottle):
+    '''DRF's own throttle, keeping the timestamp of every hit in the window, at the same anonymous read rate'''
+
+    @property
+    def cache(self):
+        return get_rate_limit_cache()
+
+    def get_rate(self):
+        return settings.RATE_LIMITS['read']['anon']
+
+
+def throttle_suite(requests=10000, **options):
+    '''Times the throttling of one request, on its own, for an anonymous client and a signed in member.
+
+    DRF's own throttle, keeping a list of every hit's timestamp, is timed next to the counters for the
+    anonymous client. Both are given a limit nothing reaches, the cost of a hit grows with the history.
+    '''
+    results = {}
+    limits = {'read': {'anon': f'{requests * 2}/h', 'member': f'{requests * 2}/h'}}
+    with override_settings(RATE_LIMITS=limits), transaction.atomic():
+        cache = get_rate_limit_cache()
+        factory = APIRequestFactory()
+        member = User.objects.create_user(f'bench_throttled_{uuid.uuid4().hex[:8]}')
+        token = Token.objects.create(user=member)
+
+        anonymous = Request(factory.get('/', REMOTE_ADDR='192.0.2.1'))
+        signed_in = Request(factory.get('/', REMOTE_ADDR='192.0.2.2'))
+        signed_in.user, signed_in.auth = member, token
+        for name, throttle_class, request in (
+            ('anonymous', RateLimitThrottle, anonymous),
+            ('member', RateLimitThrottle, signed_in),
+            ('anonymous_history', HistoryRateThrottle, anonymous),
+        ):
+            cache.clear()
+            results[name] = time_throttle(throttle_class, request, requests)
+        cache.clear()
+        transaction.set_rollback(True)
+    return results
+
+
+def time_per_row(func, rows, requests):
+    '''Times `requests` calls of func, which handles `rows` rows, and adds the median cost of one row'''
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        begun = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - begun)
+    summary = summarize(latencies, time.perf_counter() - started)
+    summary['us_per_row'] = round(summary['p50_ms'] * 1000 / rows, 3) if rows and latencies else None
+    return summary
+
+
+def serialization_suite(requests=50, size=500, **options):
+    '''Times turning `size` movies and `size` reviews into response data and rendering it, per row.
+
+    Each serializer is timed on model instances, DRF's field by field path, and on values() rows, the
+    row path the list views take. The data of the movies is then rendered with the stdlib based
+    JSONRenderer and with FastJSONRenderer. The rows are read once beforehand, only the Python is timed.
+    '''
+    results = {}
+    for name, serializer, queryset in (
+        ('movies', MovieSerializer(context={'request': None}), Movie.objects.order_by('-rating_count', 'pk')),
+        ('reviews', ReviewSerializer(context={'request': None}), Review.objects.select_related('user')),
+    ):
+        instances = list(queryset[:size])
+        rows = list(queryset.values(*serializer.row_column_names())[:size])
+        many = type(serializer)(many=True, context=serializer.context)
+        results[name] = {
+            'rows': len(rows),
+            'instances': time_per_row(lambda: many.to_representation(instances), len(instances), requests),
+            'values_rows': time_per_row(lambda: serializer.rows_to_representation(rows), len(rows), requests),
+        }
+        if name == 'movies':
+            data = serializer.rows_to_representation(rows)
+            results['render'] = {
+                'stdlib': time_per_row(lambda: JSONRenderer().render(data), len(data), requests),
+                'orjson': time_per_row(lambda: FastJSONRenderer().render(data), len(data), requests),
+            }
+    return results
+
+
+def find_regressions(results, baseline, tolerance=0.25, prefix=''):
+    '''Compares results with a baseline run of the same suite and describes every measurement that got worse.
+
+    A measurement regresses when its p95 latency grew by more than `tolerance` (a fraction) or when it
+    runs more queries at most than it used to. Measurements missing from the baseline are skipped.
+    '''
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name) if isinstance(baseline, dict) else None
+        if not isinstance(value, dict) or not isinstance(old, dict):
+            continue
+        label = f'{prefix}{name}'
+        if 'p95_ms' not in value:
+            regressions += find_regressions(value, old, tolerance, f'{label} / ')
+            continue
+        if old.get('p95_ms') and value['p95_ms'] is not None and value['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {old['p95_ms']} ms -> {value['p95_ms']} ms")
+        if old.get('queries_max') is not None and (value.get('queries_max') or 0) > old['queries_max']:
+            regressions.append(f"{label}: queries {old['queries_max']} -> {value['queries_max']}")
+    return regressions
+
+
+SUITES = {
+    'asgi': asgi_suite,
+    'batch': batch_suite,
+    'comments': comments_suite,
+    'endpoints': endpoints_suite,
+    'feeds': feeds_suite,
+    'serialization': serialization_suite,
+    'throttle': throttle_suite,
+    'votes': votes_suite,
+}
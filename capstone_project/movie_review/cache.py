@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .models import Movie
+from .routers import note_write, replica_may_lag
+
+CATALOG_VERSION_KEY = 'movie_review:version:catalog'
+
+_pending = threading.local()
+
+
+def movie_version_key(key):
+    '''Cache key of the version counter for everything served under a movie's title or slug'''
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return f'movie_review:version:movie:{digest}'
+
+
+def get_version(key):
+    '''Returns the current value of a version counter, starting it if the cache does not have it'''
+    version = cache.get(key)
+    if version is None:
+        # start from the clock instead of 1, so a counter that was evicted never comes back
+        # with a value that older responses were cached under
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_versions(movie_ids=(), keys=()):
+    '''Bumps the catalog version and the versions of the given movies once the current transaction commits.
+
+    Movies are given by id, or by the titles and slugs they are served under. Bumping only after the commit
+    keeps a concurrent reader from caching the old rows under the new version. Movies given by id are
+    resolved to their title and slug in one query when the bumps are applied.
+    '''
+    pending = _pending.__dict__.setdefault('bumps', {'ids': set(), 'keys': set()})
+    pending['ids'].update(movie_ids)
+    pending['keys'].update(keys)
+    transaction.on_commit(_apply_pending_bumps)
+
+
+def _apply_pending_bumps():
+    # every write in the transaction registered this callback, the first one to run does the work
+    pending = _pending.__dict__.pop('bumps', None)
+    if not pending:
+        return
+    keys = set(pending['keys'])
+    if pending['ids']:
+        for title, slug in Movie.objects.filter(pk__in=pending['ids']).values_list('title', 'slug'):
+            keys.update((title, slug))
+    version_keys = [movie_version_key(key) for key in keys] + [CATALOG_VERSION_KEY]
+    for version_key in version_keys:
+        bump_version(version_key)
+    note_write(version_keys)
+
+
+def delete_now_and_on_commit(keys, using=cache):
+    '''Drops the given keys from the cache `using` now and again once the current transaction commits.
+
+    A concurrent request reading before the commit still sees the old rows and may cache them again,
+    the second delete drops what it cached. The replicas may not have the change yet either, see
+    replica_may_lag().
+    '''
+    keys = list(keys)
+    using.delete_many(keys)
+
+    def after_commit():
+        using.delete_many(keys)
+        note_write(keys)
+    transaction.on_commit(after_commit)
+
+
+def is_anonymous_request(request):
+    '''Tells from the headers alone, without touching the database, that a request carries no credentials'''
+    return 'HTTP_AUTHORIZATION' not in request.META and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+class VersionedCacheMixin:
+    '''Caches anonymous GET responses under a version counter that every write bumps, with strong ETags.
+
+    `cache_version_scope` is 'catalog' for views listing movies or 'movie' for views under a movie's title or slug.
+    A request whose If-None-Match matches the cached entry gets a 304 without any query being run.
+    '''
+    cache_version_scope = 'catalog'
+
+    def get_cache_version_key(self):
+        if self.cache_version_scope == 'movie':
+            return movie_version_key(self.kwargs['title'])
+        return CATALOG_VERSION_KEY
+
+    def get_response_cache_key(self, request):
+        version = get_version(self.get_cache_version_key())
+        # the bodies hold absolute links, built from the scheme and host the request came in on
+        variant = f'{request.build_absolute_uri()}|{request.accepted_media_type}'
+        digest = hashlib.md5(variant.encode('utf-8')).hexdigest()
+        return f'movie_review:response:{version}:{digest}'
+
+    def get(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_TIMEOUT or not is_anonymous_request(request):
+            return super().get(request, *args, **kwargs)
+
+        # the key is taken before the response is built, so a write landing meanwhile
+        # leaves this response under the old version where it is never read again
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            etag, content_type, content = entry
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(content, content_type=content_type)
+            response['ETag'] = etag
+            return response
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: self._store_response(rendered, key, request))
+        return response
+
+    def _store_response(self, response, key, request):
+        etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+        response['ETag'] = etag
+        # a replica still behind the last write would keep its stale rows cached under the new version
+        if not replica_may_lag(self.get_cache_version_key()):
+            cache.set(key, (etag, response['Content-Type'], response.content), settings.RESPONSE_CACHE_TIMEOUT)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            not_modified = HttpResponseNotModified()
+            not_modified['ETag'] = etag
+            return not_modified
+        return None
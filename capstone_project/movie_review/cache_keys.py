@@ -0,0 +1,10 @@
+import hashlib
+
+
+def hashed_cache_key(prefix, raw):
+    '''The cache key for a secret or personal value: prefix followed by the value's sha256.
+
+    The caches may be shared with other services, keying on the digest keeps the raw tokens,
+    credentials and usernames out of them.
+    '''
+    return prefix + hashlib.sha256(raw.encode('utf-8')).hexdigest()
@@ -0,0 +1,56 @@
+import string
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Review, ReviewComment
+
+PATH_DIGITS = string.digits + string.ascii_lowercase
+
+
+def path_segment(comment_id):
+    '''The id of a comment in fixed width base 36, so that paths sort the way the ids they are made of do'''
+    digits = []
+    while comment_id:
+        comment_id, digit = divmod(comment_id, len(PATH_DIGITS))
+        digits.append(PATH_DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(ReviewComment.PATH_STEP, '0')
+
+
+def add_comment(review, user, body, parent=None):
+    '''Saves a comment on the review, or a reply to parent, with its materialised path'''
+    with transaction.atomic():
+        comment = ReviewComment.objects.create(
+            review=review, user=user, parent=parent, body=body,
+            depth=parent.depth + 1 if parent else 0, path=parent.path if parent else '',
+        )
+        # the path ends with the comment's own id, which the database only hands out on insert
+        comment.path += path_segment(comment.pk)
+        ReviewComment.objects.filter(pk=comment.pk).update(path=comment.path)
+    return comment
+
+
+def subtree(comment, depth=None):
+    '''The comment and its replies to the given depth below it, depth first, as one range of the path index'''
+    # every path below the comment sorts before the path its next sibling id would have
+    end = comment.path[:-ReviewComment.PATH_STEP] + path_segment(comment.pk + 1)
+    comments = ReviewComment.objects.filter(review_id=comment.review_id, path__gte=comment.path, path__lt=end)
+    if depth is not None:
+        comments = comments.filter(depth__lte=comment.depth + depth)
+    return comments
+
+
+def nest_comments(rows):
+    '''Nests serialized comments listed depth first, a comment whose parent is not among the rows starts a tree'''
+    by_id = {}
+    roots = []
+    for row in rows:
+        row['replies'] = []
+        parent = by_id.get(row['parent'])
+        (parent['replies'] if parent is not None else roots).append(row)
+        by_id[row['id']] = row
+    return roots
+
+
+def apply_comment_delta(review_id, delta):
+    Review.objects.filter(pk=review_id).update(comment_count=F('comment_count') + delta)
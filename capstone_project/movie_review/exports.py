@@ -0,0 +1,49 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_FIELDS = ['id', 'movie', 'user', 'rating', 'comment', 'created_at', 'updated_at']
+# movie and user are resolved by the same query that reads the reviews
+EXPORT_COLUMNS = ['id', 'movie__title', 'user__username', 'rating', 'comment', 'created_at', 'updated_at']
+
+
+def review_rows(queryset, chunk_size=2000):
+    '''Yields every review of the queryset as a tuple of EXPORT_FIELDS in id order.
+
+    The reviews are read in keyset chunks on the primary key, one query per chunk. iterator() alone
+    would not bound memory on MySQL, whose driver buffers the whole result set on the client.
+    '''
+    queryset = queryset.order_by('pk').values_list(*EXPORT_COLUMNS)
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n'
+
+
+class _Echo:
+    '''A file-like object that hands back whatever csv.writer writes to it'''
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+
+def export_reviews(queryset, export_format, chunk_size=2000):
+    '''Streams the reviews of the queryset as NDJSON or CSV text chunks'''
+    rows = review_rows(queryset, chunk_size)
+    return ndjson_lines(rows) if export_format == 'ndjson' else csv_lines(rows)
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import FeedEntry, Follow, Review, User
+
+
+def fans_out(follower_count):
+    '''Whether the new reviews of an author with this many followers are copied to their followers' timelines.
+
+    The reviews of the others are pulled by the feeds of their followers at read time. An author falling
+    back under the limit fans out again from their next review on, what they wrote while pulled is not
+    copied to the timelines.
+    '''
+    return follower_count < settings.FEED_FANOUT_FOLLOWER_LIMIT
+
+
+def feed_entry(user_id, review):
+    return FeedEntry(user_id=user_id, review_id=review.pk, author_id=review.user_id, created_at=review.created_at)
+
+
+def fan_out_review(review):
+    '''Copies a new review to the timelines of its author's followers, returns how many timelines it went to.
+
+    Nothing is copied for an author with FEED_FANOUT_FOLLOWER_LIMIT followers or more, so a review never
+    costs more than that many inserts.
+    '''
+    limit = settings.FEED_FANOUT_FOLLOWER_LIMIT
+    followers = list(Follow.objects.filter(followed_id=review.user_id).values_list('follower_id', flat=True)[:limit])
+    # follower_count counts the same rows, reaching the limit here is what makes the feeds pull the author
+    if not fans_out(len(followers)):
+        return 0
+    FeedEntry.objects.bulk_create([feed_entry(user_id, review) for user_id in followers], ignore_conflicts=True)
+    return len(followers)
+
+
+def follow(follower, followed):
+    '''Makes follower follow followed, returns False when it already did.
+
+    The latest FEED_LENGTH reviews of the followed user go to the follower's timeline straight away,
+    unless the feed pulls them at read time anyway.
+    '''
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(follower=follower, followed=followed)
+        if not created:
+            return False
+        # the receivers in signals.py counted the new follower already
+        follower_count = User.objects.filter(pk=followed.pk).values_list('follower_count', flat=True).get()
+        if fans_out(follower_count):
+            latest = (
+                Review.objects.filter(user=followed).order_by('-created_at', '-id')
+                .only('pk', 'user_id', 'created_at')[:settings.FEED_LENGTH]
+            )
+            FeedEntry.objects.bulk_create([feed_entry(follower.pk, review) for review in latest], ignore_conflicts=True)
+    return True
+
+
+def unfollow(follower, followed):
+    '''Makes follower stop following followed and drops their reviews from its timeline.
+
+    Returns False when follower did not follow them.
+    '''
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followed=followed).delete()
+        FeedEntry.objects.filter(user=follower, author=followed).delete()
+    return bool(deleted)
+
+
+def apply_follower_delta(user_id, delta):
+    User.objects.filter(pk=user_id).update(follower_count=F('follower_count') + delta)
+
+
+def feed_querysets(user):
+    '''The rows of the user's feed, as querysets of {'review_id', 'created_at'} rows to merge.
+
+    The first reads the user's timeline. When the user follows authors whose reviews are not fanned out,
+    the second reads their reviews from the review table itself.
+    '''
+    pulled = list(
+        Follow.objects.filter(follower=user, followed__follower_count__gte=settings.FEED_FANOUT_FOLLOWER_LIMIT)
+        .values_list('followed_id', flat=True)
+    )
+    timeline = FeedEntry.objects.filter(user=user)
+    if not pulled:
+        return [timeline.values('review_id', 'created_at')]
+    # the entries fanned out before an author crossed the limit are read from their reviews now
+    timeline = timeline.exclude(author_id__in=pulled)
+    reviews = Review.objects.filter(user_id__in=pulled).annotate(review_id=F('id'))
+    return [timeline.values('review_id', 'created_at'), reviews.values('review_id', 'created_at')]
+
+
+def trim_feeds():
+    '''Drops the entries past the newest FEED_LENGTH of every timeline, returns how many were dropped.
+
+    Fan-out only ever adds to the timelines, this is meant to run periodically to keep them bounded.
+    Every timeline over the length is trimmed with two queries of its own.
+    '''
+    length = settings.FEED_LENGTH
+    over = list(
+        FeedEntry.objects.values('user').annotate(entries=Count('pk')).filter(entries__gt=length)
+        .values_list('user', flat=True)
+    )
+    dropped = 0
+    for user_id in over:
+        timeline = FeedEntry.objects.filter(user_id=user_id)
+        # the oldest entry to keep
+        newest = timeline.order_by('-created_at', '-review_id').values_list('created_at', 'review_id')
+        created_at, review_id = newest[length - 1]
+        older = Q(created_at__lt=created_at) | Q(created_at=created_at, review_id__lt=review_id)
+        deleted, _ = timeline.filter(older).delete()
+        dropped += deleted
+    return dropped
@@ -0,0 +1,112 @@
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+FIELDSET_PARAMS = ('fields', 'omit', 'expand')
+
+
+class Fieldset:
+    '''The fields a client picked with ?fields=, ?omit= and ?expand=, each a comma separated list of field names.
+
+    `fields` keeps only the named fields, None keeps them all. `omit` drops fields and `expand` adds
+    the expandable ones, which are left out unless asked for, either by name in `fields` or in `expand`.
+    '''
+
+    def __init__(self, fields=None, omit=(), expand=()):
+        self.fields = fields
+        self.omit = omit
+        self.expand = expand
+
+    @classmethod
+    def from_query(cls, params):
+        def names(param):
+            return [name.strip() for value in params.getlist(param) for name in value.split(',') if name.strip()]
+        return cls(names('fields') if 'fields' in params else None, names('omit'), names('expand'))
+
+    @property
+    def is_default(self):
+        return self.fields is None and not self.omit and not self.expand
+
+    def select(self, names, expandable):
+        '''The names, in their order, of the fields to output out of the given ones, ValidationError for unknown names'''
+        errors = {}
+        for param, asked, known in (
+            ('fields', self.fields or (), names), ('omit', self.omit, names), ('expand', self.expand, expandable),
+        ):
+            unknown = [name for name in asked if name not in known]
+            if unknown:
+                errors[param] = [f'Unknown field: {name}' for name in unknown]
+        if errors:
+            raise ValidationError(errors)
+        if self.fields is not None:
+            wanted = set(self.fields)
+        else:
+            wanted = {name for name in names if name not in expandable}
+        wanted = (wanted | set(self.expand)) - set(self.omit)
+        return [name for name in names if name in wanted]
+
+
+class SparseFieldsetMixin:
+    '''Trims a serializer's fields to the Fieldset under 'fieldset' in its context, the defaults when there is none.
+
+    Fields named in `expandable_fields` are costly to compute and only output when asked for.
+    `field_columns` names the model columns read by the fields that are not a model field of
+    their own name, see requested_columns(). Only the outermost serializer of a response is
+    trimmed, the serializers nested in it always show their default fields.
+    '''
+    expandable_fields = ()
+    field_columns = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset') if self._is_outermost() else None
+        names = (fieldset or Fieldset()).select(list(fields), self.expandable_fields)
+        return {name: fields[name] for name in names}
+
+    def _is_outermost(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, ListSerializer) and parent.parent is None)
+
+    def requested_columns(self):
+        '''The names of the model columns the fields to output read, so the others can be left unloaded'''
+        concrete = {field.name for field in self.Meta.model._meta.concrete_fields}
+        columns = set()
+        for name, field in self.fields.items():
+            if name in self.field_columns:
+                columns.update(self.field_columns[name])
+            elif field.source in concrete:
+                columns.add(field.source)
+        return columns
+
+
+class SparseFieldsetViewMixin:
+    '''Lets GET requests pick the fields of the response, and reads only the columns and relations those need.
+
+    The view's queryset goes through only_requested_columns(), and views skip the prefetches of
+    fields missing from requested_fields.
+    '''
+
+    @cached_property
+    def fieldset(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return Fieldset()
+        return Fieldset.from_query(self.request.query_params)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'fieldset': self.fieldset}
+
+    @cached_property
+    def requested_serializer(self):
+        return self.get_serializer()
+
+    @property
+    def requested_fields(self):
+        '''The names of the fields of the response, checked against the serializer once per request'''
+        return self.requested_serializer.fields.keys()
+
+    def only_requested_columns(self, queryset, *required):
+        '''Leaves the columns no requested field reads unloaded, `required` names columns the view itself reads'''
+        if self.fieldset.is_default:
+            return queryset
+        columns = self.requested_serializer.requested_columns() | {name.lstrip('-') for name in required}
+        return queryset.only('pk', *columns)
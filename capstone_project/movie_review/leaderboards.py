@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .cache import bump_versions
+from .models import LeaderboardEntry, Movie, Review
+
+
+def top_rated(size):
+    '''Ranks the movies on a Bayesian average, padding each with LEADERBOARD_PRIOR_RATINGS ratings of the catalog mean
+
+    A movie with a handful of ratings stays near the mean, only many good ratings pull it to the top.
+    '''
+    totals = Movie.objects.aggregate(count=Sum('rating_count'), total=Sum('rating_sum'))
+    if not totals['count']:
+        return []
+    prior = float(settings.LEADERBOARD_PRIOR_RATINGS)
+    mean = totals['total'] / totals['count']
+    score = (
+        (Cast('rating_sum', FloatField()) + Value(prior * mean)) / (Cast('rating_count', FloatField()) + Value(prior))
+    )
+    movies = (
+        Movie.objects.filter(rating_count__gt=0)
+        .annotate(score=score)
+        .order_by('-score', '-rating_count', 'id')
+        .values_list('id', 'score')
+    )
+    return list(movies[:size])
+
+
+def trending(size, now=None):
+    '''Ranks the movies on their review velocity, the reviews per day over the last LEADERBOARD_TRENDING_DAYS days.
+
+    Movies as fast as each other are ordered by the window before, the one that picked up speed first.
+    Both windows are counted in one range scan of the (created_at, movie) index.
+    '''
+    window = timedelta(days=settings.LEADERBOARD_TRENDING_DAYS)
+    now = now or timezone.now()
+    counts = (
+        Review.objects.filter(created_at__gte=now - 2 * window, created_at__lt=now)
+        .order_by()
+        .values('movie')
+        .annotate(
+            recent=Count('id', filter=Q(created_at__gte=now - window)),
+            previous=Count('id', filter=Q(created_at__lt=now - window)),
+        )
+        .filter(recent__gt=0)
+        .order_by('-recent', 'previous', 'movie')
+        .values_list('movie', 'recent')
+    )
+    return [(movie_id, recent / window.days) for movie_id, recent in counts[:size]]
+
+
+BOARDS = {
+    LeaderboardEntry.TOP_RATED: top_rated,
+    LeaderboardEntry.TRENDING: trending,
+}
+
+
+def refresh_leaderboards(boards=None):
+    '''Recomputes the given leaderboards (all of them by default), each replaced in one transaction'''
+    refreshed = {}
+    for board in boards or BOARDS:
+        with transaction.atomic():
+            ranked = BOARDS[board](settings.LEADERBOARD_SIZE)
+            LeaderboardEntry.objects.filter(board=board).delete()
+            LeaderboardEntry.objects.bulk_create([
+                LeaderboardEntry(board=board, rank=rank, movie_id=movie_id, score=score)
+                for rank, (movie_id, score) in enumerate(ranked, start=1)
+            ])
+            # the boards are served under the catalog version
+            bump_versions()
+        refreshed[board] = len(ranked)
+    return refreshed
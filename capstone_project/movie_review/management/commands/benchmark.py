@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movie_review.benchmarks import SUITES, find_regressions
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs a benchmark suite against the data in the configured database and prints the results as JSON, '
+        'optionally flagging regressions against the JSON of an earlier run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES), help='Benchmark suite to run')
+        parser.add_argument('--requests', type=int, help='Requests sent per measurement, each suite has its own default')
+        parser.add_argument('--concurrency', type=int, help='Requests in flight at once, for the suites that run them concurrently')
+        parser.add_argument(
+            '--size', type=int, help='Size of the data built by the suites that build their own, e.g. comments in the thread',
+        )
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run of the same suite to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 latency growth over the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        suite_options = {key: options[key] for key in ('requests', 'concurrency', 'size') if options[key] is not None}
+        results = SUITES[options['suite']](**suite_options)
+        report = {'suite': options['suite'], 'results': results}
+
+        regressions = []
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read the baseline: {exc}')
+            if baseline.get('suite') != options['suite']:
+                raise CommandError(f"The baseline is a run of the {baseline.get('suite')!r} suite")
+            regressions = find_regressions(results, baseline['results'], options['tolerance'])
+            report['regressions'] = regressions
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+        self.stdout.write(output)
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) against the baseline:\n' + '\n'.join(regressions))
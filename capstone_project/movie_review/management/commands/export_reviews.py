@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from movie_review.exports import export_reviews
+from movie_review.models import Review
+from movie_review.serializers import ReviewExportQuerySerializer
+
+
+class Command(BaseCommand):
+    help = 'Streams every review, optionally filtered, as NDJSON or CSV to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--output', help='File to write to, defaults to stdout')
+        parser.add_argument('--movie', help='Only reviews of the movie with this title')
+        parser.add_argument('--user', help='Only reviews by this username')
+        parser.add_argument('--since', help='Only reviews created at or after this ISO 8601 date time')
+        parser.add_argument('--until', help='Only reviews created before this ISO 8601 date time')
+        parser.add_argument('--chunk-size', type=int, default=settings.REVIEW_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {name: options[name] for name in ['movie', 'user', 'since', 'until'] if options[name] is not None}
+        params = ReviewExportQuerySerializer(data=filters)
+        if not params.is_valid():
+            raise CommandError(params.errors)
+        reviews = params.filter_queryset(Review.objects.all())
+        chunks = export_reviews(reviews, options['format'], options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movie_review.votes import fold_review_votes
+
+
+class Command(BaseCommand):
+    help = 'Adds the upvotes counted on the vote shards to helpful_votes on their reviews, meant to run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of shards folded per transaction')
+
+    def handle(self, *args, **options):
+        updated = fold_review_votes(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Folded the upvotes of {len(updated)} review(s)'))
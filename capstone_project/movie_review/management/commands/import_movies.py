@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from movie_review.cache import bump_versions
+from movie_review.resolver import assign_slugs, invalidate_movie_keys
+from movie_review.models import Movie
+from movie_review.search import index_movies
+from movie_review.serializers import MovieImportSerializer
+
+# fields overwritten when an imported title already exists, the rating aggregates are left alone
+UPDATE_FIELDS = ['description', 'director', 'release_date', 'genre', 'trailer_link']
+
+
+class Command(BaseCommand):
+    help = 'Streams movies from a CSV or JSON lines file and upserts them on their title in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or a JSON lines file with one movie object per line')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and upserted per transaction')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording how many rows are committed, defaults to <path>.checkpoint',
+        )
+        parser.add_argument('--resume', action='store_true', help='Skip the rows the checkpoint says are committed')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+
+        skip = self.read_checkpoint(checkpoint, path) if options['resume'] else 0
+        if skip:
+            self.stdout.write(f'Resuming after row {skip}')
+
+        validator = MovieImportSerializer()
+        processed, imported, invalid = skip, 0, 0
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as source:
+            rows = islice(self.read_rows(source, file_format), skip, None)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                chunk_started = time.monotonic()
+
+                movies = {}
+                for number, row in enumerate(chunk, start=processed + 1):
+                    try:
+                        data = validator.run_validation(row)
+                    except ValidationError as exc:
+                        invalid += 1
+                        self.stderr.write(f'Row {number} skipped: {json.dumps(exc.detail)}')
+                        continue
+                    # a title repeated within the chunk keeps its last row
+                    movies[data['title']] = Movie(**data)
+
+                self.upsert(list(movies.values()), chunk_size)
+                processed += len(chunk)
+                imported += len(movies)
+                self.write_checkpoint(checkpoint, path, processed)
+
+                elapsed = time.monotonic() - chunk_started
+                self.stdout.write(
+                    f'{processed} rows read, {imported} upserted, {invalid} invalid '
+                    f'({len(chunk) / elapsed:.0f} rows/s, {(processed - skip) / (time.monotonic() - started):.0f} rows/s overall)'
+                )
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} movie(s) from {processed - skip} row(s) in {time.monotonic() - started:.1f}s, {invalid} invalid'
+        ))
+
+    def read_rows(self, source, file_format):
+        if file_format == 'csv':
+            for row in csv.DictReader(source):
+                # empty cells mean no value rather than an empty string
+                yield {key: (value if value != '' else None) for key, value in row.items()}
+            return
+        for line_number, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f'Line {line_number} is not valid JSON: {exc}')
+
+    def upsert(self, movies, chunk_size):
+        if not movies:
+            return
+        options = {'update_conflicts': True, 'update_fields': UPDATE_FIELDS}
+        # MySQL upserts on any unique key and refuses an explicit conflict target
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['title']
+        titles = [movie.title for movie in movies]
+        with transaction.atomic():
+            # bulk_create skips the save receivers, so slug, index and invalidate the chunk here.
+            # Movies already imported keep their slug, it is not among the updated fields
+            assign_slugs(movies)
+            Movie.objects.bulk_create(movies, batch_size=chunk_size, **options)
+            index_movies(Movie.objects.filter(title__in=titles))
+            keys = titles + list(Movie.objects.filter(title__in=titles).values_list('slug', flat=True))
+            invalidate_movie_keys(keys)
+            bump_versions(keys=keys)
+
+    def read_checkpoint(self, checkpoint, path):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint, encoding='utf-8') as handle:
+            state = json.load(handle)
+        if state.get('source') != os.path.abspath(path):
+            raise CommandError(f'{checkpoint} belongs to {state.get("source")}, not {path}')
+        return state['rows']
+
+    def write_checkpoint(self, checkpoint, path, rows):
+        # write then rename, so a crash never leaves a half written checkpoint behind
+        temporary = f'{checkpoint}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump({'source': os.path.abspath(path), 'rows': rows}, handle)
+        os.replace(temporary, checkpoint)
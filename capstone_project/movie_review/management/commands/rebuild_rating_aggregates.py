@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from movie_review.aggregates import drifted_movies, rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalised rating aggregates on every movie from its reviews, or reports drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report movies whose stored aggregates drifted from their reviews and fail if there are any',
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(drifted_movies().values_list('title', 'rating_count', 'rating_sum', 'actual_count', 'actual_sum'))
+        for title, count, total, actual_count, actual_sum in drifted:
+            self.stdout.write(
+                f'{title}: stored {count} ratings summing to {total}, actual {actual_count} summing to {actual_sum}'
+            )
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f'{len(drifted)} movie(s) have drifted rating aggregates')
+            self.stdout.write(self.style.SUCCESS('Rating aggregates are in sync'))
+            return
+
+        with transaction.atomic():
+            updated = rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating aggregates for {updated} movie(s), {len(drifted)} had drifted'
+        ))
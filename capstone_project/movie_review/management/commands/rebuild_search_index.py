@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from movie_review.models import Movie
+from movie_review.search import InvertedIndexBackend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the movie search term index from scratch, needed after switching MOVIE_SEARCH_BACKEND to inverted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of movies indexed per transaction')
+
+    def handle(self, *args, **options):
+        backend = InvertedIndexBackend()
+        batch_size = options['batch_size']
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(Movie.objects.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                backend.index_movies(batch)
+            indexed += len(batch)
+            last_id = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} movie(s)'))
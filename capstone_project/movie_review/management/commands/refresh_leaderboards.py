@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from movie_review.leaderboards import BOARDS, refresh_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the top rated and trending leaderboards, run it periodically as the trending window slides'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'boards', nargs='*', choices=sorted(BOARDS), help='Leaderboards to refresh, all of them when none is given',
+        )
+
+    def handle(self, *args, **options):
+        for board, ranked in refresh_leaderboards(options['boards']).items():
+            self.stdout.write(self.style.SUCCESS(f'Ranked {ranked} movie(s) on {board}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from movie_review.similarity import rebuild_similar_movies, refresh_similar_movies
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the similar movies of the movies whose ratings changed since the last run, or of all of them with --full'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true', help='Rebuild the neighbours of every movie instead of the flagged ones only',
+        )
+        parser.add_argument('--block-size', type=int, default=500, help='Number of movies compared per matrix product')
+
+    def handle(self, *args, **options):
+        refresh = rebuild_similar_movies if options['full'] else refresh_similar_movies
+        changed = refresh(block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated the similar movies of {len(changed)} movie(s)'))
@@ -0,0 +1,142 @@
+import random
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from movie_review.aggregates import rebuild_rating_aggregates
+from movie_review.cache import bump_versions
+from movie_review.leaderboards import refresh_leaderboards
+from movie_review.models import Movie, Review, User
+from movie_review.resolver import assign_slugs
+from movie_review.search import index_movies
+
+GENRES = ['Action', 'Comedy', 'Drama', 'Horror', 'Romance', 'Sci-Fi', 'Thriller', 'Animation', 'Documentary']
+WORDS = [
+    'night', 'city', 'love', 'last', 'return', 'dark', 'star', 'river', 'war', 'secret', 'summer', 'ghost',
+    'machine', 'heart', 'road', 'king', 'storm', 'island', 'dream', 'shadow', 'fire', 'garden', 'empire', 'echo',
+]
+MOVIE_PREFIX = 'Seed Movie'
+USER_PREFIX = 'seed_user_'
+# reviews whose ids fall in the same run share a creation time
+DATE_RUN = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a deterministic data set: N movies, M users and Zipf distributed reviews, '
+        'at most one per user and movie. The same options always produce the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--reviews', type=int, default=20000, help='Total reviews, capped at movies x users')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of movie popularity')
+        parser.add_argument('--days', type=int, default=365, help='Reviews are spread over this many past days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded movies and users first')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        movie_total, user_total = options['movies'], options['users']
+        if movie_total < 1 or user_total < 1:
+            raise CommandError('--movies and --users must be at least 1')
+        batch_size = options['batch_size']
+
+        if options['clear']:
+            Movie.objects.filter(title__startswith=MOVIE_PREFIX).delete()
+            User.objects.filter(username__startswith=USER_PREFIX).delete()
+        if Movie.objects.filter(title__startswith=MOVIE_PREFIX).exists():
+            raise CommandError('Seeded data already exists, run again with --clear to replace it')
+
+        with transaction.atomic():
+            movies = self.create_movies(rng, movie_total, batch_size)
+            users = self.create_users(user_total, batch_size)
+            review_count = self.create_reviews(rng, movies, users, options, batch_size)
+            # bulk inserts skip the signal receivers, so bring the derived data up to date in one go
+            rebuild_rating_aggregates(Movie.objects.filter(pk__in=movies))
+            Movie.objects.filter(pk__in=movies).update(similar_movies_stale=True)
+            for start in range(0, len(movies), batch_size):
+                index_movies(Movie.objects.filter(pk__in=movies[start:start + batch_size]))
+            refresh_leaderboards()
+            bump_versions()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(movies)} movies, {len(users)} users and {review_count} reviews'
+        ))
+
+    def create_movies(self, rng, total, batch_size):
+        start = timezone.now().date()
+        movies = [
+            Movie(
+                title=f'{MOVIE_PREFIX} {i:07d}',
+                director=f'Director {rng.randrange(total // 10 + 1)}',
+                genre=rng.choice(GENRES),
+                release_date=start - timedelta(days=rng.randrange(365 * 60)) if rng.random() > 0.05 else None,
+                description=' '.join(rng.choice(WORDS) for _ in range(rng.randrange(5, 30))),
+            )
+            for i in range(total)
+        ]
+        # bulk_create skips the save receiver setting the slugs
+        for start in range(0, total, batch_size):
+            assign_slugs(movies[start:start + batch_size])
+        Movie.objects.bulk_create(movies, batch_size=batch_size)
+        # MySQL does not hand back the new ids from bulk_create, so read them back in seed order
+        return list(Movie.objects.filter(title__startswith=MOVIE_PREFIX).order_by('title').values_list('pk', flat=True))
+
+    def create_users(self, total, batch_size):
+        # hashing once keeps seeding fast, every seeded user logs in with "password"
+        password = make_password('password')
+        User.objects.bulk_create(
+            [User(username=f'{USER_PREFIX}{i:07d}', email=f'{USER_PREFIX}{i:07d}@example.com', password=password)
+             for i in range(total)],
+            batch_size=batch_size,
+        )
+        return list(User.objects.filter(username__startswith=USER_PREFIX).order_by('username').values_list('pk', flat=True))
+
+    def create_reviews(self, rng, movies, users, options, batch_size):
+        total = min(options['reviews'], len(movies) * len(users))
+        # movie i is picked with probability proportional to 1 / (i + 1) ** s
+        cumulative = list(accumulate(1 / (rank + 1) ** options['zipf'] for rank in range(len(movies))))
+        now, window = timezone.now(), options['days'] * 86400
+
+        created, batch, last_id = 0, [], Review.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        for index, user_id in enumerate(users):
+            # spread the total evenly over the users, the remainder going to the first ones
+            wanted = total // len(users) + (1 if index < total % len(users) else 0)
+            picked = set()
+            while len(picked) < wanted:
+                if len(picked) > len(movies) // 2:
+                    # nearly every movie is taken, sampling by rejection would crawl
+                    remaining = [i for i in range(len(movies)) if i not in picked]
+                    picked.update(rng.sample(remaining, wanted - len(picked)))
+                    break
+                picked.add(bisect_left(cumulative, rng.random() * cumulative[-1]))
+            for movie_index in sorted(picked):
+                batch.append(Review(
+                    movie_id=movies[movie_index], user_id=user_id,
+                    rating=rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 4, 6, 4])[0], comment=rng.choice(WORDS),
+                ))
+            if len(batch) >= batch_size:
+                last_id = self.flush_reviews(rng, batch, last_id, now, window)
+                created += len(batch)
+                batch = []
+        if batch:
+            self.flush_reviews(rng, batch, last_id, now, window)
+            created += len(batch)
+        return created
+
+    def flush_reviews(self, rng, batch, last_id, now, window):
+        Review.objects.bulk_create(batch)
+        new_ids = list(Review.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True))
+        # created_at is auto_now_add, so the new rows are dated afterwards, a small run of ids at a time
+        for start in range(0, len(new_ids), DATE_RUN):
+            created_at = now - timedelta(seconds=rng.randrange(window))
+            Review.objects.filter(pk__in=new_ids[start:start + DATE_RUN]).update(created_at=created_at, updated_at=created_at)
+        return new_ids[-1]
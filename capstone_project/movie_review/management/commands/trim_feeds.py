@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movie_review.feeds import trim_feeds
+
+
+class Command(BaseCommand):
+    help = 'Drops the entries past the newest FEED_LENGTH of every feed timeline, meant to run periodically'
+
+    def handle(self, *args, **options):
+        dropped = trim_feeds()
+        self.stdout.write(self.style.SUCCESS(f'Dropped {dropped} review(s) from the feed timelines'))
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:46
+
+import math
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# a frozen copy of the tokenizer and weights of search.py as they were when this migration was written,
+# so later changes to the live search never change what it does
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with',
+])
+FIELD_WEIGHTS = {'title': 3.0, 'director': 2.0, 'genre': 2.0, 'description': 1.0}
+FULLTEXT_COLUMNS = ('title', 'description', 'director', 'genre')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def movie_terms(movie):
+    weights = defaultdict(float)
+    for field, field_weight in FIELD_WEIGHTS.items():
+        counts = defaultdict(int)
+        for token in tokenize(getattr(movie, field)):
+            counts[token] += 1
+        for term, count in counts.items():
+            weights[term] += field_weight * (1 + math.log(count))
+    return weights
+
+
+def create_fulltext_index(apps, schema_editor):
+    # only MySQL gets the FULLTEXT index, every other database searches the term table
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    columns = ', '.join(quote(column) for column in FULLTEXT_COLUMNS)
+    schema_editor.execute(
+        f'ALTER TABLE {quote("movie_review_movie")} ADD FULLTEXT INDEX {quote("movie_fulltext_idx")} ({columns})'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    schema_editor.execute(f'ALTER TABLE {quote("movie_review_movie")} DROP INDEX {quote("movie_fulltext_idx")}')
+
+
+def build_search_terms(apps, schema_editor):
+    Movie = apps.get_model('movie_review', 'Movie')
+    MovieSearchTerm = apps.get_model('movie_review', 'MovieSearchTerm')
+    MovieSearchTerm.objects.bulk_create(
+        (
+            MovieSearchTerm(movie_id=movie.pk, term=term, weight=weight)
+            for movie in Movie.objects.iterator()
+            for term, weight in movie_terms(movie).items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_review', '0006_review_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='movie_review.movie')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('term', 'movie'), name='unique_search_term_per_movie')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(build_search_terms, migrations.RunPython.noop),
+    ]
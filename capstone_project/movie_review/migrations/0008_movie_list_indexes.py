@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_review', '0007_movie_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='average_rating',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='genre',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='rating_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='release_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
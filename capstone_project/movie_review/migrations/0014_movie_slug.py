@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:30
+
+import hashlib
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_slugs(apps, schema_editor):
+    # the same slugs resolver.assign_slugs gives, the first movie by id keeps the plain one
+    Movie = apps.get_model('movie_review', 'Movie')
+    taken = set()
+    movies = list(Movie.objects.order_by('pk').only('pk', 'title'))
+    for movie in movies:
+        base = slugify(movie.title, allow_unicode=True)[:200] or 'movie'
+        if base in taken:
+            movie.slug = f"{base}-{hashlib.md5(movie.title.encode('utf-8')).hexdigest()[:8]}"
+        else:
+            movie.slug = base
+        taken.add(base)
+    Movie.objects.bulk_update(movies, ['slug'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_review', '0013_review_comments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, editable=False, max_length=220, null=True),
+        ),
+        migrations.RunPython(backfill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='movie',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, editable=False, max_length=220, unique=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:10
+
+import hashlib
+
+from django.db import migrations
+
+
+def suffix_reserved_slugs(apps, schema_editor):
+    # the slugs resolver.assign_slugs gives now, api/movies/search/ and api/movies/batch/ shadowed these movies
+    Movie = apps.get_model('movie_review', 'Movie')
+    movies = list(Movie.objects.filter(slug__in=['search', 'batch']).only('pk', 'title', 'slug'))
+    for movie in movies:
+        movie.slug = f"{movie.slug}-{hashlib.md5(movie.title.encode('utf-8')).hexdigest()[:8]}"
+    Movie.objects.bulk_update(movies, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_review', '0015_feeds'),
+    ]
+
+    operations = [
+        migrations.RunPython(suffix_reserved_slugs, migrations.RunPython.noop),
+    ]
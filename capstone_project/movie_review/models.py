@@ -1,22 +1,93 @@
-from django.db import models
+from django.db import models, transaction
 from datetime import date
 from django.contrib.auth.models import AbstractUser
 
 '''model for movie'''
 class Movie(models.Model):
     title = models.CharField(max_length=200, unique=True)
+    # the title normalised for URLs, set from it by the receivers in signals.py, see resolver.assign_slugs
+    slug = models.SlugField(max_length=220, unique=True, allow_unicode=True, editable=False)
     description = models.TextField(null=True, blank=True)
     director = models.CharField(max_length=200)
-    release_date = models.DateField(null=True, blank=True)
-    genre = models.CharField(max_length=100, null=True, blank=True)
+    release_date = models.DateField(null=True, blank=True, db_index=True)
+    genre = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     trailer_link = models.URLField(null=True, blank=True)
+    # denormalised rating aggregates, kept in sync by the receivers in signals.py
+    # the indexed ones back the sort orders of the movie list
+    rating_count = models.PositiveIntegerField(default=0, editable=False, db_index=True)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False, db_index=True)
+    # set whenever a rating of the movie changes, refresh_similar_movies recomputes the flagged movies only
+    similar_movies_stale = models.BooleanField(default=False, editable=False, db_index=True)
 
     class Meta:
         ordering = ['title']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored title and slug so anything cached under them can be invalidated after a rename
+        instance._stored_title = instance.__dict__.get('title')
+        instance._stored_slug = instance.__dict__.get('slug')
+        return instance
+
     def __str__(self):
         return f'{self.title} released on ({self.release_date or "No release date"})'
 
+'''model for the movie search index, one row per distinct term of a movie'''
+class MovieSearchTerm(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'movie'], name='unique_search_term_per_movie')
+        ]
+
+    def __str__(self):
+        return f'{self.term} in {self.movie_id} ({self.weight})'
+
+'''model for the precomputed "similar movies" of a movie, its top neighbours by rating similarity'''
+class MovieSimilarity(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['movie', 'similar'], name='unique_similarity_per_movie_pair')
+        ]
+        indexes = [
+            # serves the neighbours of a movie already in score order
+            models.Index(fields=['movie', '-score'], name='similarity_movie_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.movie_id} is like {self.similar_id} ({self.score:.3f})'
+
+'''model for the precomputed leaderboards, one row per ranked movie of a board'''
+class LeaderboardEntry(models.Model):
+    TOP_RATED = 'top_rated'
+    TRENDING = 'trending'
+    BOARD_CHOICES = [
+        (TOP_RATED, 'top rated'),
+        (TRENDING, 'trending'),
+    ]
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    rank = models.PositiveIntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # also the index a board is paged through in rank order
+            models.UniqueConstraint(fields=['board', 'rank'], name='unique_rank_per_board')
+        ]
+
+    def __str__(self):
+        return f'{self.board} #{self.rank}: {self.movie_id} ({self.score:.3f})'
+
 '''model for user'''
 from django.utils.timezone import now
 class User(AbstractUser):
@@ -25,6 +96,8 @@ class User(AbstractUser):
         ('admin', 'admin'),
         ('member', 'member')
     ], default='member')
+    # denormalised number of followers, kept in sync by the receivers in signals.py, see feeds.fans_out
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
@@ -44,12 +117,151 @@ class Review(models.Model):
         (5,5),
     ]
     rating = models.SmallIntegerField(choices=RATING_CHOICES, default=1, help_text='Rating of the movie where 1 is the lowest and 5 is the highest')
+    # denormalised upvote count, fold_review_votes adds the vote counter shards to it periodically
+    helpful_votes = models.IntegerField(default=0, editable=False)
+    # denormalised number of comments in the review's thread, kept in sync by the receivers in signals.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['movie', 'user'], name='unique_review_per_user_per_movie')
         ]
-        ordering = ['-created_at']
+        indexes = [
+            # backs the keyset pagination of a movie's reviews, newest first
+            models.Index(fields=['movie', 'created_at', 'id'], name='review_movie_created_idx'),
+            # the trending leaderboard counts the reviews of a recent window per movie from this index alone
+            models.Index(fields=['created_at', 'movie'], name='review_created_movie_idx'),
+            # backs the keyset pagination of a movie's reviews, most helpful first
+            models.Index(fields=['movie', '-helpful_votes', '-id'], name='review_movie_helpful_idx'),
+            # the feeds read the latest reviews of the authors they pull from, and backfill a new follow
+            models.Index(fields=['user', 'created_at', 'id'], name='review_user_created_idx'),
+        ]
+        ordering = ['-created_at', '-id']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what is stored so the movie aggregates can be adjusted by the difference on save
+        instance._stored_rating = instance.__dict__.get('rating')
+        instance._stored_movie_id = instance.__dict__.get('movie_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # the post_save receiver updates the movie aggregates, keep both writes in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.user} rated {self.movie}, {self.rating}'
+
+'''model for the upvotes on reviews, one per user and review'''
+class ReviewVote(models.Model):
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='votes')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_votes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['review', 'user'], name='unique_vote_per_user_per_review')
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} upvoted {self.review_id}'
+
+'''model for the vote counter shards of a review, votes land on a random shard instead of the review row'''
+class ReviewVoteShard(models.Model):
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='vote_shards')
+    shard = models.PositiveSmallIntegerField()
+    # votes counted since the last fold, negative when more votes were withdrawn than cast
+    delta = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['review', 'shard'], name='unique_shard_per_review')
+        ]
+
+    def __str__(self):
+        return f'{self.review_id}/{self.shard}: {self.delta:+d}'
+
+'''model for the watchlists, one row per movie a user saved to watch'''
+class WatchlistEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watchlist')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie'], name='unique_watchlist_entry_per_user')
+        ]
+        indexes = [
+            # backs the keyset pagination of a user's watchlist, latest additions first
+            models.Index(fields=['user', 'added_at', 'id'], name='watchlist_user_added_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} wants to watch {self.movie_id}'
+
+'''model for the threaded comments under a review, stored with a materialised path'''
+class ReviewComment(models.Model):
+    # every comment appends its id, in fixed width base 36, to the path of its parent, so ordering a
+    # thread by path lists it depth first and a subtree is the range of paths sharing its root's prefix
+    PATH_STEP = 8
+    MAX_DEPTH = 29
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='comments')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    path = models.CharField(max_length=PATH_STEP * (MAX_DEPTH + 1), editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # every thread and subtree is a range of this index read in path order
+            models.Index(fields=['review', 'path'], name='comment_review_path_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} on review {self.review_id}: {self.body[:30]}'
+
+'''model for the follow graph, one row per user following another'''
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    followed = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # also the index the users someone follows are read from
+            models.UniqueConstraint(fields=['follower', 'followed'], name='unique_follow_per_pair'),
+            models.CheckConstraint(condition=~models.Q(follower=models.F('followed')), name='no_self_follow'),
+        ]
+        indexes = [
+            # the followers a new review is fanned out to
+            models.Index(fields=['followed', 'follower'], name='follow_followed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.follower_id} follows {self.followed_id}'
+
+'''model for the materialised feeds, one row per review fanned out to a follower's timeline'''
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed')
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='+')
+    # copied from the review, so a timeline is paged and trimmed from its own index and an unfollow
+    # drops the author's entries without a join
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'review'], name='unique_feed_entry_per_user')
+        ]
+        indexes = [
+            # backs the keyset pagination of a timeline, newest reviews first
+            models.Index(fields=['user', 'created_at', 'review'], name='feed_user_created_idx'),
+            models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.user} rated {self.movie}, {self.rating}'
\ No newline at end of file
+        return f'review {self.review_id} in the feed of {self.user_id}'
@@ -0,0 +1,228 @@
+import base64
+import binascii
+import heapq
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    '''Opaque cursor pagination that seeks past the last row of the previous page instead of counting and offsetting.
+
+    `ordering` is a sequence of field names (prefixed with '-' for descending) whose last entry must be unique,
+    so that every row has a distinct position. Views can override it with a `keyset_ordering` attribute or a
+    `get_keyset_ordering()` method. NULLs are treated as the smallest value, as MySQL and SQLite both sort them.
+    '''
+    cursor_query_param = 'cursor'
+    cursor_query_description = 'The pagination cursor value.'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering())
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_page_size(self, request):
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.prepare_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.finish_page(list(queryset))
+
+    def prepare_queryset(self, queryset, request, view=None):
+        '''Applies the seek filter and limit for the requested page, the caller evaluates the result'''
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_cursor(request, queryset)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, self.position))
+        # fetch one extra row to know whether there is anything beyond this page
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        '''Trims the extra row fetched by prepare_queryset and works out the neighbouring cursors'''
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        self.page = rows
+        return rows
+
+    def _flip(self, field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _seek_filter(self, ordering, position):
+        '''Builds the lexicographic "comes after position" condition for the given ordering'''
+        condition = Q(pk__in=[])
+        for index in range(len(ordering) - 1, -1, -1):
+            field = ordering[index].lstrip('-')
+            descending = ordering[index].startswith('-')
+            value = position[index]
+            if value is None:
+                after = Q() if descending else Q(**{f'{field}__isnull': False})
+                same = Q(**{f'{field}__isnull': True})
+            else:
+                after = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+                if descending:
+                    after |= Q(**{f'{field}__isnull': True})
+                same = Q(**{field: value})
+            if value is None and descending:
+                # nothing sorts below NULL, only ties on this field can follow
+                condition = same & condition
+            else:
+                condition = after | (same & condition)
+        return condition
+
+    def decode_cursor(self, request, queryset):
+        '''The position and direction of the requested cursor, raises NotFound for anything this page could not
+        have handed out: a cursor of another ordering, or position values the ordering's fields do not accept.
+        '''
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = payload['p'], bool(payload.get('r'))
+            if payload['o'] != list(self.ordering):
+                raise ValueError('cursor of another ordering')
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError('cursor of another length')
+            position = [
+                self._coerce_value(queryset, field.lstrip('-'), value) for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _coerce_value(self, queryset, name, value):
+        if value is None:
+            return None
+        annotation = queryset.query.annotations.get(name)
+        field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+        return field.get_prep_value(field.to_python(value))
+
+    def encode_cursor(self, row, reverse):
+        position = [self._cursor_value(row, field.lstrip('-')) for field in self.ordering]
+        payload = json.dumps({'o': list(self.ordering), 'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _cursor_value(self, row, field):
+        value = row[field] if isinstance(row, dict) else getattr(row, field)
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        return value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': self.cursor_query_description,
+            'schema': {'type': 'string'},
+        }]
+
+
+class MovieKeysetPagination(KeysetPagination):
+    '''Pages the movie catalog in its title order'''
+    ordering = ('title', 'id')
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    '''Pages reviews newest first, ties on created_at are broken by id'''
+    ordering = ('-created_at', '-id')
+
+
+class LeaderboardKeysetPagination(KeysetPagination):
+    '''Pages a leaderboard in rank order, ranks are unique within a board'''
+    ordering = ('rank',)
+
+
+class WatchlistKeysetPagination(KeysetPagination):
+    '''Pages a watchlist latest additions first, ties on added_at are broken by id'''
+    ordering = ('-added_at', '-id')
+
+
+class CommentKeysetPagination(KeysetPagination):
+    '''Pages a comment thread depth first, in the order of the materialised paths'''
+    ordering = ('path',)
+
+    def get_page_size(self, request):
+        return settings.COMMENT_PAGE_SIZE
+
+
+class FeedKeysetPagination(KeysetPagination):
+    '''Pages a feed newest first, ties on created_at are broken by the review id.
+
+    A feed is read from several querysets of rows, see feeds.feed_querysets, each paged by the same
+    cursor and merged into one page.
+    '''
+    ordering = ('-created_at', '-review_id')
+
+    def paginate_querysets(self, querysets, request, view=None):
+        prepared = [self.prepare_queryset(queryset, request, view) for queryset in querysets]
+        if prepared[0] is None:
+            return None
+        # every queryset comes in the page's order, descending unless paging backwards
+        merged = heapq.merge(*prepared, key=itemgetter('created_at', 'review_id'), reverse=not self.reverse)
+        return self.finish_page(list(islice(merged, self.page_size + 1)))
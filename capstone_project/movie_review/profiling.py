@@ -0,0 +1,224 @@
+import json
+import logging
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('movie_review.profiling')
+
+_current_profile = ContextVar('movie_review_profile', default=None)
+
+# runs of placeholders differ only by how many values an IN (...) was given
+PLACEHOLDER_RUN_RE = re.compile(r'%s(\s*,\s*%s)+')
+
+
+def query_shape(sql):
+    '''The SQL with its placeholder lists collapsed, identical for queries that only differ by their parameters'''
+    return PLACEHOLDER_RUN_RE.sub('%s, ...', sql)
+
+
+def serializer_field_origin():
+    '''Names the serializer field whose code is running further up the stack, e.g. "ReviewSerializer.user"'''
+    frame = sys._getframe(2)
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if isinstance(owner, Field):
+            if isinstance(owner, BaseSerializer):
+                return type(owner.child if hasattr(owner, 'child') else owner).__name__
+            return f'{type(owner.parent).__name__}.{owner.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class RequestProfile:
+    '''Queries, database time and serializer time recorded while a request (or a profiled block) runs'''
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.shapes = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # installed as an execute wrapper on every connection, see profile_queries()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == 2:
+                # the stack is only walked once a shape repeats, that is where an N+1 starts
+                self.origins[shape] = serializer_field_origin()
+
+    def repeated_queries(self, threshold):
+        '''Returns [(count, origin, shape)] for the query shapes run at least `threshold` times, most repeated first'''
+        return [
+            (count, self.origins.get(shape), shape)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+@contextmanager
+def wrap_connections(profile):
+    '''Installs the profile as an execute wrapper on every connection of the running thread'''
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+        yield
+
+
+@contextmanager
+def profile_queries():
+    '''Records every query run inside the block on any connection into a RequestProfile'''
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        with wrap_connections(profile):
+            yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@asynccontextmanager
+async def aprofile_queries():
+    '''profile_queries for async code.
+
+    The connections are per thread and the queries of async code run on the thread sync_to_async
+    hands them to, the wrappers are installed and removed there.
+    '''
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    wrappers = ExitStack()
+    try:
+        await sync_to_async(wrappers.enter_context)(wrap_connections(profile))
+        yield profile
+    finally:
+        await sync_to_async(wrappers.close)()
+        _current_profile.reset(token)
+
+
+@contextmanager
+def timed_serialization():
+    '''Adds the time spent in the block to the serializer time of the running request's profile, if there is one'''
+    profile = _current_profile.get()
+    if profile is None or profile.serializing:
+        yield
+        return
+    # only the outermost serializer is timed, nested ones are already inside its time
+    profile.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serializer_time += time.perf_counter() - started
+        profile.serializing = False
+
+
+class ProfiledSerializerMixin:
+    '''Adds the time spent turning objects into data to the profile of the running request, if there is one'''
+
+    def to_representation(self, instance):
+        if _current_profile.get() is None:
+            return super().to_representation(instance)
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class RequestProfilingMiddleware:
+    '''Profiles a sample of the requests, see REQUEST_PROFILING_SAMPLE_RATE.
+
+    A profiled response gets a Server-Timing header with the database, serializer and view times, and a
+    structured log line is written for it. Queries of the same shape run REQUEST_PROFILING_REPEAT_THRESHOLD
+    times or more are logged as a warning naming the serializer field that ran them.
+    '''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with profile_queries() as profile:
+            response = self.get_response(request)
+        return self.report(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        async with aprofile_queries() as profile:
+            response = await self.get_response(request)
+        return self.report(request, response, profile, time.perf_counter() - started)
+
+    def sampled(self):
+        rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        return bool(rate) and random.random() < rate
+
+    def report(self, request, response, profile, view_time):
+        '''Adds the Server-Timing header to a profiled response and logs its profile'''
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.query_count} queries"',
+            f'serializer;dur={profile.serializer_time * 1000:.1f}',
+            f'view;dur={view_time * 1000:.1f}',
+        ])
+        repeated = profile.repeated_queries(settings.REQUEST_PROFILING_REPEAT_THRESHOLD)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.query_count,
+            'db_ms': round(profile.db_time * 1000, 3),
+            'serializer_ms': round(profile.serializer_time * 1000, 3),
+            'view_ms': round(view_time * 1000, 3),
+            'repeated_queries': len(repeated),
+        }))
+        for count, origin, shape in repeated:
+            logger.warning(
+                'Possible N+1 on %s %s: %d queries of the same shape from %s: %s',
+                request.method, request.path, count, origin or 'outside any serializer', shape,
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    '''Test case mixin asserting how many queries a block of code, usually one request, may run'''
+    repeat_threshold = 3
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with profile_queries() as profile:
+            yield profile
+        repeated = profile.repeated_queries(self.repeat_threshold)
+        if profile.query_count > budget or repeated:
+            details = '\n'.join(f'  {count}x from {origin}: {shape}' for count, origin, shape in repeated)
+            self.fail(
+                f'{profile.query_count} queries run against a budget of {budget}'
+                + (f', repeated shapes:\n{details}' if repeated else '')
+            )
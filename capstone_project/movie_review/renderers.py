@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# digits folded to 0, so that a single search finds a digit followed by an exponent
+DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+
+
+def may_diverge(content):
+    '''Whether orjson may have written a float differently from Python, which it does below 1e-4 and from 1e16 up.
+
+    Strings looking like such floats match too, which only costs the slower render, never different bytes.
+    '''
+    return b'0.0000' in content or b'0e' in content.translate(DIGITS_TO_ZERO)
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''JSONRenderer rendering compact JSON with orjson, byte for byte the same as the stdlib encoder would.
+
+    Types orjson does not encode the way DRF does (datetimes, dataclasses, decimals, lazy strings) go
+    through DRF's encoder. Indented output, data orjson refuses (keys that are not strings, integers
+    past 64 bits) or that it could write differently, and a missing orjson all fall back to JSONRenderer.
+    '''
+    orjson_options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=self.encoder_class().default, option=self.orjson_options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if may_diverge(content):
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped like JSONRenderer does, these two are valid JSON but not valid JavaScript
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class NDJSONRenderer(BaseRenderer):
+    '''Newline delimited JSON, streamed exports write their own lines and this renders error responses'''
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    '''CSV, streamed exports write their own rows and this renders error responses'''
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if isinstance(data, dict):
+            writer.writerow(['field', 'error'])
+            writer.writerows(data.items())
+        else:
+            writer.writerow([data])
+        return buffer.getvalue().encode(self.charset)
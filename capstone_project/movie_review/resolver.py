@@ -0,0 +1,104 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .cache import delete_now_and_on_commit
+from .models import Movie
+from .routers import areplica_may_lag, replica_may_lag
+
+# slugs are cut to this length, leaving room for the suffix telling apart titles that slugify alike
+SLUG_BASE_LENGTH = 200
+# the collection endpoints next to api/movies/<title>/ in urls.py, a movie with one of these slugs could not be reached
+RESERVED_SLUGS = frozenset({'search', 'batch'})
+
+
+def title_slug(title):
+    return slugify(title, allow_unicode=True)[:SLUG_BASE_LENGTH] or 'movie'
+
+
+def assign_slugs(movies):
+    '''Sets the slug of every movie from its title, for a whole batch in one query.
+
+    A movie gets its slugified title unless another movie already has that slug or it is one of the
+    RESERVED_SLUGS, it then gets a short hash of its title appended, which stays the same however often
+    the movie is saved or imported.
+    '''
+    bases = [(movie, title_slug(movie.title)) for movie in movies]
+    taken = dict.fromkeys(RESERVED_SLUGS)
+    taken.update(
+        Movie.objects.filter(slug__in={base for _, base in bases})
+        .exclude(pk__in=[movie.pk for movie in movies if movie.pk is not None])
+        .values_list('slug', 'title')
+    )
+    for movie, base in bases:
+        owner = taken.setdefault(base, movie.title)
+        if owner == movie.title:
+            movie.slug = base
+        else:
+            movie.slug = f"{base}-{hashlib.md5(movie.title.encode('utf-8')).hexdigest()[:8]}"
+
+
+def movie_key_cache_key(key):
+    return 'movie_review:movie_id:' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def _matching(key):
+    return Movie.objects.filter(Q(slug=key) | Q(title=key)).values_list('slug', 'pk')
+
+
+def _remember(cache_key, movie_id):
+    # a replica behind the last write would keep a new or renamed movie unknown for the whole timeout
+    if not replica_may_lag(cache_key):
+        cache.set(cache_key, movie_id, settings.MOVIE_RESOLVER_CACHE_TIMEOUT)
+
+
+def _pick(key, matches):
+    # a slug wins over a title that happens to read the same
+    return matches.get(key) or next(iter(matches.values()), 0)
+
+
+def resolve_movie_id(key):
+    '''The id of the movie with the given slug or title, None when there is none.
+
+    Answers, misses included, are cached for MOVIE_RESOLVER_CACHE_TIMEOUT seconds. The receivers in
+    signals.py drop them whenever a movie is created, renamed or deleted.
+    '''
+    cache_key = movie_key_cache_key(key)
+    movie_id = cache.get(cache_key)
+    if movie_id is None:
+        movie_id = _pick(key, dict(_matching(key)))
+        _remember(cache_key, movie_id)
+    return movie_id or None
+
+
+def get_movie(queryset, key):
+    '''The movie with the given slug or title read from the queryset, None when there is none.
+
+    It is one query either way: by the id when the resolver has it, else by slug or title, the
+    answer then being cached for resolve_movie_id like one of its own.
+    '''
+    cache_key = movie_key_cache_key(key)
+    movie_id = cache.get(cache_key)
+    if movie_id is not None:
+        return queryset.filter(pk=movie_id).first() if movie_id else None
+    movie = _pick(key, {movie.slug: movie for movie in queryset.filter(Q(slug=key) | Q(title=key))}) or None
+    _remember(cache_key, movie.pk if movie else 0)
+    return movie
+
+
+async def aresolve_movie_id(key):
+    '''resolve_movie_id for the async views'''
+    cache_key = movie_key_cache_key(key)
+    movie_id = await cache.aget(cache_key)
+    if movie_id is None:
+        movie_id = _pick(key, {slug: pk async for slug, pk in _matching(key)})
+        if not await areplica_may_lag(cache_key):
+            await cache.aset(cache_key, movie_id, settings.MOVIE_RESOLVER_CACHE_TIMEOUT)
+    return movie_id or None
+
+
+def invalidate_movie_keys(keys):
+    delete_now_and_on_commit(movie_key_cache_key(key) for key in set(keys) if key)
@@ -0,0 +1,179 @@
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.connection import ConnectionDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .cache_keys import hashed_cache_key
+
+logger = logging.getLogger('movie_review.routers')
+
+# the replica the reads of the running request go to, None sends them to the primary
+_read_alias = ContextVar('movie_review_read_alias', default=None)
+
+WRITTEN_KEY_PREFIX = 'movie_review:replicas:written:'
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def check_replica(alias):
+    '''Whether the replica answers a trivial query'''
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except (ConnectionDoesNotExist, DatabaseError):
+        logger.warning('Replica %s is unreachable, its reads go to the primary', alias, exc_info=True)
+        return False
+
+
+def replica_is_healthy(alias):
+    '''Whether the replica answered when last checked, it is checked again every REPLICA_HEALTH_CHECK_INTERVAL seconds.
+
+    One request at a time runs the check, the others keep the last answer meanwhile.
+    '''
+    healthy, checked_at = _health.get(alias, (True, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        return healthy
+    if not _health_lock.acquire(blocking=False):
+        return healthy and checked_at is not None
+    try:
+        healthy = check_replica(alias)
+        _health[alias] = (healthy, time.monotonic())
+    finally:
+        _health_lock.release()
+    return healthy
+
+
+def choose_read_alias():
+    '''A healthy replica picked at random, None when there is none'''
+    healthy = [alias for alias in settings.DATABASE_REPLICAS if replica_is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+def reading_from_replica():
+    return _read_alias.get() is not None
+
+
+def sticky_keys(request):
+    '''The cache keys pinning a client to the primary: its address, and its credentials when it sends any.
+
+    A client logging in is pinned by its address and then comes back with a token, which keeps
+    its next reads on the primary where the new token already is.
+    '''
+    keys = ['movie_review:replicas:primary:ip:' + BaseThrottle().get_ident(request)]
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if credentials:
+        keys.append(hashed_cache_key('movie_review:replicas:primary:credentials:', credentials))
+    return keys
+
+
+def written_key(key):
+    return WRITTEN_KEY_PREFIX + key
+
+
+def note_write(keys):
+    '''Records that a write to the primary just invalidated the cache entries or bumped the versions under keys.
+
+    For REPLICA_STICKY_SECONDS replica_may_lag() holds for these keys, and only these.
+    '''
+    if settings.DATABASE_REPLICAS and keys:
+        cache.set_many(dict.fromkeys(map(written_key, keys), True), settings.REPLICA_STICKY_SECONDS)
+
+
+def replica_may_lag(key):
+    '''Whether the running request reads from a replica that may not have the latest write behind key yet.
+
+    What such a request read is not cached under key, it would outlive the invalidation.
+    '''
+    return reading_from_replica() and cache.get(written_key(key)) is not None
+
+
+async def areplica_may_lag(key):
+    '''replica_may_lag() for async code'''
+    return reading_from_replica() and await cache.aget(written_key(key)) is not None
+
+
+class PrimaryReplicaRouter:
+    '''Sends writes to the primary and the reads of the running request where ReplicaRoutingMiddleware chose.
+
+    Reads outside a request (management commands, the shell) and of requests that were not given
+    a replica go to the primary. Replicas are never migrated, they get the schema from the primary.
+    '''
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaRoutingMiddleware:
+    '''Lets the reads of safe requests go to a healthy replica, one per request so they all see the same state.
+
+    A client whose request wrote anything stays on the primary for REPLICA_STICKY_SECONDS, so its
+    next reads see its own writes however far the replicas lag behind. Requests with unsafe
+    methods read from the primary too, as what they write depends on what they read.
+    '''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        keys = sticky_keys(request)
+        alias = None
+        if request.method in SAFE_METHODS and not cache.get_many(keys):
+            alias = choose_read_alias()
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            cache.set_many(dict.fromkeys(keys, True), settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        keys = sticky_keys(request)
+        alias = None
+        if request.method in SAFE_METHODS and not await cache.aget_many(keys):
+            # the health check queries the replica
+            alias = await sync_to_async(choose_read_alias)()
+        # the sync_to_async threads the view's queries run in get a copy of this context
+        token = _read_alias.set(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            await cache.aset_many(dict.fromkeys(keys, True), settings.REPLICA_STICKY_SECONDS)
+        return response
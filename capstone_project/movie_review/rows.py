@@ -0,0 +1,110 @@
+from operator import itemgetter
+
+from django.conf import settings
+from rest_framework import fields as drf_fields
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer, SerializerMethodField
+
+from .profiling import timed_serialization
+
+# fields whose to_representation gives back the value the database driver returns, as it returns it
+PASSTHROUGH_FIELDS = {
+    drf_fields.BooleanField, drf_fields.CharField, drf_fields.EmailField, drf_fields.FloatField,
+    drf_fields.IntegerField, drf_fields.SlugField, drf_fields.URLField,
+}
+
+
+def column_getter(column, convert=None):
+    '''Reads a column from a row, converting it unless it is NULL, as DRF never converts None'''
+    if convert is None:
+        return itemgetter(column)
+
+    def getter(row):
+        value = row[column]
+        return None if value is None else convert(value)
+    return getter
+
+
+class RowSerializerMixin:
+    '''Serializes values() rows into exactly the data to_representation gives for the model instances.
+
+    The read path of lists skips building instances and DRF's per field attribute lookups. The fields
+    are compiled once per serializer into accessors: a model field reads its column from the row,
+    converted only when DRF would convert it, and a field `x` with a `row_x(row)` method is served by
+    that method, which is how method fields take part. A serializer with any other kind of readable
+    field has no row path. `row_columns` names the values() columns a field reads when they are not
+    the ones of field_columns, see row_column_names().
+    '''
+    row_columns = {}
+
+    def compile_row_accessors(self):
+        '''Returns [(name, accessor of the row)] for the readable fields, None when one has no row form'''
+        if hasattr(self, '_row_accessors'):
+            return self._row_accessors
+        concrete = {field.name for field in self.Meta.model._meta.concrete_fields if not field.is_relation}
+        accessors = []
+        for field in self._readable_fields:
+            method = getattr(self, f'row_{field.field_name}', None)
+            if method is not None:
+                accessors.append((field.field_name, method))
+            elif isinstance(field, (SerializerMethodField, BaseSerializer)) or field.source not in concrete:
+                accessors = None
+                break
+            else:
+                convert = None if type(field) in PASSTHROUGH_FIELDS else field.to_representation
+                accessors.append((field.field_name, column_getter(field.source, convert)))
+        self._row_accessors = accessors
+        return accessors
+
+    def can_serialize_rows(self):
+        return settings.FAST_READ_SERIALIZATION and self.compile_row_accessors() is not None
+
+    def row_column_names(self):
+        '''The values() columns the fields to output read'''
+        columns = set()
+        for name, field in self.fields.items():
+            if name in self.row_columns:
+                columns.update(self.row_columns[name])
+            elif name in self.field_columns:
+                columns.update(self.field_columns[name])
+            elif not field.write_only:
+                columns.add(field.source)
+        return columns
+
+    def prepare_rows(self, rows):
+        '''Called with all the rows before any is serialized, to read what the row methods need in bulk'''
+
+    def rows_to_representation(self, rows):
+        accessors = self.compile_row_accessors()
+        rows = list(rows)
+        with timed_serialization():
+            self.prepare_rows(rows)
+            return [{name: accessor(row) for name, accessor in accessors} for row in rows]
+
+
+class RowListMixin:
+    '''Serves GET lists from values() rows when the view's serializer has a row path, see RowSerializerMixin.
+
+    Needs SparseFieldsetViewMixin for the serializer of the request. The rows also carry the columns
+    the keyset cursor is read from.
+    '''
+
+    def row_queryset(self, queryset, *columns):
+        '''The queryset as values() rows for the requested serializer, plus the given columns, None without a row path'''
+        serializer = self.requested_serializer
+        if not serializer.can_serialize_rows():
+            return None
+        columns = serializer.row_column_names() | {'id', *columns}
+        if hasattr(self, 'get_keyset_ordering'):
+            columns.update(name.lstrip('-') for name in self.get_keyset_ordering())
+        # prefetches hold instances, the row path reads what it needs in bulk itself
+        return queryset.prefetch_related(None).values(*columns)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.row_queryset(self.filter_queryset(self.get_queryset()))
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.requested_serializer.rows_to_representation(page))
+        return Response(self.requested_serializer.rows_to_representation(rows))
@@ -0,0 +1,137 @@
+import math
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from .cache import delete_now_and_on_commit
+from .models import Movie, MovieSearchTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with',
+])
+# a match in the title counts for more than one buried in the description
+FIELD_WEIGHTS = {'title': 3.0, 'director': 2.0, 'genre': 2.0, 'description': 1.0}
+MOVIE_COUNT_CACHE_KEY = 'movie_review:search:movie_count'
+
+
+def invalidate_movie_count():
+    '''The term index ranks by the number of movies, indexing or deleting movies changes it'''
+    delete_now_and_on_commit([MOVIE_COUNT_CACHE_KEY])
+
+
+def tokenize(text):
+    '''Splits text into lower-cased index terms, dropping stop words and single characters'''
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def movie_terms(movie):
+    '''Returns {term: weight} for a movie, repeated terms are damped logarithmically'''
+    weights = defaultdict(float)
+    for field, field_weight in FIELD_WEIGHTS.items():
+        counts = defaultdict(int)
+        for token in tokenize(getattr(movie, field)):
+            counts[token] += 1
+        for term, count in counts.items():
+            weights[term] += field_weight * (1 + math.log(count))
+    return weights
+
+
+class InvertedIndexBackend:
+    '''Ranks movies with a term table kept up to date by the application, it runs on any database'''
+
+    def index_movies(self, movies):
+        movies = list(movies)
+        MovieSearchTerm.objects.filter(movie__in=movies).delete()
+        MovieSearchTerm.objects.bulk_create(
+            [
+                MovieSearchTerm(movie=movie, term=term, weight=weight)
+                for movie in movies
+                for term, weight in movie_terms(movie).items()
+            ],
+            batch_size=1000,
+        )
+        invalidate_movie_count()
+
+    def movie_count(self):
+        count = cache.get(MOVIE_COUNT_CACHE_KEY)
+        if count is None:
+            count = Movie.objects.count()
+            cache.set(MOVIE_COUNT_CACHE_KEY, count, settings.MOVIE_SEARCH_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def search(self, queryset, query):
+        terms = set(tokenize(query))
+        if not terms:
+            return queryset.none()
+
+        # rarer terms weigh more, the document frequencies come straight from the term index
+        frequencies = dict(
+            MovieSearchTerm.objects.filter(term__in=terms).order_by().values_list('term').annotate(df=Count('id'))
+        )
+        if not frequencies:
+            return queryset.none()
+        total = max(self.movie_count(), max(frequencies.values()))
+        score = Sum(
+            Case(
+                *[
+                    When(search_terms__term=term, then=F('search_terms__weight') * math.log(1 + total / df))
+                    for term, df in frequencies.items()
+                ],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+        return (
+            queryset.filter(search_terms__term__in=frequencies.keys())
+            .annotate(score=score)
+            .order_by('-score', 'title')
+        )
+
+
+class FullTextBackend:
+    '''Ranks movies with the MySQL FULLTEXT index created by the migrations, MySQL maintains it on its own'''
+    columns = ('title', 'description', 'director', 'genre')
+
+    def index_movies(self, movies):
+        pass
+
+    def search(self, queryset, query):
+        quote = connection.ops.quote_name
+        table = quote(Movie._meta.db_table)
+        columns = ', '.join(f'{table}.{quote(column)}' for column in self.columns)
+        match = f'MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+        return (
+            queryset.annotate(score=RawSQL(match, (query,), output_field=FloatField()))
+            .filter(score__gt=0)
+            .order_by('-score', 'title')
+        )
+
+
+def get_search_backend():
+    '''Picks the backend from MOVIE_SEARCH_BACKEND, 'auto' uses FULLTEXT on MySQL and the term index elsewhere'''
+    backend = settings.MOVIE_SEARCH_BACKEND
+    if backend == 'auto':
+        backend = 'fulltext' if connection.vendor == 'mysql' else 'inverted'
+    return FullTextBackend() if backend == 'fulltext' else InvertedIndexBackend()
+
+
+def index_movies(movies):
+    get_search_backend().index_movies(movies)
+
+
+def search_movies(query, queryset=None):
+    queryset = Movie.objects.all() if queryset is None else queryset
+    return get_search_backend().search(queryset, query)
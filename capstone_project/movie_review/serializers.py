@@ -1,49 +1,272 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
-from .models import Movie, Review, User
-from django.db.models import Avg
+from rest_framework.reverse import reverse
+from .models import LeaderboardEntry, Movie, MovieSimilarity, Review, ReviewComment, User, WatchlistEntry
+from .fieldsets import SparseFieldsetMixin
+from .profiling import ProfiledSerializerMixin
+from .rows import RowSerializerMixin
+from .watchlists import watchlist_ids
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(RowSerializerMixin, SparseFieldsetMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
     '''This serializer retrieves a review for the movie while showing the creator of the review as well as the movie reviewed'''
     user = serializers.StringRelatedField(read_only=True)
     movie = serializers.PrimaryKeyRelatedField(queryset=Movie.objects.all(), write_only=True)
+    # a user's string is their username
+    row_columns = {'user': ['user__username']}
     class Meta:
         model = Review
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class MovieDetailSerializer(serializers.ModelSerializer):
-    '''This serializer retrieves the details for a movie showing all the reviews and the average rating for the movie'''
-    reviews = ReviewSerializer(many=True, read_only=True)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # under a movie's URL the movie is already known, a movie in the body is ignored
+        if 'movie_id' in self.context:
+            self.fields.pop('movie', None)
+
+    def row_user(self, row):
+        return row['user__username']
+
+class ReviewCommentSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    '''This serializer shows a comment in a review's thread, or validates a new comment or reply'''
+    user = serializers.StringRelatedField(read_only=True)
+    parent = serializers.PrimaryKeyRelatedField(queryset=ReviewComment.objects.all(), required=False, allow_null=True)
+    class Meta:
+        model = ReviewComment
+        fields = ['id', 'parent', 'user', 'body', 'depth', 'created_at']
+        read_only_fields = ['id', 'depth', 'created_at']
+
+    def validate_parent(self, parent):
+        # replies stay in the thread of the review they were posted under
+        if parent is not None and parent.review_id != self.context['review'].pk:
+            raise serializers.ValidationError('The parent comment belongs to another review')
+        if parent is not None and parent.depth >= ReviewComment.MAX_DEPTH:
+            raise serializers.ValidationError(f'Replies cannot nest more than {ReviewComment.MAX_DEPTH} levels deep')
+        return parent
+
+
+class CommentThreadQuerySerializer(serializers.Serializer):
+    '''This serializer validates how many levels of a comment thread are returned'''
+    depth = serializers.IntegerField(min_value=0, max_value=ReviewComment.MAX_DEPTH, required=False)
+
+
+class MovieSerializer(RowSerializerMixin, SparseFieldsetMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
+    '''This serializer shows a list of all the movies with their average ratings, and their latest reviews when expanded'''
     average_rating = serializers.SerializerMethodField()
+    in_watchlist = serializers.SerializerMethodField()
+    reviews = serializers.SerializerMethodField()
+    expandable_fields = ['reviews']
+    field_columns = {'average_rating': ['rating_count', 'average_rating'], 'in_watchlist': [], 'reviews': []}
     class Meta:
         model = Movie
-        fields = '__all__'
+        exclude = ['rating_sum', 'similar_movies_stale']
 
     def get_average_rating(self, obj):
-        # Get the average for all the ratings of this particular movie
-        avg = obj.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        if avg is not None:
-            return round(avg,1)
+        return self.rounded_average(obj.rating_count, obj.average_rating)
+
+    def row_average_rating(self, row):
+        return self.rounded_average(row['rating_count'], row['average_rating'])
+
+    def rounded_average(self, rating_count, average_rating):
+        # The average is kept on the movie whenever one of its reviews changes
+        if rating_count:
+            return round(average_rating,1)
         else:
             return None
 
-class MovieSerializer(serializers.ModelSerializer):
-    '''This serializer shows a list of all the movies with their average ratings'''
-    average_rating = serializers.SerializerMethodField()
+    def get_in_watchlist(self, obj):
+        return self.row_in_watchlist({'id': obj.pk})
+
+    def row_in_watchlist(self, row):
+        # The watchlist of the requesting user is read once per request, not once per movie
+        ids = watchlist_ids(self.context.get('request'))
+        return ids is not None and row['id'] in ids
+
+    def get_reviews(self, obj):
+        # Only the latest few reviews are embedded, the views prefetch them together with their users
+        preview = getattr(obj, 'review_preview', None)
+        if preview is None:
+            preview = obj.reviews.select_related('user')[:settings.REVIEW_PREVIEW_SIZE]
+        return self.preview_serializer(preview, many=True).data
+
+    def preview_serializer(self, *args, **kwargs):
+        # the fields the client picked are the movie's, the reviews show theirs in full
+        return ReviewSerializer(*args, context={**self.context, 'fieldset': None}, **kwargs)
+
+    def prepare_rows(self, rows):
+        if 'reviews' not in self.fields:
+            return
+        # the latest reviews of every movie in one query, like the prefetch of the instance path
+        reviews = self.preview_serializer()
+        latest = [F(name[1:]).desc() if name.startswith('-') else F(name) for name in Review._meta.ordering]
+        preview = list(
+            Review.objects.filter(movie_id__in=[row['id'] for row in rows])
+            .annotate(preview_rank=Window(RowNumber(), partition_by=F('movie_id'), order_by=latest))
+            .filter(preview_rank__lte=settings.REVIEW_PREVIEW_SIZE)
+            .values('movie_id', *reviews.row_column_names())
+        )
+        self.review_previews = defaultdict(list)
+        for review, data in zip(preview, reviews.rows_to_representation(preview)):
+            self.review_previews[review['movie_id']].append(data)
+
+    def row_reviews(self, row):
+        return self.review_previews[row['id']]
+
+class MovieDetailSerializer(MovieSerializer):
+    '''This serializer retrieves the details for a movie showing a preview of its latest reviews, a link to all of them and the average rating for the movie'''
+    reviews_url = serializers.SerializerMethodField()
+    expandable_fields = []
+    field_columns = {**MovieSerializer.field_columns, 'reviews_url': ['slug']}
+
+    def get_reviews_url(self, obj):
+        return self.row_reviews_url({'slug': obj.slug})
+
+    def row_reviews_url(self, row):
+        # The rest of the reviews are paged through the review list endpoint
+        return reverse('review-list', kwargs={'title': row['slug']}, request=self.context.get('request'))
+
+
+class SimilarMovieSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    '''This serializer shows a movie recommended next to another one with how similarly the two are rated'''
+    movie = MovieSerializer(source='similar', read_only=True)
+    class Meta:
+        model = MovieSimilarity
+        fields = ['movie', 'score']
+
+
+class LeaderboardEntrySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    '''This serializer shows a movie ranked on a leaderboard with the score it was ranked by'''
+    movie = MovieSerializer(read_only=True)
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'score', 'movie']
+
+
+class WatchlistEntrySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    '''This serializer shows a movie on the user's watchlist with when it was added'''
+    movie = MovieSerializer(read_only=True)
+    class Meta:
+        model = WatchlistEntry
+        fields = ['movie', 'added_at']
+
+
+class FeedReviewSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    '''This serializer shows a review on a feed, with its author and the slug of the movie reviewed'''
+    user = serializers.StringRelatedField(read_only=True)
+    movie = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    class Meta:
+        model = Review
+        fields = [
+            'id', 'movie', 'user', 'rating', 'comment', 'helpful_votes', 'comment_count', 'created_at', 'updated_at',
+        ]
+
+
+class WatchlistChangeSerializer(serializers.Serializer):
+    '''This serializer validates the titles of the movies added to or removed from a watchlist in one request'''
+    movies = serializers.ListField(
+        child=serializers.CharField(max_length=200), min_length=1, max_length=settings.WATCHLIST_BATCH_LIMIT,
+    )
+
+
+class MovieBatchQuerySerializer(serializers.Serializer):
+    '''This serializer validates the ids, and the titles or slugs, of the movies fetched in one batch request'''
+    id = serializers.ListField(child=serializers.IntegerField(min_value=1), default=list)
+    title = serializers.ListField(child=serializers.CharField(max_length=220), default=list)
+
+    def validate(self, data):
+        count = len(data['id']) + len(data['title'])
+        if not count:
+            raise serializers.ValidationError('Name at least one movie, by id or by title')
+        if count > settings.BATCH_REQUEST_LIMIT:
+            raise serializers.ValidationError(f'At most {settings.BATCH_REQUEST_LIMIT} movies can be fetched at once')
+        return data
+
+
+class MovieBatchEditSerializer(serializers.Serializer):
+    '''This serializer validates the edits of a batch movie update, each naming its movie by id'''
+    movies = serializers.ListField(child=serializers.DictField(), min_length=1)
+
+    def validate_movies(self, edits):
+        if len(edits) > settings.BATCH_REQUEST_LIMIT:
+            raise serializers.ValidationError(f'At most {settings.BATCH_REQUEST_LIMIT} movies can be edited at once')
+        # the fields of each edit are validated against its movie, one edit at a time
+        if not all(isinstance(edit.get('id'), int) and not isinstance(edit['id'], bool) for edit in edits):
+            raise serializers.ValidationError('Every edit names its movie by id')
+        return edits
+
+
+class ReviewBatchDeleteSerializer(serializers.Serializer):
+    '''This serializer validates the ids of the reviews deleted in one request'''
+    reviews = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1)
+
+    def validate_reviews(self, ids):
+        if len(ids) > settings.BATCH_REQUEST_LIMIT:
+            raise serializers.ValidationError(f'At most {settings.BATCH_REQUEST_LIMIT} reviews can be deleted at once')
+        return ids
+
+
+class MovieImportSerializer(serializers.ModelSerializer):
+    '''This serializer validates one row of a bulk movie import, titles are upserted so their uniqueness is not checked'''
     class Meta:
         model = Movie
-        fields = '__all__'
+        fields = ['title', 'description', 'director', 'release_date', 'genre', 'trailer_link']
+        extra_kwargs = {'title': {'validators': []}}
 
-    def get_average_rating(self, obj):
-         # Get the average for all the ratings of this particular movie
-        avg = obj.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        if avg is not None:
-            return round(avg,1)
-        else:
-            return None
+
+class MovieListQuerySerializer(serializers.Serializer):
+    '''This serializer validates the filter and sort parameters of the movie list'''
+    SORT_CHOICES = ['title', 'newest', 'top_rated', 'most_reviewed']
+    genre = serializers.CharField(max_length=100, required=False)
+    released_after = serializers.DateField(required=False)
+    released_before = serializers.DateField(required=False)
+    min_rating = serializers.FloatField(min_value=0, max_value=5, required=False)
+    sort = serializers.ChoiceField(choices=SORT_CHOICES, default='title')
+
+    def validate(self, data):
+        if 'released_after' in data and 'released_before' in data and data['released_after'] > data['released_before']:
+            raise serializers.ValidationError('released_after must not be later than released_before')
+        return data
+
+
+class ReviewListQuerySerializer(serializers.Serializer):
+    '''This serializer validates the sort parameter of the review list'''
+    SORT_CHOICES = ['newest', 'helpful']
+    sort = serializers.ChoiceField(choices=SORT_CHOICES, default='newest')
+
+
+class ReviewExportQuerySerializer(serializers.Serializer):
+    '''This serializer validates the filters of the review export'''
+    movie = serializers.CharField(max_length=200, required=False, help_text='Title of the movie')
+    user = serializers.CharField(max_length=150, required=False, help_text='Username of the reviewer')
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def filter_queryset(self, queryset):
+        '''Applies the validated filters to a review queryset'''
+        data = self.validated_data
+        if 'movie' in data:
+            queryset = queryset.filter(movie__title=data['movie'])
+        if 'user' in data:
+            queryset = queryset.filter(user__username=data['user'])
+        if 'since' in data:
+            queryset = queryset.filter(created_at__gte=data['since'])
+        if 'until' in data:
+            queryset = queryset.filter(created_at__lt=data['until'])
+        return queryset
+
+
+class MovieSearchQuerySerializer(serializers.Serializer):
+    '''This serializer validates the query parameters of the movie search'''
+    q = serializers.CharField(max_length=200)
+    genre = serializers.CharField(max_length=100, required=False)
+    year = serializers.IntegerField(min_value=1800, max_value=3000, required=False)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     '''This serializer shows the details of a user and is for admin use only'''
     class Meta:
         model = User
@@ -0,0 +1,184 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .aggregates import apply_rating_delta, rebuild_rating_aggregates
+from .authentication import invalidate_tokens
+from .cache import bump_versions
+from .comments import apply_comment_delta
+from .feeds import apply_follower_delta, fan_out_review
+from .models import Follow, Movie, Review, ReviewComment, ReviewVote, User
+from .resolver import assign_slugs, invalidate_movie_keys
+from .search import index_movies, invalidate_movie_count
+from .votes import add_to_vote_shard
+
+
+def _bump_review_versions(review, movie_ids=()):
+    '''Invalidates the cached responses showing a review, using the movie's title and slug when it is already loaded'''
+    if Review.movie.is_cached(review):
+        bump_versions(movie_ids=movie_ids, keys=[review.movie.title, review.movie.slug])
+    else:
+        bump_versions(movie_ids=[review.movie_id, *movie_ids])
+
+
+@receiver(post_save, sender=Review)
+def update_rating_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    '''Keeps the movie rating aggregates in step with a created or edited review'''
+    if raw:
+        return
+    if created:
+        apply_rating_delta(instance.movie_id, 1, instance.rating)
+    elif getattr(instance, '_stored_movie_id', None) is None or getattr(instance, '_stored_rating', None) is None:
+        # we do not know what was stored before this save, so recount the movie from scratch
+        movie = Movie.objects.filter(pk=instance.movie_id)
+        rebuild_rating_aggregates(movie)
+        movie.update(similar_movies_stale=True)
+    elif instance._stored_movie_id != instance.movie_id:
+        apply_rating_delta(instance._stored_movie_id, -1, -instance._stored_rating)
+        apply_rating_delta(instance.movie_id, 1, instance.rating)
+    elif instance._stored_rating != instance.rating:
+        apply_rating_delta(instance.movie_id, 0, instance.rating - instance._stored_rating)
+    moved_from = getattr(instance, '_stored_movie_id', None)
+    _bump_review_versions(instance, [moved_from] if moved_from not in (None, instance.movie_id) else [])
+    instance._stored_rating = instance.rating
+    instance._stored_movie_id = instance.movie_id
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    '''Removes a deleted review from the movie aggregates, this also runs for reviews removed by a cascade'''
+    # when the movies themselves are being deleted there is nothing left to keep in sync
+    origin_model = origin.model if hasattr(origin, 'model') else type(origin)
+    if origin_model is Movie:
+        return
+    apply_rating_delta(instance.movie_id, -1, -instance.rating)
+    _bump_review_versions(instance)
+
+
+@receiver(post_save, sender=Review)
+def fan_out_review_on_save(sender, instance, created, raw=False, **kwargs):
+    '''Copies a new review to the feed timelines of its author's followers, in the transaction saving it'''
+    if created and not raw:
+        fan_out_review(instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_follower_on_save(sender, instance, created, raw=False, **kwargs):
+    '''Keeps the follower count of the followed user in step with a new follow'''
+    if created and not raw:
+        apply_follower_delta(instance.followed_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_follower_on_delete(sender, instance, **kwargs):
+    '''Takes an ended follow off the count, this also runs for the follows removed with their follower'''
+    apply_follower_delta(instance.followed_id, -1)
+
+
+@receiver(post_save, sender=ReviewVote)
+def count_vote_on_save(sender, instance, created, raw=False, **kwargs):
+    '''Counts a new upvote on a shard of the review's vote counter'''
+    if created and not raw:
+        add_to_vote_shard(instance.review_id, 1)
+
+
+@receiver(pre_delete, sender=Review)
+def mark_review_deleted(sender, instance, origin=None, **kwargs):
+    '''Notes on the origin of a deletion every review it takes along, before anything is deleted'''
+    if origin is not None:
+        origin.__dict__.setdefault('_deleted_review_ids', set()).add(instance.pk)
+
+
+@receiver(post_delete, sender=ReviewVote)
+def count_vote_on_delete(sender, instance, origin=None, **kwargs):
+    '''Takes a withdrawn upvote off the counter, this also runs for votes removed with their user'''
+    # a review deleted along with the vote takes its counter shards with it, a shard recreated for
+    # it would outlive the review, whether the deletion started from the review, its movie or its author
+    if instance.review_id in getattr(origin, '_deleted_review_ids', ()):
+        return
+    add_to_vote_shard(instance.review_id, -1)
+
+
+@receiver(post_save, sender=ReviewComment)
+def count_comment_on_save(sender, instance, created, raw=False, **kwargs):
+    '''Keeps the comment count of the review in step with a new comment'''
+    if created and not raw:
+        apply_comment_delta(instance.review_id, 1)
+
+
+@receiver(post_delete, sender=ReviewComment)
+def count_comment_on_delete(sender, instance, origin=None, **kwargs):
+    '''Takes a deleted comment off the count, this also runs for the replies deleted along with it'''
+    origin_model = origin.model if hasattr(origin, 'model') else type(origin)
+    if origin_model in (Review, Movie):
+        return
+    apply_comment_delta(instance.review_id, -1)
+
+
+@receiver(pre_save, sender=Movie)
+def assign_slug_on_movie_save(sender, instance, raw=False, **kwargs):
+    '''Gives a new or renamed movie the slug of its title'''
+    if raw:
+        return
+    if not instance.slug or instance.title != getattr(instance, '_stored_title', None):
+        assign_slugs([instance])
+
+
+@receiver(post_save, sender=Movie)
+def bump_versions_on_movie_save(sender, instance, raw=False, **kwargs):
+    '''Invalidates the cached catalog, and the responses and resolver answers under the old and new title and slug'''
+    if raw:
+        return
+    keys = {
+        instance.title, instance.slug, getattr(instance, '_stored_title', None), getattr(instance, '_stored_slug', None),
+    } - {None}
+    invalidate_movie_keys(keys)
+    bump_versions(keys=keys)
+    instance._stored_title = instance.title
+    instance._stored_slug = instance.slug
+
+
+@receiver(post_save, sender=Movie)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    '''Re-indexes a created or edited movie, its old terms are replaced in the same transaction'''
+    if raw:
+        return
+    with transaction.atomic():
+        index_movies([instance])
+
+
+@receiver(post_delete, sender=Movie)
+def invalidate_movie_count_on_movie_delete(sender, instance, **kwargs):
+    invalidate_movie_count()
+
+
+@receiver(pre_delete, sender=Movie)
+def flag_similar_movies_on_movie_delete(sender, instance, **kwargs):
+    '''The movies listing a deleted movie as similar lose a neighbour, they are recomputed on the next refresh'''
+    listing = list(Movie.objects.filter(similarities__similar=instance).values_list('pk', flat=True))
+    if listing:
+        Movie.objects.filter(pk__in=listing).update(similar_movies_stale=True)
+        bump_versions(movie_ids=listing)
+
+
+@receiver(post_delete, sender=Movie)
+def bump_versions_on_movie_delete(sender, instance, **kwargs):
+    invalidate_movie_keys([instance.title, instance.slug])
+    bump_versions(keys=[instance.title, instance.slug])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    '''Logging out deletes the token, it must stop authenticating straight away'''
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, raw=False, update_fields=None, **kwargs):
+    '''The cached tokens carry the user, so a role or status change has to evict them'''
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    keys = list(Token.objects.filter(user=instance).values_list('key', flat=True))
+    if keys:
+        invalidate_tokens(keys)
@@ -0,0 +1,172 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .cache import bump_versions
+from .models import Movie, MovieSimilarity, Review
+
+
+class RatingMatrix:
+    '''The reviews as a sparse users x movies matrix, ready for item to item similarities.
+
+    Every column holds a movie's ratings centred on that movie's mean and scaled to unit length, so the
+    dot product of two columns is their mean-centred cosine similarity. Centring on the movie rather than
+    the user keeps a changed rating inside its own column, which is what lets a refresh recompute only
+    the movies whose ratings changed.
+    '''
+
+    def __init__(self, user_ids, movie_ids, ratings):
+        users, user_index = np.unique(user_ids, return_inverse=True)
+        self.movie_ids, movie_index = np.unique(movie_ids, return_inverse=True)
+        self.positions = {movie_id: position for position, movie_id in enumerate(self.movie_ids.tolist())}
+        shape = (len(users), len(self.movie_ids))
+
+        counts = np.bincount(movie_index, minlength=shape[1])
+        means = np.bincount(movie_index, weights=ratings, minlength=shape[1]) / np.maximum(counts, 1)
+        centred = sparse.csc_matrix((ratings - means[movie_index], (user_index, movie_index)), shape=shape)
+        norms = np.sqrt(np.asarray(centred.multiply(centred).sum(axis=0)).ravel())
+        # a movie everyone rated the same has nothing to correlate, its column stays zero
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        self.vectors = centred.multiply(scale.reshape(1, -1)).tocsc()
+        self.raters = sparse.csc_matrix((np.ones(len(ratings)), (user_index, movie_index)), shape=shape)
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        '''Reads every rating in one pass over the Review table'''
+        user_ids, movie_ids, ratings = [], [], []
+        reviews = Review.objects.order_by().values_list('user_id', 'movie_id', 'rating')
+        for user_id, movie_id, rating in reviews.iterator(chunk_size=chunk_size):
+            user_ids.append(user_id)
+            movie_ids.append(movie_id)
+            ratings.append(rating)
+        return cls(
+            np.array(user_ids, dtype=np.int64), np.array(movie_ids, dtype=np.int64), np.array(ratings, dtype=np.float64)
+        )
+
+    def similarities(self, positions, min_co_raters):
+        '''Similarities of the movies at the given columns to every movie, -inf where they do not count'''
+        positions = np.asarray(positions, dtype=np.int64)
+        scores = (self.vectors[:, positions].T @ self.vectors).toarray()
+        co_raters = (self.raters[:, positions].T @ self.raters).toarray()
+        # only movies liked by the same people are similar, and only when enough people rated both
+        scores[(co_raters < min_co_raters) | (scores <= 0)] = -np.inf
+        scores[np.arange(len(positions)), positions] = -np.inf
+        return np.minimum(scores, 1.0)
+
+    def top_neighbours(self, scores, k):
+        '''Picks the k best movies of every row of similarities as [(movie id, score)], best first'''
+        k = min(k, scores.shape[1])
+        if not k:
+            return [[] for _ in range(scores.shape[0])]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(int(self.movie_ids[column]), float(score)) for column, score in zip(columns, row) if np.isfinite(score)]
+            for columns, row in zip(top, top_scores)
+        ]
+
+
+def _rounded(neighbours):
+    return {(similar_id, round(score, 6)) for similar_id, score in neighbours}
+
+
+def store_neighbours(neighbours):
+    '''Saves {movie id: [(similar id, score)]} over the stored neighbours, returns the ids of the movies changed'''
+    stored = defaultdict(list)
+    rows = MovieSimilarity.objects.filter(movie_id__in=list(neighbours)).values_list('movie_id', 'similar_id', 'score')
+    for movie_id, similar_id, score in rows:
+        stored[movie_id].append((similar_id, score))
+    changed = [movie_id for movie_id, found in neighbours.items() if _rounded(found) != _rounded(stored[movie_id])]
+    if changed:
+        MovieSimilarity.objects.filter(movie_id__in=changed).delete()
+        MovieSimilarity.objects.bulk_create(
+            [
+                MovieSimilarity(movie_id=movie_id, similar_id=similar_id, score=score)
+                for movie_id in changed
+                for similar_id, score in neighbours[movie_id]
+            ],
+            batch_size=1000,
+        )
+        bump_versions(movie_ids=changed)
+    return changed
+
+
+@contextmanager
+def _claimed():
+    '''Clears the stale flags of the movies up front and puts them back if the work fails.
+
+    A rating written while the neighbours are computed flags its movie again, so it is picked up by the next refresh.
+    '''
+    stale = set(Movie.objects.filter(similar_movies_stale=True).values_list('pk', flat=True))
+    Movie.objects.filter(pk__in=stale).update(similar_movies_stale=False)
+    try:
+        yield stale
+    except BaseException:
+        Movie.objects.filter(pk__in=stale).update(similar_movies_stale=True)
+        raise
+
+
+def _blocks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def rebuild_similar_movies(block_size=500):
+    '''Recomputes the similar movies of the whole catalog, block_size movies at a time to bound the memory used'''
+    with _claimed(), transaction.atomic():
+        matrix = RatingMatrix.load()
+        # movies left without ratings lose their neighbours
+        neighbours = {
+            movie_id: [] for movie_id in MovieSimilarity.objects.values_list('movie_id', flat=True).distinct()
+            if movie_id not in matrix.positions
+        }
+        changed = store_neighbours(neighbours)
+        for block in _blocks(matrix.movie_ids.tolist(), block_size):
+            scores = matrix.similarities(
+                [matrix.positions[movie_id] for movie_id in block], settings.SIMILAR_MOVIES_MIN_CO_RATERS
+            )
+            changed += store_neighbours(dict(zip(block, matrix.top_neighbours(scores, settings.SIMILAR_MOVIES_COUNT))))
+        return changed
+
+
+def refresh_similar_movies(block_size=500):
+    '''Recomputes only the similar movies affected by the ratings changed since the last refresh.
+
+    A flagged movie has a new column, so its own neighbours are recomputed along with those of every movie
+    listing it, which may have to drop it. Any other movie can only gain a flagged movie, so the new scores
+    are merged into its stored list without recomputing the rest of it.
+    '''
+    k = settings.SIMILAR_MOVIES_COUNT
+    with _claimed() as stale, transaction.atomic():
+        if not stale:
+            return []
+        matrix = RatingMatrix.load()
+        listing = MovieSimilarity.objects.filter(similar_id__in=stale).values_list('movie_id', flat=True)
+        recompute = stale | set(listing)
+        neighbours = {movie_id: [] for movie_id in recompute if movie_id not in matrix.positions}
+        gained = defaultdict(list)
+        for block in _blocks(sorted(movie_id for movie_id in recompute if movie_id in matrix.positions), block_size):
+            scores = matrix.similarities(
+                [matrix.positions[movie_id] for movie_id in block], settings.SIMILAR_MOVIES_MIN_CO_RATERS
+            )
+            neighbours.update(zip(block, matrix.top_neighbours(scores, k)))
+            for row, movie_id in enumerate(block):
+                if movie_id not in stale:
+                    continue
+                for column in np.flatnonzero(np.isfinite(scores[row])):
+                    other = int(matrix.movie_ids[column])
+                    if other not in recompute:
+                        gained[other].append((movie_id, float(scores[row, column])))
+
+        rows = MovieSimilarity.objects.filter(movie_id__in=list(gained)).values_list('movie_id', 'similar_id', 'score')
+        for movie_id, similar_id, score in rows:
+            gained[movie_id].append((similar_id, score))
+        for movie_id, candidates in gained.items():
+            neighbours[movie_id] = sorted(candidates, key=lambda candidate: (-candidate[1], candidate[0]))[:k]
+        return store_neighbours(neighbours)
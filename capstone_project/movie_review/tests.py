@@ -1,11 +1,58 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
 from rest_framework.authtoken.models import Token
 
-from .models import Movie, Review
+from . import routers
+from .authentication import get_token_cache, hashing_pool, token_cache_key, verify_password
+from .benchmarks import comments_suite, find_regressions, serialization_suite, throttle_suite
+from .cache import movie_version_key
+from .leaderboards import refresh_leaderboards
+from .comments import add_comment
+from .feeds import follow, trim_feeds
+from .models import (
+    FeedEntry, Follow, LeaderboardEntry, Movie, MovieSimilarity, Review, ReviewComment, ReviewVoteShard,
+)
+from .parsers import FastJSONParser
+from .profiling import QueryBudgetMixin, RequestProfilingMiddleware, profile_queries
+from .renderers import FastJSONRenderer
+from .resolver import movie_key_cache_key, resolve_movie_id
+from .routers import PrimaryReplicaRouter, ReplicaRoutingMiddleware, check_replica, replica_is_healthy
+from .rows import RowSerializerMixin
+from .search import InvertedIndexBackend, search_movies
+from .serializers import ReviewSerializer
+from .similarity import RatingMatrix, rebuild_similar_movies, refresh_similar_movies
+from .throttling import RateLimitHeadersMiddleware, RateWindow, count_hits, get_rate_limit_cache
+from .votes import fold_review_votes
+from .watchlists import add_to_watchlist, watchlist_cache_key
 
 
 # Create your tests here.
@@ -180,3 +227,1802 @@ class ReviewPermissionsTestCase(APITestCase):
         res = self.client.delete(url)
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Review.objects.filter(pk=self.review.pk).exists())
+
+
+class MovieRatingAggregateTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title="aggregated", director="someone")
+        self.other_movie = Movie.objects.create(title="other", director="someone")
+        self.alice = User.objects.create_user(username="alice", password="alicepass")
+        self.bob = User.objects.create_user(username="bob", password="bobpass")
+
+    def assertAggregates(self, movie, count, total):
+        movie.refresh_from_db()
+        self.assertEqual(movie.rating_count, count)
+        self.assertEqual(movie.rating_sum, total)
+        self.assertAlmostEqual(movie.average_rating, total / count if count else 0)
+
+    def test_create_update_and_delete_review(self):
+        review = Review.objects.create(movie=self.movie, user=self.alice, rating=4, comment="good")
+        Review.objects.create(movie=self.movie, user=self.bob, rating=1, comment="bad")
+        self.assertAggregates(self.movie, 2, 5)
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 2
+        review.save()
+        self.assertAggregates(self.movie, 2, 3)
+
+        review.movie = self.other_movie
+        review.save()
+        self.assertAggregates(self.movie, 1, 1)
+        self.assertAggregates(self.other_movie, 1, 2)
+
+        review.delete()
+        self.assertAggregates(self.other_movie, 0, 0)
+
+    def test_user_cascade_removes_ratings(self):
+        Review.objects.create(movie=self.movie, user=self.alice, rating=5, comment="great")
+        Review.objects.create(movie=self.movie, user=self.bob, rating=3, comment="fine")
+        self.alice.delete()
+        self.assertAggregates(self.movie, 1, 3)
+
+    def test_rebuild_command_fixes_drift(self):
+        Review.objects.create(movie=self.movie, user=self.alice, rating=5, comment="great")
+        # bulk updates skip the signal receivers and leave the aggregates behind
+        Review.objects.filter(movie=self.movie).update(rating=1)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rating_aggregates", check=True, stdout=StringIO())
+        call_command("rebuild_rating_aggregates", stdout=StringIO())
+        self.assertAggregates(self.movie, 1, 1)
+        call_command("rebuild_rating_aggregates", check=True, stdout=StringIO())
+
+    def test_movie_list_query_count_is_fixed(self):
+        for i in range(5):
+            movie = Movie.objects.create(title=f"movie {i}", director="someone")
+            Review.objects.create(movie=movie, user=self.alice, rating=4, comment="ok")
+        # a single SELECT for the page, the aggregates come along with the movie rows
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse("movie_list_api"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ratings = {movie["title"]: movie["average_rating"] for movie in res.json()["results"]}
+        self.assertEqual(ratings["movie 0"], 4.0)
+        self.assertIsNone(ratings["other"])
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title="popular", director="someone")
+        for i in range(25):
+            user = User.objects.create(username=f"reviewer{i}")
+            Review.objects.create(movie=self.movie, user=user, rating=i % 5 + 1, comment=f"review {i}")
+        # give most reviews the same timestamp so the id tiebreak has to do the work
+        Review.objects.filter(comment__endswith="0").update(created_at=timezone.now() + timedelta(days=1))
+        Review.objects.exclude(comment__endswith="0").update(created_at=timezone.now())
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            res = self.client.get(url, secure=True)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(review["id"] for review in res.data["results"])
+            url = res.data[link]
+        return ids, res
+
+    def test_walks_every_review_once_in_order(self):
+        expected = list(Review.objects.filter(movie=self.movie).order_by("-created_at", "-id").values_list("id", flat=True))
+        ids, last_page = self.walk(reverse("review-list", kwargs={"title": self.movie.title}), "next")
+        self.assertEqual(ids, expected)
+        self.assertNotIn("count", last_page.data)
+
+        # and back again from the last page
+        pages = [[review["id"] for review in last_page.data["results"]]]
+        url = last_page.data["previous"]
+        while url:
+            res = self.client.get(url, secure=True)
+            pages.insert(0, [review["id"] for review in res.data["results"]])
+            url = res.data["previous"]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_deep_pages_cost_the_same(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        # the movie's title is resolved once, then cached for every page
+        resolve_movie_id(self.movie.title)
+        with CaptureQueriesContext(connection) as first_page:
+            first = self.client.get(url, secure=True)
+        with CaptureQueriesContext(connection) as second_page:
+            self.client.get(first.data["next"], secure=True)
+        self.assertEqual(len(first_page), len(second_page))
+        self.assertFalse(any("COUNT(" in query["sql"] or "OFFSET" in query["sql"] for query in second_page))
+
+    def test_invalid_cursor(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        res = self.client.get(url, {"cursor": "not-a-cursor"}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursors_are_not_found(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        ordering = ["-created_at", "-id"]
+        for position in (["2024-01-01T00:00:00+00:00", "abc"], ["not a date", 1], [{"a": 1}, 1]):
+            with self.subTest(position=position):
+                res = self.client.get(url, {"cursor": self.cursor(ordering, position)}, secure=True)
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(url, {"cursor": self.cursor(ordering, ["2024-01-01T00:00:00+00:00", "1"])}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_cursors_are_bound_to_their_ordering(self):
+        for title in ["c", "a", "b"]:
+            Movie.objects.create(title=title, director="someone", release_date=date(2000, 1, 1))
+        with mock.patch("movie_review.pagination.MovieKeysetPagination.page_size", 1):
+            first = self.client.get(reverse("movie_list_api"), secure=True).json()
+        cursor = parse_qs(urlsplit(first["next"]).query)["cursor"][0]
+        res = self.client.get(reverse("movie_list_api"), {"sort": "newest", "cursor": cursor}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def cursor(self, ordering, position):
+        payload = json.dumps({"o": ordering, "p": position, "r": 0})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def test_movie_catalog_pages_by_title(self):
+        for title in ["c", "a", "b"]:
+            Movie.objects.create(title=title, director="someone")
+        ids, _ = self.walk(reverse("movie_list_api"), "next")
+        self.assertEqual(ids, list(Movie.objects.order_by("title").values_list("id", flat=True)))
+
+
+class MovieDetailPreviewTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title="blockbuster", director="someone")
+        for i in range(12):
+            user = User.objects.create(username=f"fan{i}")
+            Review.objects.create(movie=self.movie, user=user, rating=5, comment=f"review {i}")
+
+    @override_settings(REVIEW_PREVIEW_SIZE=3)
+    def test_detail_embeds_a_bounded_preview(self):
+        url = reverse("movie_detail", kwargs={"title": self.movie.title})
+        # the movie, then the preview reviews joined with their users
+        with self.assertNumQueries(2):
+            res = self.client.get(url, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        latest = Review.objects.filter(movie=self.movie)[:3]
+        self.assertEqual([review["id"] for review in res.data["reviews"]], [review.id for review in latest])
+        self.assertEqual(res.data["reviews"][0]["user"], latest[0].user.username)
+        self.assertTrue(res.data["reviews_url"].endswith(reverse("review-list", kwargs={"title": self.movie.slug})))
+        self.assertEqual(res.data["rating_count"], 12)
+
+    def test_review_list_loads_users_in_bulk(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        # the movie lookup and one page of reviews joined with their users
+        with self.assertNumQueries(2):
+            self.client.get(url, secure=True)
+
+
+class ResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.admin = User.objects.create_user(username="admin", password="adminpass", role="admin")
+        self.member_token = Token.objects.create(user=self.member)
+        self.admin_token = Token.objects.create(user=self.admin)
+        self.movie = Movie.objects.create(title="cached", director="someone")
+
+    def test_anonymous_reads_are_cached_with_etags(self):
+        for url in [
+            reverse("movie_list_api"),
+            reverse("movie_detail", kwargs={"title": self.movie.title}),
+            reverse("review-list", kwargs={"title": self.movie.title}),
+        ]:
+            first = self.client.get(url, secure=True)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            etag = first["ETag"]
+            self.assertFalse(etag.startswith("W/"))
+
+            with self.assertNumQueries(0):
+                second = self.client.get(url, secure=True)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second["ETag"], etag)
+
+            with self.assertNumQueries(0):
+                not_modified = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(ALLOWED_HOSTS=["a.example.com", "b.example.com"])
+    def test_responses_are_cached_per_host(self):
+        url = reverse("movie_detail", kwargs={"title": self.movie.title})
+        first = self.client.get(url, secure=True, HTTP_HOST="a.example.com").json()
+        second = self.client.get(url, secure=True, HTTP_HOST="b.example.com").json()
+        self.assertTrue(first["reviews_url"].startswith("https://a.example.com/"))
+        self.assertTrue(second["reviews_url"].startswith("https://b.example.com/"))
+
+    def test_first_hit_answers_if_none_match(self):
+        url = reverse("movie_list_api")
+        etag = self.client.get(url, secure=True)["ETag"]
+        cache.clear()
+        res = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_bump_the_versions(self):
+        list_url = reverse("movie_list_api")
+        detail_url = reverse("movie_detail", kwargs={"title": self.movie.title})
+        reviews_url = reverse("review-list", kwargs={"title": self.movie.title})
+        for url in [list_url, detail_url, reviews_url]:
+            self.client.get(url, secure=True)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.member_token.key}")
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(reviews_url, {"rating": 4, "comment": "fresh", "movie": self.movie.id}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.client.credentials()
+
+        self.assertEqual(self.client.get(list_url, secure=True).json()["results"][0]["average_rating"], 4.0)
+        self.assertEqual(self.client.get(detail_url, secure=True).json()["reviews"][0]["comment"], "fresh")
+        self.assertEqual(self.client.get(reviews_url, secure=True).json()["results"][0]["comment"], "fresh")
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url, {"title": "renamed"}, secure=True)
+        self.client.credentials()
+        self.assertEqual(self.client.get(detail_url, secure=True).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(list_url, secure=True).json()["results"][0]["title"], "renamed")
+
+    def test_authenticated_reads_bypass_the_cache(self):
+        url = reverse("movie_list_api")
+        self.client.get(url, secure=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.member_token.key}")
+        res = self.client.get(url, secure=True)
+        self.assertNotIn("ETag", res)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.token = Token.objects.create(user=self.member)
+        self.movie = Movie.objects.create(title="auth", director="someone")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_token_lookup_is_cached(self):
+        url = reverse("movie_list_api")
+        # token and user, the page, then the watchlist flagged on its movies
+        with self.assertNumQueries(3):
+            self.client.get(url, secure=True)
+        with self.assertNumQueries(1):
+            res = self.client.get(url, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_cache_holds_neither_the_key_nor_the_password(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        self.client.get(url, secure=True)
+        entry = get_token_cache().get(token_cache_key(self.token.key))
+        self.assertEqual(entry["user"]["role"], "member")
+        self.assertNotIn(self.token.key, repr(entry))
+        self.assertNotIn(self.member.password, repr(entry))
+        # the user rebuilt from the cache writes as the one read from the database
+        res = self.client.post(url, {"rating": 3, "comment": "Okay", "movie": self.movie.id}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Review.objects.get().user, self.member)
+        res = self.client.post(reverse("logout_api"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Token.objects.exists())
+        self.member.refresh_from_db()
+        self.assertTrue(self.member.check_password("memberpass"))
+
+    def test_logout_invalidates_the_token(self):
+        self.client.get(reverse("movie_list_api"), secure=True)
+        res = self.client.post(reverse("logout_api"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(reverse("movie_list_api"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_is_seen_immediately(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        self.client.get(url, secure=True)
+        self.member.role = "admin"
+        self.member.save()
+        res = self.client.post(url, {"rating": 3, "comment": "Okay", "movie": self.movie.id}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token not-a-token")
+        res = self.client.get(reverse("movie_list_api"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MovieSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.matrix = Movie.objects.create(
+            title="The Matrix", director="Wachowskis", genre="Sci-Fi", release_date="1999-03-31",
+            description="A hacker learns the truth about reality.",
+        )
+        self.heist = Movie.objects.create(
+            title="Heist Night", director="Someone", genre="Thriller", release_date="2004-01-01",
+            description="A crew plans to rob a bank built like a matrix of vaults.",
+        )
+        self.space = Movie.objects.create(
+            title="Space Matrix", director="Someone", genre="Sci-Fi", release_date="2010-06-01",
+        )
+        self.url = reverse("movie-search")
+
+    def search(self, **params):
+        res = self.client.get(self.url, params, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [movie["title"] for movie in res.json()["results"]]
+
+    def test_results_are_ranked_by_relevance(self):
+        titles = self.search(q="matrix")
+        self.assertEqual(set(titles), {"The Matrix", "Space Matrix", "Heist Night"})
+        self.assertEqual(titles[-1], "Heist Night")
+        self.assertEqual(self.search(q="hacker reality"), ["The Matrix"])
+        self.assertEqual(self.search(q="the"), [])
+
+    def test_filters_by_genre_and_year(self):
+        self.assertEqual(self.search(q="matrix", genre="sci-fi", year=2010), ["Space Matrix"])
+        self.assertEqual(self.search(q="matrix", genre="thriller"), ["Heist Night"])
+
+    def test_index_follows_edits(self):
+        self.heist.description = "A crew plans to rob a bank."
+        with self.captureOnCommitCallbacks(execute=True):
+            self.heist.save()
+        self.assertNotIn("Heist Night", self.search(q="matrix"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(title="Vault", director="Someone", description="Another matrix story")
+        self.assertIn("Vault", self.search(q="matrix"))
+
+    def test_movie_count_follows_the_catalog(self):
+        backend = InvertedIndexBackend()
+        self.assertEqual(backend.movie_count(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            vault = Movie.objects.create(title="Vault", director="Someone")
+        self.assertEqual(backend.movie_count(), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            vault.delete()
+        self.assertEqual(backend.movie_count(), 3)
+
+    def test_query_is_required(self):
+        res = self.client.get(self.url, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MovieListFilterTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        users = [User.objects.create(username=f"critic{i}") for i in range(3)]
+        for i in range(24):
+            movie = Movie.objects.create(
+                title=f"movie {i:02}", director="someone", genre="Drama" if i % 2 else "Comedy",
+                release_date=None if i % 5 == 0 else date(2000 + i % 7, 1, 1),
+            )
+            for user in users[:i % 4]:
+                Review.objects.create(movie=movie, user=user, rating=i % 5 + 1, comment="ok")
+        self.url = reverse("movie_list_api")
+
+    def walk(self, **params):
+        titles = []
+        res = self.client.get(self.url, params, secure=True)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            titles.extend(movie["title"] for movie in res.data["results"])
+            if not res.data["next"]:
+                return titles
+            res = self.client.get(res.data["next"], secure=True)
+
+    def test_sort_orders_page_through_everything(self):
+        movies = list(Movie.objects.all())
+        newest = sorted(movies, key=lambda m: (m.release_date is not None, m.release_date or date.min, m.id), reverse=True)
+        top_rated = sorted(movies, key=lambda m: (m.average_rating, m.id), reverse=True)
+        most_reviewed = sorted(movies, key=lambda m: (m.rating_count, m.id), reverse=True)
+        self.assertEqual(self.walk(sort="newest"), [m.title for m in newest])
+        self.assertEqual(self.walk(sort="top_rated"), [m.title for m in top_rated])
+        self.assertEqual(self.walk(sort="most_reviewed"), [m.title for m in most_reviewed])
+        self.assertEqual(self.walk(), sorted(m.title for m in movies))
+
+    def test_filters(self):
+        expected = Movie.objects.filter(
+            genre="Drama", release_date__gte=date(2003, 1, 1), release_date__lte=date(2005, 12, 31),
+            rating_count__gt=0, average_rating__gte=3,
+        ).order_by("title")
+        titles = self.walk(genre="drama", released_after="2003-01-01", released_before="2005-12-31", min_rating=3)
+        self.assertEqual(titles, [movie.title for movie in expected])
+        self.assertTrue(titles)
+
+    def test_each_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {"genre": "comedy", "sort": "top_rated", "min_rating": 2}, secure=True)
+
+    def test_invalid_parameters(self):
+        for params in [{"sort": "random"}, {"min_rating": 9}, {"released_after": "2005-01-01", "released_before": "2001-01-01"}]:
+            res = self.client.get(self.url, params, secure=True)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImportMoviesCommandTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        Movie.objects.create(title="Existing", director="old director")
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_import_upserts_and_skips_invalid_rows(self):
+        path = self.write("movies.csv", (
+            "title,director,release_date,genre,description\n"
+            "Existing,new director,2001-02-03,Drama,\n"
+            "Fresh,someone,,Comedy,A brand new movie\n"
+            "Broken,someone,not-a-date,Drama,\n"
+            "No Director,,,Drama,\n"
+            "Fresh,someone else,,Comedy,Listed twice\n"
+        ))
+        err = StringIO()
+        call_command("import_movies", path, chunk_size=2, stdout=StringIO(), stderr=err)
+
+        existing = Movie.objects.get(title="Existing")
+        self.assertEqual(existing.director, "new director")
+        self.assertEqual(existing.release_date, date(2001, 2, 3))
+        self.assertEqual(Movie.objects.get(title="Fresh").description, "Listed twice")
+        self.assertFalse(Movie.objects.filter(title__in=["Broken", "No Director"]).exists())
+        self.assertIn("Row 3 skipped", err.getvalue())
+        self.assertIn("Row 4 skipped", err.getvalue())
+        # imported movies are searchable straight away, and addressable by slug
+        self.assertEqual(list(search_movies("listed")), [Movie.objects.get(title="Fresh")])
+        self.assertEqual(Movie.objects.get(title="Fresh").slug, "fresh")
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+    def test_jsonl_import_resumes_from_checkpoint(self):
+        lines = [json.dumps({"title": f"Movie {i}", "director": "someone"}) for i in range(5)]
+        path = self.write("movies.jsonl", "\n".join(lines) + "\n")
+        with open(path + ".checkpoint", "w", encoding="utf-8") as handle:
+            json.dump({"source": os.path.abspath(path), "rows": 3}, handle)
+
+        call_command("import_movies", path, resume=True, stdout=StringIO())
+        self.assertEqual(
+            sorted(Movie.objects.filter(title__startswith="Movie").values_list("title", flat=True)),
+            ["Movie 3", "Movie 4"],
+        )
+
+
+class ReviewExportTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="adminpass", role="admin")
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.first = Movie.objects.create(title="First", director="someone")
+        self.second = Movie.objects.create(title="Second", director="someone")
+        Review.objects.create(movie=self.first, user=self.member, rating=4, comment="Nice, \"quoted\"")
+        Review.objects.create(movie=self.second, user=self.member, rating=2, comment="Meh")
+        Review.objects.create(movie=self.second, user=self.admin, rating=5, comment="Great")
+        self.url = reverse("review-export")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+
+    def export(self, **params):
+        res = self.client.get(self.url, params, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    @override_settings(REVIEW_EXPORT_CHUNK_SIZE=2)
+    def test_ndjson_export_streams_every_review(self):
+        with self.assertNumQueries(3):
+            lines = self.export().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["movie"] for row in rows], ["First", "Second", "Second"])
+        self.assertEqual(rows[0]["user"], "member")
+        self.assertEqual(rows[0]["comment"], "Nice, \"quoted\"")
+
+    def test_csv_export_with_filters(self):
+        content = self.export(format="csv", movie="Second", user="member")
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ["id", "movie", "user", "rating", "comment", "created_at", "updated_at"])
+        self.assertEqual([row[1:5] for row in rows[1:]], [["Second", "member", "2", "Meh"]])
+
+    def test_export_is_admin_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.member).key}")
+        res = self.client.get(self.url, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_writes_the_export(self):
+        out = StringIO()
+        call_command("export_reviews", format="csv", since="2000-01-01T00:00:00Z", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+
+class AsyncReadViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title="async", director="someone", genre="Drama")
+        for i in range(3):
+            user = User.objects.create(username=f"viewer{i}")
+            self.review = Review.objects.create(movie=self.movie, user=user, rating=i + 2, comment=f"take {i}")
+
+    def test_async_views_match_the_sync_ones(self):
+        pairs = [
+            ("movie_list_api", "async-movie-list", {}),
+            ("movie_detail", "async-movie-detail", {"title": self.movie.title}),
+            ("review-list", "async-review-list", {"title": self.movie.title}),
+            ("review-detail", "async-review-detail", {"pk": self.review.pk}),
+        ]
+        for sync_name, async_name, kwargs in pairs:
+            sync_res = self.client.get(reverse(sync_name, kwargs=kwargs), {"sort": "newest"}, secure=True)
+            async_res = self.client.get(reverse(async_name, kwargs=kwargs), {"sort": "newest"}, secure=True)
+            self.assertEqual(async_res.status_code, status.HTTP_200_OK)
+            # links point at their own route, everything else is identical
+            self.assertEqual(
+                async_res.content.replace(b"/api/async/", b"/api/").decode(),
+                sync_res.content.replace(b"/api/async/", b"/api/").decode(),
+            )
+
+    def test_missing_movie_and_write_methods(self):
+        res = self.client.get(reverse("async-movie-detail", kwargs={"title": "missing"}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.put(reverse("async-review-detail", kwargs={"pk": self.review.pk}), {"comment": "x"}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_served_from_the_event_loop(self):
+        res = await self.async_client.get(reverse("async-review-list", kwargs={"title": "async"}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()["results"]), 3)
+
+    async def test_throttles_count_off_the_event_loop(self):
+        threads = []
+
+        def record_thread(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                threads.append("event loop")
+            except RuntimeError:
+                threads.append("worker")
+            return count_hits(*args, **kwargs)
+        with mock.patch("movie_review.throttling.count_hits", record_thread):
+            res = await self.async_client.get(reverse("async-review-list", kwargs={"title": "async"}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(threads, ["worker"])
+
+    async def test_middleware_stays_on_the_event_loop(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        for middleware in (RequestProfilingMiddleware, RateLimitHeadersMiddleware, ReplicaRoutingMiddleware):
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(iscoroutinefunction(middleware(get_response)))
+        with self.settings(REQUEST_PROFILING_SAMPLE_RATE=1):
+            res = await self.async_client.get(reverse("async-review-list", kwargs={"title": "async"}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertRegex(res["Server-Timing"], r'desc="[1-9]\d* queries"')
+        self.assertIn("RateLimit-Remaining", res)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark", "asgi", requests=4, concurrency=1, stdout=out)
+        results = json.loads(out.getvalue())["results"]
+        self.assertEqual(results["wsgi"]["requests"], 4)
+        self.assertEqual(results["asgi"]["requests"], 4)
+
+
+class SeedDataBenchmarkTestCase(TestCase):
+    def seed(self, **options):
+        options = {"movies": 20, "users": 8, "reviews": 60, "batch_size": 25, **options}
+        call_command("seed_data", stdout=StringIO(), **options)
+        return sorted(Review.objects.values_list("user__username", "movie__title", "rating"))
+
+    def test_seeding_is_deterministic(self):
+        first = self.seed()
+        self.assertEqual(len(first), 60)
+        self.assertEqual(self.seed(clear=True), first)
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_seeded_reviews_are_skewed_and_consistent(self):
+        self.seed(reviews=1000)
+        # capped at one review per user and movie
+        self.assertEqual(Review.objects.count(), 160)
+        self.seed(clear=True, reviews=40)
+        counts = list(Movie.objects.order_by("title").values_list("rating_count", flat=True))
+        self.assertGreater(counts[0], counts[-1])
+        for movie in Movie.objects.all():
+            self.assertEqual(movie.rating_count, movie.reviews.count())
+        self.assertEqual(search_movies("seed").count(), 20)
+
+    def test_endpoints_suite_covers_every_route(self):
+        self.seed()
+        reviews = Review.objects.count()
+        out = StringIO()
+        call_command("benchmark", "endpoints", requests=1, stdout=out)
+        results = json.loads(out.getvalue())["results"]
+        self.assertNotIn("uncovered_routes", results)
+        self.assertIn("DELETE review-detail", results)
+        for name, result in results.items():
+            self.assertEqual(result["errors"], 0, name)
+            self.assertIsNotNone(result["queries_max"], name)
+        # the writes are rolled back
+        self.assertEqual(Review.objects.count(), reviews)
+        self.assertFalse(User.objects.filter(username__startswith="bench_").exists())
+
+    def test_baseline_regressions(self):
+        baseline = {"GET movie_detail": {"p95_ms": 10, "queries_max": 2}, "nested": {"GET x": {"p95_ms": 1}}}
+        fine = {"GET movie_detail": {"p95_ms": 11, "queries_max": 2}, "nested": {"GET x": {"p95_ms": 1.1}}}
+        worse = {"GET movie_detail": {"p95_ms": 20, "queries_max": 3}, "nested": {"GET x": {"p95_ms": 2}}}
+        self.assertEqual(find_regressions(fine, baseline), [])
+        self.assertEqual(len(find_regressions(worse, baseline)), 3)
+
+
+class QueryProfilingTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title="profiled", director="someone", description="a profiled movie")
+        for i in range(4):
+            user = User.objects.create(username=f"critic{i}")
+            self.review = Review.objects.create(movie=self.movie, user=user, rating=i + 1, comment=f"take {i}")
+
+    def test_endpoint_query_budgets(self):
+        budgets = [
+            ("movie_list_api", {}, 1),
+            ("movie-search", {}, 4),
+            ("movie_detail", {"title": "profiled"}, 2),
+            ("review-list", {"title": "profiled"}, 2),
+            ("review-detail", {"pk": self.review.pk}, 1),
+        ]
+        for name, kwargs, budget in budgets:
+            with self.subTest(name), self.assertQueryBudget(budget):
+                res = self.client.get(reverse(name, kwargs=kwargs), {"q": "profiled"}, secure=True)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_repeated_queries_are_traced_to_the_serializer_field(self):
+        with profile_queries() as profile:
+            ReviewSerializer(Review.objects.all(), many=True).data
+        self.assertEqual(profile.query_count, 5)
+        [(count, origin, shape)] = profile.repeated_queries(3)
+        self.assertEqual((count, origin), (4, "ReviewSerializer.user"))
+        self.assertGreater(profile.serializer_time, 0)
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(10):
+                ReviewSerializer(Review.objects.all(), many=True).data
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1, REQUEST_PROFILING_REPEAT_THRESHOLD=2)
+    def test_sampled_requests_get_server_timing_and_a_log_line(self):
+        with self.assertLogs("movie_review.profiling", "INFO") as logs:
+            res = self.client.get(reverse("movie_detail", kwargs={"title": "profiled"}), secure=True)
+        self.assertIn('db;dur=', res["Server-Timing"])
+        self.assertIn('desc="2 queries"', res["Server-Timing"])
+        self.assertIn("serializer;dur=", res["Server-Timing"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["path"], line["queries"], line["repeated_queries"]), (res.wsgi_request.path, 2, 0))
+
+    def test_unsampled_requests_are_untouched(self):
+        res = self.client.get(reverse("movie_detail", kwargs={"title": "profiled"}), secure=True)
+        self.assertNotIn("Server-Timing", res)
+
+
+class SimilarMoviesTestCase(APITestCase):
+    RATINGS = {
+        "Alien": [5, 4, 1, 2, 5, 1],
+        "Aliens": [5, 5, 2, 1, 4, 2],
+        "Amelie": [1, 2, 5, 4, 1, 5],
+        "Paddington": [2, 1, 4, 5, 2, 4],
+        "Solaris": [4, 2, 3, 3, None, 5],
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f"rater{i}") for i in range(6)]
+        self.movies = {}
+        for title, ratings in self.RATINGS.items():
+            self.movies[title] = movie = Movie.objects.create(title=title, director="someone")
+            for user, rating in zip(self.users, ratings):
+                if rating:
+                    Review.objects.create(movie=movie, user=user, rating=rating, comment="ok")
+
+    def stored(self):
+        return {
+            (movie, similar): round(score, 6)
+            for movie, similar, score in MovieSimilarity.objects.values_list("movie__title", "similar__title", "score")
+        }
+
+    def similar(self, title):
+        res = self.client.get(reverse("movie-similar", kwargs={"title": title}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(row["movie"]["title"], row["score"]) for row in res.json()]
+
+    def test_scores_are_mean_centred_cosines(self):
+        self.assertEqual(len(refresh_similar_movies()), 5)
+        self.assertFalse(Movie.objects.filter(similar_movies_stale=True).exists())
+        alien = [r - 3 for r in self.RATINGS["Alien"]]
+        aliens = [r - 19 / 6 for r in self.RATINGS["Aliens"]]
+        expected = sum(a * b for a, b in zip(alien, aliens)) / (
+            sum(a * a for a in alien) ** 0.5 * sum(b * b for b in aliens) ** 0.5
+        )
+        [(title, score), *rest] = self.similar("Alien")
+        self.assertEqual(title, "Aliens")
+        self.assertAlmostEqual(score, expected)
+        # negatively correlated movies are never listed
+        self.assertNotIn("Amelie", [title for title, score in rest])
+
+    def test_incremental_refresh_matches_a_full_rebuild(self):
+        rebuild_similar_movies()
+        review = Review.objects.get(movie=self.movies["Solaris"], user=self.users[0])
+        review.rating = 1
+        review.save()
+        Review.objects.create(movie=self.movies["Solaris"], user=self.users[4], rating=5, comment="late")
+        Review.objects.filter(movie=self.movies["Paddington"], user=self.users[1]).delete()
+        self.assertEqual(
+            set(Movie.objects.filter(similar_movies_stale=True).values_list("title", flat=True)),
+            {"Solaris", "Paddington"},
+        )
+        refresh_similar_movies()
+        refreshed = self.stored()
+        MovieSimilarity.objects.all().delete()
+        rebuild_similar_movies()
+        self.assertEqual(refreshed, self.stored())
+        self.assertEqual(refresh_similar_movies(), [])
+
+    def test_neighbours_are_capped_and_need_enough_co_raters(self):
+        with self.settings(SIMILAR_MOVIES_COUNT=1):
+            rebuild_similar_movies()
+        self.assertEqual(MovieSimilarity.objects.filter(movie=self.movies["Alien"]).count(), 1)
+        with self.settings(SIMILAR_MOVIES_MIN_CO_RATERS=7):
+            rebuild_similar_movies()
+        self.assertFalse(MovieSimilarity.objects.exists())
+        matrix = RatingMatrix.load()
+        self.assertEqual(matrix.vectors.shape, (6, 5))
+
+    def test_endpoint_is_one_query(self):
+        call_command("refresh_similar_movies", full=True, stdout=StringIO())
+        # resolving the title, then the neighbours. The resolved title is cached
+        with self.assertNumQueries(2):
+            self.assertTrue(self.similar("Amelie"))
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0), self.assertNumQueries(1):
+            self.assertTrue(self.similar("Amelie"))
+        res = self.client.get(reverse("movie-similar", kwargs={"title": "Missing"}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movies["Paddington"].delete()
+        self.assertNotIn("Paddington", [title for title, score in self.similar("Amelie")])
+        self.assertTrue(Movie.objects.get(title="Amelie").similar_movies_stale)
+
+
+class LeaderboardTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f"fan{i}") for i in range(8)]
+        self.lone = Movie.objects.create(title="Lone Five", director="someone")
+        self.loved = Movie.objects.create(title="Loved", director="someone")
+        self.fine = Movie.objects.create(title="Fine", director="someone")
+        Review.objects.create(movie=self.lone, user=self.users[0], rating=5, comment="perfect")
+        now = timezone.now()
+        for i, user in enumerate(self.users):
+            # Loved was reviewed weeks ago, Fine this week
+            Review.objects.create(movie=self.loved, user=user, rating=5 if i % 4 else 4, comment="great")
+            Review.objects.create(movie=self.fine, user=user, rating=3, comment="fine")
+        Review.objects.filter(movie=self.loved).update(created_at=now - timedelta(days=10))
+        Review.objects.filter(movie=self.fine, user__in=self.users[:3]).update(created_at=now - timedelta(days=3))
+
+    def board(self, name, **params):
+        res = self.client.get(reverse("leaderboard", kwargs={"board": name}), params, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.json()
+
+    def test_top_rated_uses_a_bayesian_average(self):
+        self.assertEqual(refresh_leaderboards(), {"top_rated": 3, "trending": 2})
+        results = self.board("top_rated")["results"]
+        self.assertEqual([row["movie"]["title"] for row in results], ["Loved", "Lone Five", "Fine"])
+        self.assertEqual([row["rank"] for row in results], [1, 2, 3])
+        mean = (5 + 38 + 24) / 17
+        self.assertAlmostEqual(results[1]["score"], (5 + 10 * mean) / 11)
+
+    def test_trending_ranks_review_velocity(self):
+        call_command("refresh_leaderboards", "trending", stdout=StringIO())
+        self.assertFalse(LeaderboardEntry.objects.filter(board="top_rated").exists())
+        results = self.board("trending")["results"]
+        self.assertEqual([row["movie"]["title"] for row in results], ["Fine", "Lone Five"])
+        self.assertAlmostEqual(results[0]["score"], 8 / 7)
+
+    def test_pages_cost_one_query_each(self):
+        refresh_leaderboards()
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0), self.assertNumQueries(1):
+            page = self.board("top_rated")
+        self.assertEqual((len(page["results"]), page["next"]), (3, None))
+        res = self.client.get(reverse("leaderboard", kwargs={"board": "worst"}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReviewVoteTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title="Voted", director="someone")
+        self.voters = [User.objects.create_user(username=f"voter{i}", password="pw") for i in range(5)]
+        self.quiet = Review.objects.create(movie=self.movie, user=self.voters[0], rating=3, comment="meh")
+        self.popular = Review.objects.create(movie=self.movie, user=self.voters[1], rating=5, comment="spot on")
+
+    def vote(self, user, review, method="post"):
+        self.client.force_authenticate(user)
+        return getattr(self.client, method)(reverse("review-vote", kwargs={"pk": review.pk}), secure=True)
+
+    def test_votes_are_toggled_once_per_user(self):
+        self.assertEqual(self.vote(self.voters[2], self.popular).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.vote(self.voters[2], self.popular).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.vote(self.voters[3], self.popular).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.vote(self.voters[3], self.popular, "delete").status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.vote(self.voters[3], self.popular, "delete").status_code, status.HTTP_204_NO_CONTENT)
+        self.client.force_authenticate(None)
+        res = self.client.post(reverse("review-vote", kwargs={"pk": self.popular.pk}), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.vote(self.voters[2], Review(pk=0)).status_code, status.HTTP_404_NOT_FOUND)
+        fold_review_votes()
+        self.popular.refresh_from_db()
+        self.assertEqual(self.popular.helpful_votes, 1)
+
+    def test_deleting_the_author_of_a_voted_review(self):
+        self.vote(self.voters[2], self.popular)
+        self.voters[1].delete()
+        self.assertFalse(Review.objects.filter(pk=self.popular.pk).exists())
+        self.assertFalse(ReviewVoteShard.objects.exists())
+
+    def test_deleting_a_voter_takes_their_vote_off(self):
+        self.vote(self.voters[2], self.popular)
+        self.vote(self.voters[3], self.popular)
+        self.voters[2].delete()
+        fold_review_votes()
+        self.popular.refresh_from_db()
+        self.assertEqual(self.popular.helpful_votes, 1)
+
+    def test_votes_never_touch_the_review_row(self):
+        self.client.force_authenticate(self.voters[2])
+        with CaptureQueriesContext(connection) as captured:
+            self.vote(self.voters[2], self.popular)
+        review_table = Review._meta.db_table
+        self.assertFalse([q for q in captured if q["sql"].startswith("UPDATE") and f'"{review_table}"' in q["sql"]])
+
+    def test_fold_keeps_votes_spread_over_shards(self):
+        with self.settings(REVIEW_VOTE_SHARDS=3):
+            for voter in self.voters:
+                self.vote(voter, self.popular)
+            self.vote(self.voters[4], self.popular, "delete")
+            self.vote(self.voters[0], self.quiet)
+        self.assertLessEqual(ReviewVoteShard.objects.filter(review=self.popular).count(), 3)
+        call_command("fold_review_votes", batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            dict(Review.objects.values_list("comment", "helpful_votes")), {"spot on": 4, "meh": 1},
+        )
+        self.assertFalse(ReviewVoteShard.objects.exists())
+        # withdrawn after the fold, and by deleting the voter
+        self.vote(self.voters[3], self.popular, "delete")
+        self.voters[2].delete()
+        fold_review_votes()
+        self.popular.refresh_from_db()
+        self.assertEqual(self.popular.helpful_votes, 2)
+
+    def test_review_list_sorts_by_helpfulness(self):
+        for voter in self.voters[:3]:
+            self.vote(voter, self.popular)
+        fold_review_votes()
+        self.client.force_authenticate(None)
+        url = reverse("review-list", kwargs={"title": "Voted"})
+        with self.assertNumQueries(2):
+            res = self.client.get(url, {"sort": "helpful"}, secure=True)
+        self.assertEqual([r["comment"] for r in res.json()["results"]], ["spot on", "meh"])
+        self.assertEqual(res.json()["results"][0]["helpful_votes"], 3)
+        res = self.client.get(url, {"sort": "loudest"}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_votes_benchmark_counts_every_vote(self):
+        out = StringIO()
+        call_command("benchmark", "votes", requests=6, concurrency=1, stdout=out)
+        results = json.loads(out.getvalue())["results"]
+        for label in ("sharded", "single_row"):
+            self.assertEqual((results[label]["errors"], results[label]["counted"]), (0, 6))
+        self.assertFalse(User.objects.filter(username__startswith="bench_").exists())
+
+
+class WatchlistTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="watcher", password="pw")
+        self.token = Token.objects.create(user=self.user)
+        self.movies = [Movie.objects.create(title=f"Watch {i}", director="someone") for i in range(12)]
+        self.url = reverse("watchlist")
+
+    def auth(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def flags(self, url, **params):
+        res = self.client.get(url, params, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {movie["title"]: movie["in_watchlist"] for movie in res.json()["results"]}
+
+    def test_bulk_add_and_remove(self):
+        self.auth()
+        res = self.client.post(self.url, {"movies": ["Watch 1", "Watch 2", "Nope"]}, format="json", secure=True)
+        self.assertEqual(res.json(), {"added": ["Watch 1", "Watch 2"], "not_found": ["Nope"]})
+        res = self.client.post(self.url, {"movies": ["Watch 2", "Watch 3"]}, format="json", secure=True)
+        self.assertEqual(res.json()["added"], ["Watch 3"])
+        res = self.client.delete(self.url, {"movies": ["Watch 1", "Watch 5"]}, format="json", secure=True)
+        self.assertEqual(res.json(), {"removed": 1})
+        res = self.client.post(self.url, {"movies": []}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_watchlist_pages_by_keyset(self):
+        self.auth()
+        titles = [movie.title for movie in self.movies]
+        for title in titles:
+            self.client.post(self.url, {"movies": [title]}, format="json", secure=True)
+        seen, url = [], self.url
+        while url:
+            res = self.client.get(url, secure=True)
+            seen += [entry["movie"]["title"] for entry in res.json()["results"]]
+            self.assertTrue(all(entry["movie"]["in_watchlist"] for entry in res.json()["results"]))
+            url = res.json()["next"]
+        self.assertEqual(seen, titles[::-1])
+
+    def test_movie_listings_flag_watchlist_membership(self):
+        self.auth()
+        self.client.post(self.url, {"movies": ["Watch 0", "Watch 10"]}, format="json", secure=True)
+        # one query for the page and one for the watchlist, cached for the next request
+        with self.assertNumQueries(2):
+            flags = self.flags(reverse("movie_list_api"))
+        self.assertEqual({title for title, flag in flags.items() if flag}, {"Watch 0", "Watch 10"})
+        with self.assertNumQueries(1):
+            self.flags(reverse("movie_list_api"))
+        res = self.client.get(reverse("movie_detail", kwargs={"title": "Watch 0"}), secure=True)
+        self.assertTrue(res.json()["in_watchlist"])
+        res = self.client.get(reverse("async-movie-detail", kwargs={"title": "Watch 0"}), secure=True)
+        self.assertTrue(res.json()["in_watchlist"])
+        self.client.delete(self.url, {"movies": ["Watch 0"]}, format="json", secure=True)
+        self.assertFalse(self.flags(reverse("async-movie-list"))["Watch 0"])
+        self.client.credentials()
+        self.assertFalse(any(self.flags(reverse("movie_list_api")).values()))
+
+
+class ReviewCommentTestCase(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pw")
+        self.other = User.objects.create_user(username="other", password="pw")
+        movie = Movie.objects.create(title="Discussed", director="someone")
+        self.review = Review.objects.create(movie=movie, user=self.author, rating=4, comment="worth it")
+        self.url = reverse("review-comments", kwargs={"pk": self.review.pk})
+
+    def comment(self, body, parent=None, user=None):
+        self.client.force_authenticate(user or self.author)
+        res = self.client.post(self.url, {"body": body, "parent": parent}, format="json", secure=True)
+        self.client.force_authenticate(None)
+        return res
+
+    def test_thread_is_fetched_nested_in_one_query(self):
+        first = self.comment("first").json()["id"]
+        reply = self.comment("reply", first, self.other).json()["id"]
+        self.comment("reply to reply", reply)
+        self.comment("second")
+        self.comment("another reply", first)
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, secure=True)
+        [first_tree, second_tree] = res.json()["results"]
+        self.assertEqual([c["body"] for c in first_tree["replies"]], ["reply", "another reply"])
+        self.assertEqual(first_tree["replies"][0]["replies"][0]["body"], "reply to reply")
+        self.assertEqual(first_tree["replies"][0]["replies"][0]["depth"], 2)
+        self.assertEqual(second_tree["replies"], [])
+        res = self.client.get(self.url, {"depth": 0}, secure=True)
+        self.assertEqual([c["body"] for c in res.json()["results"]], ["first", "second"])
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.comment_count, 5)
+
+    def test_subtree_and_pages(self):
+        root = add_comment(self.review, self.author, "root")
+        parent = root
+        for i in range(4):
+            parent = add_comment(self.review, self.other, f"level {i + 1}", parent)
+        add_comment(self.review, self.author, "sibling")
+        subtree_url = reverse("comment-detail", kwargs={"pk": root.pk})
+        with self.assertNumQueries(2):
+            res = self.client.get(subtree_url, {"depth": 2}, secure=True)
+        [tree] = res.json()["results"]
+        self.assertEqual(tree["replies"][0]["replies"][0]["body"], "level 2")
+        self.assertEqual(tree["replies"][0]["replies"][0]["replies"], [])
+        with self.settings(COMMENT_PAGE_SIZE=2):
+            page = self.client.get(subtree_url, secure=True).json()
+            self.assertEqual([c["body"] for c in page["results"]], ["root"])
+            page = self.client.get(page["next"], secure=True).json()
+            # a page starting mid thread starts from the first comment it has
+            self.assertEqual([c["body"] for c in page["results"]], ["level 2"])
+            self.assertEqual(page["results"][0]["replies"][0]["body"], "level 3")
+            page = self.client.get(page["next"], secure=True).json()
+            self.assertEqual([c["body"] for c in page["results"]], ["level 4"])
+            self.assertIsNone(page["next"])
+
+    def test_permissions_validation_and_counts(self):
+        self.assertEqual(self.comment("").status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(self.url, {"body": "anonymous"}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        other_review = Review.objects.create(movie=self.review.movie, user=self.other, rating=2, comment="no")
+        foreign = add_comment(other_review, self.other, "elsewhere")
+        self.assertEqual(self.comment("reply", foreign.pk).status_code, status.HTTP_400_BAD_REQUEST)
+        missing = reverse("review-comments", kwargs={"pk": 0})
+        self.assertEqual(self.client.get(missing, secure=True).status_code, status.HTTP_404_NOT_FOUND)
+
+        root = self.comment("root").json()["id"]
+        reply = self.comment("reply", root, self.other).json()["id"]
+        self.comment("deeper", reply)
+        self.client.force_authenticate(self.other)
+        url = reverse("comment-detail", kwargs={"pk": root})
+        self.assertEqual(self.client.delete(url, secure=True).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.delete(url, secure=True).status_code, status.HTTP_204_NO_CONTENT)
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.comment_count, ReviewComment.objects.filter(review=self.review).count()), (0, 0))
+
+    def test_comments_benchmark(self):
+        results = comments_suite(requests=2, size=60)
+        self.assertEqual(results["first_page"]["queries_max"], 1)
+        self.assertEqual(results["subtree"]["queries_max"], 2)
+        self.assertEqual(results["whole_thread"]["queries_max"], 1)
+        self.assertFalse(ReviewComment.objects.exists())
+
+
+class LoginProtectionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.url = reverse("login_api")
+
+    def login(self, username="member", password="memberpass"):
+        return self.client.post(self.url, {"username": username, "password": password}, secure=True)
+
+    @override_settings(LOGIN_RATE_PER_IP="3/min")
+    def test_attempts_per_address_are_throttled_before_hashing(self):
+        self.assertEqual(self.login(password="wrong").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login(username="nobody").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        with mock.patch("movie_review.authentication.run_hashing") as hashing, self.assertNumQueries(0):
+            res = self.login()
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", res)
+        hashing.assert_not_called()
+        res = self.client.post(self.url, {"username": "member", "password": "memberpass"}, secure=True,
+                               REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(LOGIN_RATE_PER_IP="2/min")
+    @mock.patch("movie_review.throttling.time.time", return_value=1_000_020.0)
+    def test_spoofed_forwarded_for_shares_the_address_window(self, clock):
+        for address in ("1.1.1.1", "2.2.2.2"):
+            res = self.client.post(self.url, {"username": "member", "password": "wrong"}, secure=True,
+                                   HTTP_X_FORWARDED_FOR=address)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(self.url, {"username": "member", "password": "memberpass"}, secure=True,
+                               HTTP_X_FORWARDED_FOR="3.3.3.3")
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(LOGIN_RATE_PER_IP=None, LOGIN_FAILURES_PER_USERNAME="2/min")
+    # the clock is held mid window, a minute starting during the test would let the failures fade
+    @mock.patch("movie_review.throttling.time.time", return_value=1_000_020.0)
+    def test_failures_per_username_are_throttled(self, clock):
+        for _ in range(4):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login(password="wrong").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login(username="MEMBER", password="wrong").status_code, status.HTTP_401_UNAUTHORIZED)
+        # the right password is not even checked once the username is throttled
+        self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        User.objects.create_user(username="other", password="otherpass")
+        self.assertEqual(self.login("other", "otherpass").status_code, status.HTTP_200_OK)
+
+    @override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_TIMEOUT=5)
+    def test_hashing_runs_on_the_pool(self):
+        threads = []
+
+        def verify(password, encoded):
+            threads.append(threading.current_thread().name)
+            return verify_password(password, encoded)
+
+        with mock.patch("movie_review.authentication.verify_password", verify):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.login(password="wrong").status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith("password-hashing") for name in threads))
+
+    @override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_TIMEOUT=0.05)
+    def test_login_is_refused_when_every_hashing_worker_is_busy(self):
+        release = threading.Event()
+        busy = hashing_pool().submit(release.wait, 5)
+        # the worker frees up, but only after the login has waited longer than LOGIN_HASH_TIMEOUT
+        threading.Timer(0.2, release.set).start()
+        res = self.login()
+        busy.result()
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+
+class RateLimitTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.admin = User.objects.create_user(username="admin", password="adminpass", role="admin")
+        self.movie = Movie.objects.create(title="Limited", director="someone")
+        self.reviews_url = reverse("review-list", kwargs={"title": self.movie.title})
+
+    @override_settings(RATE_LIMITS={"read": {"anon": "3/min"}})
+    def test_anonymous_reads_are_limited_per_address(self):
+        for remaining in (2, 1, 0):
+            res = self.client.get(self.reviews_url, secure=True)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res["RateLimit-Limit"], "3")
+            self.assertEqual(res["RateLimit-Remaining"], str(remaining))
+            self.assertEqual(res["RateLimit-Policy"], "3;w=60")
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse("movie_list_api"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(res["Retry-After"]), 0)
+        res = self.client.get(self.reviews_url, secure=True, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(RATE_LIMITS={
+        "read": {"member": "5/min"}, "review_write": {"member": "1/min"}, "write": {"member": "5/min"},
+    })
+    def test_review_writes_have_their_own_budget(self):
+        token = Token.objects.create(user=self.member)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        res = self.client.post(self.reviews_url, {"rating": 4, "comment": "fine", "movie": self.movie.id}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res["RateLimit-Remaining"], "0")
+        res = self.client.post(self.reviews_url, {"rating": 4, "comment": "again", "movie": self.movie.id}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = self.client.get(self.reviews_url, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["RateLimit-Remaining"], "4")
+        res = self.client.post(reverse("watchlist"), {"movies": [self.movie.title]}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(RATE_LIMITS={"read": {"anon": "1/min", "member": "1/min", "admin": None}})
+    def test_budgets_follow_the_token_and_role(self):
+        self.client.force_authenticate(self.admin)
+        for _ in range(3):
+            res = self.client.get(self.reviews_url, secure=True)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn("RateLimit-Limit", res)
+        first, second = (Token.objects.create(user=self.member), Token.objects.create(user=self.admin))
+        second.delete()
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {first.key}")
+        self.assertEqual(self.client.get(self.reviews_url, secure=True).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.reviews_url, secure=True).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # the member's requests did not use up the budget of the address they came from
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.reviews_url, secure=True).status_code, status.HTTP_200_OK)
+
+    def test_sliding_window_estimate(self):
+        # a quarter into the window, three quarters of the previous window's hits still count
+        window = RateWindow(10, 60, previous=8, current=3, now=60 * 100 + 15)
+        self.assertEqual(window.hits, 9)
+        self.assertEqual(window.remaining, 1)
+        self.assertTrue(window.allowed)
+        self.assertIsNone(window.wait())
+        full = RateWindow(10, 60, previous=8, current=5, now=60 * 100 + 15)
+        self.assertFalse(full.allowed)
+        # the previous window's share has to drop under 5, three eighths into the window
+        self.assertAlmostEqual(full.wait(), 7.5)
+        over = RateWindow(10, 60, previous=0, current=20, now=60 * 100 + 30)
+        self.assertAlmostEqual(over.wait(), 60)
+
+    def test_throttle_benchmark(self):
+        results = throttle_suite(requests=50)
+        self.assertEqual(set(results), {"anonymous", "member", "anonymous_history"})
+        self.assertEqual(results["member"]["requests"], 50)
+
+
+class MovieResolverTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.movie = Movie.objects.create(title="The Matrix: Reloaded", director="someone")
+
+    def detail(self, key):
+        return self.client.get(reverse("movie_detail", kwargs={"title": key}), secure=True)
+
+    def test_slugs_are_normalised_and_kept_unique(self):
+        self.assertEqual(self.movie.slug, "the-matrix-reloaded")
+        twin = Movie.objects.create(title="The Matrix Reloaded!", director="someone")
+        self.assertRegex(twin.slug, r"^the-matrix-reloaded-[0-9a-f]{8}$")
+        self.assertEqual(Movie.objects.create(title="Amélie", director="someone").slug, "amélie")
+        self.movie.title = "The Matrix Revolutions"
+        self.movie.save()
+        self.assertEqual(self.movie.slug, "the-matrix-revolutions")
+        # the twin's slug does not move when its title slugifies alike again
+        twin.save()
+        self.assertRegex(twin.slug, r"^the-matrix-reloaded-[0-9a-f]{8}$")
+
+    def test_collection_endpoints_are_not_taken_as_slugs(self):
+        search = Movie.objects.create(title="Search", director="someone")
+        batch = Movie.objects.create(title="Batch!", director="someone")
+        self.assertRegex(search.slug, r"^search-[0-9a-f]{8}$")
+        self.assertRegex(batch.slug, r"^batch-[0-9a-f]{8}$")
+        self.assertEqual(self.detail(search.slug).json()["id"], search.id)
+
+    def test_movies_are_found_by_slug_or_title(self):
+        for key in (self.movie.slug, self.movie.title):
+            with self.subTest(key):
+                self.assertEqual(self.detail(key).json()["id"], self.movie.id)
+                res = self.client.get(reverse("async-movie-detail", kwargs={"title": key}), secure=True)
+                self.assertEqual(res.json()["id"], self.movie.id)
+                res = self.client.get(reverse("review-list", kwargs={"title": key}), secure=True)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.detail("the-matrix").status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resolved_titles_are_cached(self):
+        url = reverse("review-list", kwargs={"title": self.movie.title})
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0):
+            # the title, then the page of reviews
+            with self.assertNumQueries(2):
+                self.client.get(url, secure=True)
+            with self.assertNumQueries(1):
+                self.client.get(url, secure=True)
+            # the detail reads the movie by the resolved id, and the preview
+            with self.assertNumQueries(2):
+                self.detail(self.movie.title)
+
+    def test_review_create_resolves_the_movie_once(self):
+        self.client.force_authenticate(self.member)
+        url = reverse("review-list", kwargs={"title": self.movie.slug})
+        with mock.patch("movie_review.views.resolve_movie_id", wraps=resolve_movie_id) as resolve:
+            # the movie of the URL is used, the body does not need to name it
+            res = self.client.post(url, {"rating": 4, "comment": "fine"}, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        resolve.assert_called_once_with(self.movie.slug)
+        self.assertEqual(Review.objects.get().movie, self.movie)
+
+    def test_renames_and_deletes_invalidate_the_resolver(self):
+        self.assertEqual(self.detail("Inception").status_code, status.HTTP_404_NOT_FOUND)
+        with self.captureOnCommitCallbacks(execute=True):
+            inception = Movie.objects.create(title="Inception", director="someone")
+        self.assertEqual(self.detail("Inception").status_code, status.HTTP_200_OK)
+
+        old_slug = self.movie.slug
+        self.assertEqual(self.detail(old_slug).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = "The Matrix Revolutions"
+            self.movie.save()
+        self.assertEqual(self.detail(old_slug).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.detail("the-matrix-revolutions").json()["title"], "The Matrix Revolutions")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inception.delete()
+        self.assertEqual(self.detail("inception").status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BatchEndpointsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.admin = User.objects.create_user(username="admin", password="adminpass", role="admin")
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.other = User.objects.create_user(username="other", password="otherpass")
+        self.movies = [Movie.objects.create(title=f"Movie {i}", director="someone") for i in range(5)]
+
+    def test_movies_are_fetched_by_id_and_title_in_one_request(self):
+        Review.objects.create(movie=self.movies[0], user=self.member, rating=4, comment="good")
+        query = f"?id={self.movies[0].id}&id={self.movies[1].id}&id=999999&title=movie-2&title=Movie 3&title=nope"
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0):
+            # the movies, then the review previews of all of them
+            with self.assertNumQueries(2):
+                res = self.client.get(reverse("movie-batch") + query, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.json()["results"]
+        self.assertEqual([result["status"] for result in results], [200, 200, 404, 200, 200, 404])
+        self.assertEqual(
+            [result.get("movie", {}).get("id") for result in results],
+            [self.movies[0].id, self.movies[1].id, None, self.movies[2].id, self.movies[3].id, None],
+        )
+        self.assertEqual(results[0]["movie"]["reviews"][0]["comment"], "good")
+
+    def test_batch_size_is_limited(self):
+        query = "&".join(f"id={i}" for i in range(4))
+        self.client.force_authenticate(self.admin)
+        with self.settings(BATCH_REQUEST_LIMIT=3):
+            res = self.client.get(f"{reverse('movie-batch')}?{query}", secure=True)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            edits = [{"id": movie.id, "director": "x"} for movie in self.movies[:4]]
+            res = self.client.patch(reverse("movie-batch"), {"movies": edits}, format="json", secure=True)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("movies", res.json())
+            res = self.client.delete(reverse("review-batch"), {"reviews": [1, 2, 3, 4]}, format="json", secure=True)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("reviews", res.json())
+
+    def test_admins_edit_many_movies_with_a_status_per_movie(self):
+        self.client.force_authenticate(self.admin)
+        edits = [
+            {"id": self.movies[0].id, "director": "Wachowski"},
+            {"id": self.movies[1].id, "title": self.movies[2].title},
+            {"id": 999999, "director": "nobody"},
+        ]
+        res = self.client.patch(reverse("movie-batch"), {"movies": edits}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.json()["results"]
+        self.assertEqual([result["status"] for result in results], [200, 400, 404])
+        self.assertIn("title", results[1]["errors"])
+        self.assertEqual(Movie.objects.get(pk=self.movies[0].id).director, "Wachowski")
+        self.assertEqual(Movie.objects.get(pk=self.movies[1].id).title, "Movie 1")
+
+    def test_members_cannot_edit_movies(self):
+        self.client.force_authenticate(self.member)
+        edits = [{"id": self.movies[0].id, "director": "Wachowski"}]
+        res = self.client.patch(reverse("movie-batch"), {"movies": edits}, format="json", secure=True)
+        self.assertEqual(res.json()["results"], [{"id": self.movies[0].id, "status": 403}])
+        self.assertEqual(Movie.objects.get(pk=self.movies[0].id).director, "someone")
+        res = self.client.patch(reverse("movie-batch"), {"movies": [{"director": "x"}]}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reviews_are_deleted_only_where_allowed(self):
+        own = [
+            Review.objects.create(movie=movie, user=self.member, rating=5, comment="mine") for movie in self.movies[:2]
+        ]
+        theirs = Review.objects.create(movie=self.movies[0], user=self.other, rating=1, comment="theirs")
+        self.client.force_authenticate(self.member)
+        ids = [own[0].id, theirs.id, 999999, own[1].id]
+        res = self.client.delete(reverse("review-batch"), {"reviews": ids}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([result["status"] for result in res.json()["results"]], [204, 403, 404, 204])
+        self.assertEqual(list(Review.objects.values_list("id", flat=True)), [theirs.id])
+        # the denormalised ratings follow the deletes
+        movie = Movie.objects.get(pk=self.movies[0].id)
+        self.assertEqual((movie.rating_count, movie.rating_sum), (1, 1))
+        self.assertEqual(Movie.objects.get(pk=self.movies[1].id).rating_count, 0)
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.movies = [
+            Movie.objects.create(title=f"Movie {i}", director="someone", description="long " * 200) for i in range(3)
+        ]
+        self.review = Review.objects.create(movie=self.movies[0], user=self.member, rating=4, comment="good")
+
+    def get(self, url, **params):
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0), CaptureQueriesContext(connection) as captured:
+            res = self.client.get(url, params, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+        return res.json(), captured
+
+    def test_fields_trim_the_movie_list_and_its_columns(self):
+        data, captured = self.get(reverse("movie_list_api"), fields="id,title")
+        self.assertEqual(data["results"][0], {"id": self.movies[0].id, "title": "Movie 0"})
+        self.assertNotIn("description", captured[-1]["sql"])
+        data, captured = self.get(reverse("movie_list_api"), omit="description,average_rating")
+        self.assertNotIn("description", data["results"][0])
+        self.assertNotIn("average_rating", data["results"][0])
+        self.assertIn("director", data["results"][0])
+        self.assertNotIn("description", captured[-1]["sql"])
+
+    def test_reviews_are_only_embedded_when_expanded(self):
+        data, captured = self.get(reverse("movie_list_api"))
+        self.assertNotIn("reviews", data["results"][0])
+        self.assertEqual(len(captured), 1)
+        # the previews of the whole page are read in one more query
+        data, captured = self.get(reverse("movie_list_api"), expand="reviews")
+        self.assertEqual(data["results"][0]["reviews"][0]["comment"], "good")
+        self.assertEqual(data["results"][1]["reviews"], [])
+        self.assertEqual(len(captured), 2)
+
+    def test_detail_skips_the_review_preview_when_left_out(self):
+        url = reverse("movie_detail", kwargs={"title": self.movies[0].slug})
+        data, captured = self.get(url)
+        self.assertEqual(len(data["reviews"]), 1)
+        data, captured = self.get(url, fields="title,average_rating")
+        self.assertEqual(data, {"title": "Movie 0", "average_rating": 4.0})
+        self.assertEqual(len(captured), 1)
+        # the reviews nested in a movie keep all their fields
+        data, captured = self.get(url, fields="reviews")
+        self.assertEqual(data["reviews"][0]["user"], "member")
+
+    def test_review_fields_leave_out_the_user_join(self):
+        url = reverse("review-list", kwargs={"title": self.movies[0].slug})
+        self.get(url)
+        data, captured = self.get(url, fields="id,rating")
+        self.assertEqual(data["results"], [{"id": self.review.id, "rating": 4}])
+        self.assertNotIn("JOIN", captured[-1]["sql"])
+        data, captured = self.get(reverse("review-detail", kwargs={"pk": self.review.pk}), omit="comment")
+        self.assertEqual(data["user"], "member")
+        self.assertNotIn("comment", data)
+
+    def test_unknown_fields_are_rejected(self):
+        for params in ({"fields": "title,budget"}, {"omit": "budget"}, {"expand": "description"}):
+            with self.subTest(params):
+                res = self.client.get(reverse("movie_list_api"), params, secure=True)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        # the detail embeds the reviews by default, they cannot be expanded again
+        url = reverse("movie_detail", kwargs={"title": self.movies[0].slug})
+        self.assertEqual(self.client.get(url, {"expand": "reviews"}, secure=True).status_code, 400)
+
+    def test_writes_ignore_the_fieldset(self):
+        self.client.force_authenticate(self.member)
+        url = reverse("review-detail", kwargs={"pk": self.review.pk}) + "?fields=id"
+        res = self.client.patch(url, {"rating": 5}, format="json", secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["rating"], 5)
+
+
+class FastSerializationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.others = [User.objects.create_user(username=f"user {i}", password="pw") for i in range(3)]
+        self.movies = [
+            Movie.objects.create(
+                title="Amélie \u2028 <b>&</b>", director="Jeunet", genre="Romance", release_date="2001-04-25",
+                description="Une fille \"timide\" à Paris", trailer_link="https://example.com/amelie",
+            ),
+            Movie.objects.create(title="The Matrix", director="Wachowskis", description="A hacker and the matrix"),
+            Movie.objects.create(title="Unrated", director="nobody"),
+        ]
+        for i, user in enumerate([self.member, *self.others]):
+            for movie in self.movies[:2]:
+                Review.objects.create(movie=movie, user=user, rating=i % 5 + 1, comment=f"review {i} ☃")
+        Review.objects.filter(user=self.others[0]).update(helpful_votes=3)
+        add_to_watchlist(self.member, ["The Matrix"])
+
+    def fetch(self, url, fast, params):
+        with self.settings(FAST_READ_SERIALIZATION=fast, RESPONSE_CACHE_TIMEOUT=0):
+            res = self.client.get(url, params, secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+        return res.content
+
+    def assertSameResponse(self, url, **params):
+        with mock.patch.object(
+            RowSerializerMixin, "rows_to_representation", autospec=True,
+            side_effect=RowSerializerMixin.rows_to_representation,
+        ) as rows_path:
+            fast = self.fetch(url, True, params)
+        self.assertTrue(rows_path.called)
+        self.assertEqual(fast, self.fetch(url, False, params))
+        return json.loads(fast)
+
+    def test_movie_lists_are_the_same_from_rows(self):
+        url = reverse("movie_list_api")
+        for params in ({}, {"expand": "reviews"}, {"fields": "id,title,average_rating"}, {"sort": "top_rated"}):
+            with self.subTest(params):
+                self.assertSameResponse(url, **params)
+        self.client.force_authenticate(self.member)
+        data = self.assertSameResponse(url, expand="reviews")
+        self.assertEqual([movie["in_watchlist"] for movie in data["results"]], [False, True, False])
+        with mock.patch("movie_review.pagination.MovieKeysetPagination.page_size", 1):
+            following = self.assertSameResponse(url)["next"]
+            self.assertSameResponse(following.split("?", 1)[0], cursor=parse_qs(urlsplit(following).query)["cursor"][0])
+
+    def test_review_lists_and_search_are_the_same_from_rows(self):
+        for params in ({}, {"sort": "helpful"}, {"omit": "user,comment"}):
+            with self.subTest(params):
+                self.assertSameResponse(reverse("review-list", kwargs={"title": self.movies[0].slug}), **params)
+        data = self.assertSameResponse(reverse("movie-search"), q="matrix")
+        self.assertEqual([movie["title"] for movie in data["results"]], ["The Matrix"])
+
+    def test_batch_details_are_the_same_from_rows(self):
+        url = reverse("movie-batch")
+        self.assertSameResponse(url, id=[movie.id for movie in self.movies], title="the-matrix")
+        self.assertSameResponse(url, id=self.movies[0].id, fields="title,reviews_url")
+
+    def test_renderer_output_is_byte_for_byte_the_same(self):
+        payloads = [
+            {"text": "é ☃ \u2028 \u2029 \"quoted\" </script>", "empty": "", "none": None, "flag": True},
+            ReturnDict([("id", 1), ("rating", 4.0), ("score", 0.30000000000000004)], serializer=None),
+            [1e-05, 2.5e-07, 1e16, 1.2345678901234568e17, -0.5, 0.0001, 123456.789, 0],
+            {"at": datetime(2026, 10, 18, 12, 30, 15, 123456, tzinfo=dt_timezone.utc), "on": date(2026, 10, 18)},
+            {"price": Decimal("12.50"), "uuid": uuid.UUID(int=1), "detail": ErrorDetail("Not found.", code="x")},
+            {1: "integer key", "big": 2 ** 70},
+            "a float written 1e5 inside a string",
+        ]
+        for data in payloads:
+            with self.subTest(data):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = "application/json; indent=2"
+        self.assertEqual(
+            FastJSONRenderer().render(payloads[0], indented, {}), JSONRenderer().render(payloads[0], indented, {})
+        )
+
+    def test_parser_gives_the_same_data(self):
+        bodies = (b'{"title": "Am\\u00e9lie", "rating": 4, "tags": [1.5, null, true]}', b'{"big": 1180591620717411303424}')
+        for body in bodies:
+            with self.subTest(body):
+                self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        with self.assertRaisesMessage(ParseError, "JSON parse error"):
+            FastJSONParser().parse(BytesIO(b'{"title": '))
+        res = self.client.post(
+            reverse("login_api"), b'{"username": "member", "password": "memberpass"}',
+            content_type="application/json", secure=True,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_serialization_benchmark_reports_per_row_costs(self):
+        results = serialization_suite(requests=2, size=2)
+        self.assertEqual(set(results), {"movies", "reviews", "render"})
+        self.assertEqual(results["reviews"]["rows"], 2)
+        self.assertGreater(results["movies"]["values_rows"]["us_per_row"], 0)
+        self.assertGreater(results["render"]["orjson"]["us_per_row"], 0)
+
+
+# the test database is the only one there is, so it stands in for the replica: the router names it
+# for the reads sent to a replica and gives None for the reads left to the primary
+@override_settings(DATABASE_REPLICAS=["default"], RESPONSE_CACHE_TIMEOUT=0, REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        routers._health.clear()
+        get_token_cache().clear()
+        self.member = User.objects.create_user(username="member", password="memberpass")
+        self.movie = Movie.objects.create(title="Inception", director="someone")
+        self.reviews_url = reverse("review-list", kwargs={"title": self.movie.slug})
+
+    def request(self, method, url, data=None, **extra):
+        '''Sends the request, returning the response and the set of aliases its reads were routed to'''
+        aliases = set()
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            aliases.add(alias)
+            return alias
+        with mock.patch.object(PrimaryReplicaRouter, "db_for_read", record):
+            res = getattr(self.client, method)(url, data, secure=True, **extra)
+        return res, aliases
+
+    def test_safe_requests_read_from_a_replica(self):
+        res, aliases = self.request("get", reverse("movie_list_api"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {"default"})
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.request("get", reverse("movie_list_api"))[1], {None})
+
+    async def test_async_requests_read_from_a_replica(self):
+        aliases = set()
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            aliases.add(alias)
+            return alias
+        with mock.patch.object(PrimaryReplicaRouter, "db_for_read", record):
+            res = await self.async_client.get(reverse("async-movie-list"), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {"default"})
+
+    def test_writers_read_from_the_primary_for_a_while(self):
+        self.client.force_authenticate(self.member)
+        res, aliases = self.request("post", self.reviews_url, {"rating": 4, "comment": "fine"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(aliases, {None})
+        res, aliases = self.request("get", self.reviews_url)
+        self.assertEqual(len(res.json()["results"]), 1)
+        self.assertEqual(aliases, {None})
+        # other clients are not pinned
+        self.assertEqual(self.request("get", self.reviews_url, REMOTE_ADDR="10.0.0.2")[1], {"default"})
+        # the pin expires with REPLICA_STICKY_SECONDS
+        cache.clear()
+        self.assertEqual(self.request("get", self.reviews_url)[1], {"default"})
+
+    def test_credentials_pin_the_client_whatever_its_address(self):
+        token = Token.objects.create(user=self.member)
+        auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        res, _ = self.request("post", self.reviews_url, {"rating": 4, "comment": "fine"}, **auth)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.request("get", self.reviews_url, REMOTE_ADDR="10.0.0.2", **auth)[1], {None})
+        self.assertFalse(any(token.key in str(key) for key in cache._cache))
+
+    def test_failed_writes_do_not_pin(self):
+        self.client.force_authenticate(self.member)
+        res, _ = self.request("post", self.reviews_url, {"rating": 99})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.request("get", self.reviews_url)[1], {"default"})
+
+    def test_unhealthy_replicas_fall_back_to_the_primary(self):
+        with mock.patch("movie_review.routers.check_replica", return_value=False) as check:
+            self.assertEqual(self.request("get", reverse("movie_list_api"))[1], {None})
+            self.assertEqual(self.request("get", reverse("movie_list_api"))[1], {None})
+        # checked once per REPLICA_HEALTH_CHECK_INTERVAL
+        check.assert_called_once_with("default")
+        with self.settings(REPLICA_HEALTH_CHECK_INTERVAL=0):
+            self.assertTrue(replica_is_healthy("default"))
+            self.assertEqual(self.request("get", reverse("movie_list_api"))[1], {"default"})
+
+    def test_health_checks(self):
+        self.assertTrue(check_replica("default"))
+        with self.assertLogs("movie_review.routers", "WARNING"):
+            self.assertFalse(check_replica("missing"))
+
+    def test_replica_reads_are_not_cached_right_after_a_write(self):
+        self.client.force_authenticate(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request("post", self.reviews_url, {"rating": 4, "comment": "fine"})
+        self.client.force_authenticate(None)
+        other = {"REMOTE_ADDR": "10.0.0.2"}
+        # the replica's health is checked ahead of the counted requests
+        self.assertTrue(replica_is_healthy("default"))
+        with self.settings(RESPONSE_CACHE_TIMEOUT=300):
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.request("get", self.reviews_url, **other)
+            # what the write did not touch is cached as usual
+            self.request("get", reverse("movie_detail", kwargs={"title": "Memento"}), **other)
+            self.assertEqual(cache.get(movie_key_cache_key("Memento")), 0)
+            # once the replicas caught up, or on the primary, the responses are cached again
+            cache.delete(routers.written_key(movie_version_key(self.movie.slug)))
+            self.request("get", self.reviews_url, **other)
+            with self.assertNumQueries(0):
+                self.request("get", self.reviews_url, **other)
+
+    def test_users_read_from_a_lagging_replica_are_not_cached(self):
+        admin = User.objects.create_user(username="admin", password="adminpass", role="admin")
+        token = Token.objects.create(user=admin)
+        auth = {"HTTP_AUTHORIZATION": f"Token {token.key}", "REMOTE_ADDR": "10.0.0.2"}
+        self.assertTrue(replica_is_healthy("default"))
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.role = "member"
+            admin.save()
+        # the demoted user's next read goes to a replica that may still have them as an admin
+        res, aliases = self.request("get", reverse("watchlist"), **auth)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {"default"})
+        self.assertIsNone(get_token_cache().get(token_cache_key(token.key)))
+        # the watchlist the movie list flags was not written, it is cached all the same
+        self.request("get", reverse("movie_list_api"), **auth)
+        self.assertIsNone(get_token_cache().get(token_cache_key(token.key)))
+        self.assertIsNotNone(cache.get(watchlist_cache_key(admin.pk)))
+        # once the replicas caught up the token is cached again
+        cache.delete(routers.written_key(token_cache_key(token.key)))
+        self.request("get", reverse("movie_list_api"), **auth)
+        entry = get_token_cache().get(token_cache_key(token.key))
+        self.assertEqual(entry["user"]["role"], "member")
+
+    def test_watchlist_changes_mark_only_the_watchlist_as_lagging(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_watchlist(self.member, [self.movie.title])
+        self.assertIsNotNone(cache.get(routers.written_key(watchlist_cache_key(self.member.pk))))
+        self.assertTrue(replica_is_healthy("default"))
+        with self.settings(RESPONSE_CACHE_TIMEOUT=300):
+            self.request("get", reverse("movie_list_api"))
+            with self.assertNumQueries(0):
+                self.request("get", reverse("movie_list_api"))
+
+    def test_replicas_are_never_migrated_or_written(self):
+        router = PrimaryReplicaRouter()
+        self.assertFalse(router.allow_migrate("default", "movie_review"))
+        self.assertEqual(router.db_for_write(Movie), "default")
+        with self.settings(DATABASE_REPLICAS=["replica1"]):
+            self.assertIsNone(router.allow_migrate("default", "movie_review"))
+
+
+class FeedTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_rate_limit_cache().clear()
+        self.reader = User.objects.create_user(username="reader", password="readerpass")
+        self.critic = User.objects.create_user(username="critic", password="criticpass")
+        self.star = User.objects.create_user(username="star", password="starpass")
+        self.movies = [Movie.objects.create(title=f"Movie {i}", director="someone") for i in range(12)]
+        self.client.force_authenticate(self.reader)
+
+    def follow_url(self, user):
+        return reverse("user-follow", kwargs={"username": user.username})
+
+    def write(self, user, movies):
+        return [Review.objects.create(movie=movie, user=user, rating=3, comment="seen it") for movie in movies]
+
+    def read_feed(self, url=None):
+        '''Walks the whole feed from url, returning the review ids in the order they were listed'''
+        ids, url = [], url or reverse("feed")
+        while url:
+            res = self.client.get(url, secure=True)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids += [review["id"] for review in res.json()["results"]]
+            url = res.json()["next"]
+        return ids
+
+    def newest_first(self, *users):
+        return list(Review.objects.filter(user__in=users).order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    def test_follow_and_unfollow(self):
+        res = self.client.post(self.follow_url(self.critic), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(self.follow_url(self.critic), secure=True).status_code, status.HTTP_200_OK)
+        self.critic.refresh_from_db()
+        self.assertEqual(self.critic.follower_count, 1)
+        res = self.client.post(self.follow_url(self.reader), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        missing = reverse("user-follow", kwargs={"username": "nobody"})
+        self.assertEqual(self.client.post(missing, secure=True).status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.delete(self.follow_url(self.critic), secure=True)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.critic.refresh_from_db()
+        self.assertEqual(self.critic.follower_count, 0)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse("feed"), secure=True).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reviews_are_fanned_out_to_followers(self):
+        older = self.write(self.critic, self.movies[:3])
+        # following fills the timeline with the latest reviews, up to FEED_LENGTH
+        with self.settings(FEED_LENGTH=2):
+            self.client.post(self.follow_url(self.critic), secure=True)
+        self.assertEqual(self.read_feed(), [older[2].pk, older[1].pk])
+        newer = self.write(self.critic, self.movies[3:5])
+        self.assertEqual(self.read_feed(), [newer[1].pk, newer[0].pk, older[2].pk, older[1].pk])
+        res = self.client.get(reverse("feed"), secure=True)
+        self.assertEqual(res.json()["results"][0]["movie"], self.movies[4].slug)
+        self.assertEqual(res.json()["results"][0]["user"], "critic")
+
+        # deleted reviews leave the feed, and so does everything of an unfollowed user
+        newer[1].delete()
+        self.assertEqual(self.read_feed()[0], newer[0].pk)
+        self.client.delete(self.follow_url(self.critic), secure=True)
+        self.assertEqual(self.read_feed(), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_popular_authors_are_pulled_at_read_time(self):
+        follow(self.reader, self.critic)
+        self.write(self.critic, self.movies[:6])
+        follow(self.reader, self.star)
+        fanned = self.write(self.star, self.movies[:3])
+        with self.settings(FEED_FANOUT_FOLLOWER_LIMIT=2):
+            follow(self.critic, self.star)
+            # the star now has two followers, their new reviews go to no timeline
+            self.write(self.star, self.movies[3:9])
+            self.assertFalse(FeedEntry.objects.filter(review__movie__in=self.movies[3:9], author=self.star).exists())
+            # the timeline and the star's reviews are merged, the entries fanned out before are not listed twice
+            self.assertEqual(self.read_feed(), self.newest_first(self.critic, self.star))
+            self.assertEqual(len(self.read_feed()), 15)
+            with self.assertNumQueries(4):
+                self.client.get(reverse("feed"), secure=True)
+        self.assertTrue(FeedEntry.objects.filter(review__in=fanned, user=self.reader).exists())
+
+    def test_feed_is_keyset_paginated(self):
+        follow(self.reader, self.critic)
+        follow(self.reader, self.star)
+        self.write(self.critic, self.movies)
+        self.write(self.star, self.movies[:7])
+        expected = self.newest_first(self.critic, self.star)
+        for limit in (1000, 1):
+            with self.subTest(limit=limit), self.settings(FEED_FANOUT_FOLLOWER_LIMIT=limit):
+                self.assertEqual(self.read_feed(), expected)
+                first = self.client.get(reverse("feed"), secure=True).json()
+                second = self.client.get(first["next"], secure=True).json()
+                self.assertEqual(len(first["results"]), 10)
+                back = self.client.get(second["previous"], secure=True).json()
+                self.assertEqual(back["results"], first["results"])
+                tampered = base64.urlsafe_b64encode(json.dumps(
+                    {"o": ["-created_at", "-review_id"], "p": [second["results"][0]["created_at"], "x"], "r": 0}
+                ).encode()).decode()
+                res = self.client.get(reverse("feed"), {"cursor": tampered}, secure=True)
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        with self.settings(FEED_FANOUT_FOLLOWER_LIMIT=1000), self.assertNumQueries(3):
+            self.client.get(reverse("feed"), secure=True)
+
+    def test_timelines_are_trimmed(self):
+        follow(self.reader, self.critic)
+        follow(self.star, self.critic)
+        reviews = self.write(self.critic, self.movies[:5])
+        follow(self.critic, self.star)
+        self.write(self.star, self.movies[:1])
+        with self.settings(FEED_LENGTH=3):
+            self.assertEqual(trim_feeds(), 4)
+            out = StringIO()
+            call_command("trim_feeds", stdout=out)
+        self.assertIn("Dropped 0 review(s)", out.getvalue())
+        self.assertEqual(self.read_feed(), [review.pk for review in reversed(reviews[2:])])
+        self.assertEqual(FeedEntry.objects.filter(user=self.critic).count(), 1)
+
+    def test_follower_counts_follow_deleted_users(self):
+        follow(self.reader, self.critic)
+        follow(self.star, self.critic)
+        self.star.delete()
+        self.critic.refresh_from_db()
+        self.assertEqual(self.critic.follower_count, 1)
+        self.assertEqual(Follow.objects.count(), 1)
@@ -0,0 +1,231 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .cache_keys import hashed_cache_key
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_rate_limit_cache():
+    return caches[settings.RATE_LIMIT_CACHE_ALIAS]
+
+
+def parse_rate(rate):
+    '''Turns a rate like '120/min' into (120, 60), None stays None'''
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), RATE_PERIODS[period[0]]
+
+
+class RateWindow:
+    '''The hits of one client in the sliding window ending now, estimated from two fixed window counters.
+
+    The previous window's count is weighted by how much of it the sliding window still covers,
+    which is exact when its hits were spread evenly and never off by more than that count otherwise.
+    '''
+
+    def __init__(self, limit, duration, previous, current, now):
+        self.limit = limit
+        self.duration = duration
+        self.previous = previous
+        self.current = current
+        self.elapsed = now / duration % 1
+        self.hits = previous * (1 - self.elapsed) + current
+
+    @property
+    def allowed(self):
+        return self.hits <= self.limit
+
+    @property
+    def remaining(self):
+        return max(0, math.floor(self.limit - self.hits))
+
+    def wait(self):
+        '''Seconds until the window has room again, None while it has'''
+        if self.hits < self.limit:
+            return None
+        if self.current < self.limit:
+            # the previous window's share has to fade until the current hits fit next to it
+            fraction = 1 - (self.limit - self.current) / self.previous
+            return (fraction - self.elapsed) * self.duration
+        # into the next window, until this window's share of it has faded enough
+        return (1 - self.elapsed + 1 - self.limit / self.current) * self.duration
+
+    def headers(self):
+        '''The RateLimit-* headers of the IETF draft, describing this window'''
+        wait = self.wait()
+        reset = wait if wait is not None else (1 - self.elapsed) * self.duration
+        return {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(math.ceil(reset)),
+            'RateLimit-Policy': f'{self.limit};w={self.duration}',
+        }
+
+
+def count_hits(key, rate, hit=True, now=None):
+    '''Counts a hit on the rate limit key, or only reads its counters with hit=False, and returns its RateWindow.
+
+    A hit is one atomic increment of the current window's counter plus one read of the previous
+    window's, whatever the number of hits in the window, so throttling costs the same at any rate.
+    '''
+    limit, duration = rate
+    now = time.time() if now is None else now
+    window = int(now // duration)
+    current_key, previous_key = f'{key}:{window}', f'{key}:{window - 1}'
+    cache = get_rate_limit_cache()
+    if hit:
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # first hit of the window, add() keeps a concurrent first hit from being lost. The counter
+            # outlives its window by one, while it is the previous window of the next
+            current = 1 if cache.add(current_key, 1, duration * 2) else cache.incr(current_key)
+        previous = cache.get(previous_key, 0)
+    else:
+        counts = cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+    return RateWindow(limit, duration, previous, current, now)
+
+
+class CounterRateThrottle(BaseThrottle):
+    '''A throttle counting hits with count_hits, rejected ones included so a client hammering away stays out.
+
+    Subclasses give the rate for the request and the key its hits are counted under. The window is
+    left on the request for RateLimitHeadersMiddleware, the one closest to its limit when several are.
+    '''
+    scope = None
+
+    def get_rate(self, request, view):
+        raise NotImplementedError
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_key(request, view)
+        return None if ident is None else f'movie_review:ratelimit:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        rate = parse_rate(self.get_rate(request, view))
+        key = rate and self.get_cache_key(request, view)
+        if not key:
+            return True
+        self.window = count_hits(key, rate)
+        shown = getattr(request._request, 'rate_limit', None)
+        if shown is None or self.window.remaining < shown.remaining:
+            request._request.rate_limit = self.window
+        return self.window.allowed
+
+    def wait(self):
+        return self.window.wait()
+
+
+def rate_limit_ident(request, throttle):
+    '''Whose budget a request is counted against: its token, else its signed in user, else its address'''
+    if request.auth is not None and hasattr(request.auth, 'key'):
+        return hashed_cache_key('token:', request.auth.key)
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'ip:' + throttle.get_ident(request)
+
+
+class RateLimitThrottle(CounterRateThrottle):
+    '''The API wide rate limit, every view's default throttle.
+
+    A view names the RATE_LIMITS scope of each method in `throttle_scopes`, the rest being 'read'
+    for safe methods and 'write' for the others. Within a scope anonymous clients get the 'anon'
+    budget and signed in users the budget of their role.
+    '''
+
+    def allow_request(self, request, view):
+        default = 'read' if request.method in SAFE_METHODS else 'write'
+        self.scope = getattr(view, 'throttle_scopes', {}).get(request.method, default)
+        return super().allow_request(request, view)
+
+    def get_rate(self, request, view):
+        role = request.user.role if request.user and request.user.is_authenticated else 'anon'
+        return settings.RATE_LIMITS.get(self.scope, {}).get(role)
+
+    def get_ident_key(self, request, view):
+        return rate_limit_ident(request, self)
+
+
+class LoginIPThrottle(CounterRateThrottle):
+    '''Login attempts per client address'''
+    scope = 'login_ip'
+
+    def get_rate(self, request, view):
+        return settings.LOGIN_RATE_PER_IP
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginUsernameThrottle(CounterRateThrottle):
+    '''Failed logins per username, from any address.
+
+    Only failures are counted, recorded by the login view with record_failure, so someone
+    logging in with the right password never runs into it.
+    '''
+    scope = 'login_username'
+
+    def get_rate(self, request, view):
+        return settings.LOGIN_FAILURES_PER_USERNAME
+
+    def get_ident_key(self, request, view):
+        username = request.data.get('username')
+        if not isinstance(username, str) or not username:
+            return None
+        # folded so case variants share a window
+        return hashed_cache_key('', username.casefold())
+
+    def allow_request(self, request, view):
+        rate = parse_rate(self.get_rate(request, view))
+        key = rate and self.get_cache_key(request, view)
+        if not key:
+            return True
+        self.window = count_hits(key, rate, hit=False)
+        # the window is full once it holds the limit, nothing is added for this attempt
+        return self.window.hits < self.window.limit
+
+    def record_failure(self, request, view):
+        rate = parse_rate(self.get_rate(request, view))
+        key = rate and self.get_cache_key(request, view)
+        if key:
+            count_hits(key, rate)
+
+
+class RateLimitHeadersMiddleware:
+    '''Adds the RateLimit-* headers of the window a throttle left on the request to its response'''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        window = getattr(request, 'rate_limit', None)
+        if window is not None:
+            for header, value in window.headers().items():
+                response[header] = value
+        return response
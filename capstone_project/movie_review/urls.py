@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from movie_review import views
+from movie_review import views, async_views
 from .views import RegisterAPIView, LoginAPIView, LogoutAPIView, AdminCreateUserAPIView
 
 
@@ -26,9 +26,26 @@ urlpatterns = [
     path('api/auth/login/', LoginAPIView.as_view(), name='login_api'),
     path('api/auth/logout/', LogoutAPIView.as_view(), name='logout_api'),
     path('api/admin/create/', AdminCreateUserAPIView.as_view(), name='create_admin'),
+    path('api/watchlist/', views.WatchlistAPIView.as_view(), name='watchlist'),
+    path('api/feed/', views.FeedAPIView.as_view(), name='feed'),
+    path('api/users/<str:username>/follow/', views.FollowAPIView.as_view(), name='user-follow'),
+    path('api/admin/reviews/export/', views.ReviewExportAPIView.as_view(), name='review-export'),
     path('api/movies/', views.MovieListCreateAPIView.as_view(), name='movie_list_api'),
+    path('api/movies/search/', views.MovieSearchAPIView.as_view(), name='movie-search'),
+    path('api/movies/batch/', views.MovieBatchAPIView.as_view(), name='movie-batch'),
+    path('api/leaderboards/<str:board>/', views.LeaderboardAPIView.as_view(), name='leaderboard'),
     path('api/movies/<str:title>/', views.MovieRetrieveUpdateDestroyAPIView.as_view(), name='movie_detail'),
     path('api/movies/<str:title>/reviews/', views.ReviewListCreateAPIView.as_view(), name='review-list'),
-    path('api/reviews/<int:pk>/', views.ReviewRetrieveUpdateDestroyAPIView.as_view(), name='review-detail')
+    path('api/movies/<str:title>/similar/', views.SimilarMovieListAPIView.as_view(), name='movie-similar'),
+    path('api/reviews/batch/', views.ReviewBatchAPIView.as_view(), name='review-batch'),
+    path('api/reviews/<int:pk>/', views.ReviewRetrieveUpdateDestroyAPIView.as_view(), name='review-detail'),
+    path('api/reviews/<int:pk>/vote/', views.ReviewVoteAPIView.as_view(), name='review-vote'),
+    path('api/reviews/<int:pk>/comments/', views.ReviewCommentListCreateAPIView.as_view(), name='review-comments'),
+    path('api/comments/<int:pk>/', views.ReviewCommentAPIView.as_view(), name='comment-detail'),
+    # async read only versions of the hot read endpoints, for deployments served over ASGI
+    path('api/async/movies/', async_views.AsyncMovieListAPIView.as_view(), name='async-movie-list'),
+    path('api/async/movies/<str:title>/', async_views.AsyncMovieRetrieveAPIView.as_view(), name='async-movie-detail'),
+    path('api/async/movies/<str:title>/reviews/', async_views.AsyncReviewListAPIView.as_view(), name='async-review-list'),
+    path('api/async/reviews/<int:pk>/', async_views.AsyncReviewRetrieveAPIView.as_view(), name='async-review-detail'),
 
 ]
\ No newline at end of file
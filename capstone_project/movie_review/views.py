@@ -1,10 +1,29 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Movie, Review, User
+from django.utils.functional import cached_property
+from .models import LeaderboardEntry, Movie, MovieSimilarity, Review, ReviewComment, User, WatchlistEntry
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import permissions, generics, status
-from .serializers import MovieSerializer, MovieDetailSerializer, ReviewSerializer, RegisterSerializer, UserSerializer
+from .serializers import MovieSerializer, MovieDetailSerializer, ReviewSerializer, RegisterSerializer, UserSerializer, MovieSearchQuerySerializer, MovieListQuerySerializer, ReviewExportQuerySerializer, SimilarMovieSerializer, LeaderboardEntrySerializer, ReviewListQuerySerializer, WatchlistEntrySerializer, WatchlistChangeSerializer, ReviewCommentSerializer, CommentThreadQuerySerializer, FeedReviewSerializer, MovieBatchQuerySerializer, MovieBatchEditSerializer, ReviewBatchDeleteSerializer
+from .pagination import CommentKeysetPagination, FeedKeysetPagination, LeaderboardKeysetPagination, MovieKeysetPagination, ReviewKeysetPagination, WatchlistKeysetPagination
+from .authentication import PasswordHashingBusy
+from .cache import VersionedCacheMixin
+from .comments import add_comment, nest_comments, subtree
+from .feeds import feed_querysets, follow, unfollow
+from .fieldsets import SparseFieldsetViewMixin
+from .rows import RowListMixin
+from .resolver import get_movie, resolve_movie_id
+from .search import search_movies
+from .votes import cast_vote, withdraw_vote
+from .watchlists import add_to_watchlist, remove_from_watchlist
+from .exports import export_reviews
+from .renderers import CSVRenderer, NDJSONRenderer
+from .throttling import LoginIPThrottle, LoginUsernameThrottle
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 
@@ -44,6 +63,30 @@ class IsAdminUserRole(permissions.BasePermission):
     def has_permission(self, request, view):
         return bool(request.user and request.user.is_authenticated and request.user.role == 'admin')
 
+def has_item_permission(permissions, request, view, obj):
+    '''Tells whether the permissions let the request act on obj, exactly as they would on the request for obj alone'''
+    return all(
+        permission.has_permission(request, view) and permission.has_object_permission(request, view, obj)
+        for permission in permissions
+    )
+
+
+def movies_with_review_preview(movies=None):
+    '''The movies, all of them by default, with the latest reviews of each and their users prefetched in one query'''
+    movies = Movie.objects.all() if movies is None else movies
+    preview = Review.objects.select_related('user')[:settings.REVIEW_PREVIEW_SIZE]
+    return movies.prefetch_related(Prefetch('reviews', queryset=preview, to_attr='review_preview'))
+
+
+def movies_for_fieldset(view):
+    '''The movies with only the columns, and the review previews if any, that the fields the view's client picked need'''
+    movies = Movie.objects.all()
+    if 'reviews' in view.requested_fields:
+        movies = movies_with_review_preview(movies)
+    # movies are looked up by their slug or title
+    return view.only_requested_columns(movies, 'title', 'slug')
+
+
 class RegisterAPIView(generics.CreateAPIView):
     serializer_class = RegisterSerializer   # your serializer
     # permission_classes, queryset etc.
@@ -65,11 +108,20 @@ class RegisterAPIView(generics.CreateAPIView):
 class LoginAPIView(APIView):
     '''This view handles User Login'''
     permission_classes = [AllowAny]
+    # checked before the password is, a throttled attempt never gets to hashing
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
 
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
-        user = authenticate(username=username, password=password)
+        try:
+            user = authenticate(request, username=username, password=password)
+        except PasswordHashingBusy:
+            return Response(
+                {'error': 'Too many logins at once, try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'},
+            )
         if user:
             token, created = Token.objects.get_or_create(user=user)
             return Response({
@@ -77,6 +129,7 @@ class LoginAPIView(APIView):
                 'user': UserSerializer(user).data
             })
         else:
+            LoginUsernameThrottle().record_failure(request, self)
             return Response({'error': 'Invalid username or password'}, status=status.HTTP_401_UNAUTHORIZED)
 
 class LogoutAPIView(APIView):
@@ -86,10 +139,46 @@ class LogoutAPIView(APIView):
         request.user.auth_token.delete()
         return Response({'message': 'Logged out successfully'}, status=status.HTTP_200_OK)
 
-class MovieListCreateAPIView(generics.ListCreateAPIView):
-    '''This view lists all the movies available or creates a new movie (only admins)'''
-    queryset = Movie.objects.all()
+class MovieListCreateAPIView(RowListMixin, SparseFieldsetViewMixin, VersionedCacheMixin, generics.ListCreateAPIView):
+    '''This view lists the movies available, filtered and sorted by the query parameters, or creates a new movie (only admins)'''
     serializer_class = MovieSerializer
+    pagination_class = MovieKeysetPagination
+    # each sort order pages on an indexed column with the id as tiebreak
+    SORT_ORDERINGS = {
+        'title': ('title', 'id'),
+        'newest': ('-release_date', '-id'),
+        'top_rated': ('-average_rating', '-id'),
+        'most_reviewed': ('-rating_count', '-id'),
+    }
+
+    @cached_property
+    def list_params(self):
+        '''This function validates the filter and sort query parameters once per request'''
+        params = MovieListQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def get_queryset(self):
+        '''This function narrows the movies down with the filters given in the query parameters'''
+        movies = Movie.objects.all()
+        if self.request.method not in ('GET', 'HEAD'):
+            return movies
+        params = self.list_params
+        if 'genre' in params:
+            movies = movies.filter(genre__iexact=params['genre'])
+        if 'released_after' in params:
+            movies = movies.filter(release_date__gte=params['released_after'])
+        if 'released_before' in params:
+            movies = movies.filter(release_date__lte=params['released_before'])
+        if 'min_rating' in params:
+            movies = movies.filter(rating_count__gt=0, average_rating__gte=params['min_rating'])
+        if 'reviews' in self.requested_fields:
+            movies = movies_with_review_preview(movies)
+        # the cursor of the next page is read from the sort columns of the last movie
+        return self.only_requested_columns(movies, *self.get_keyset_ordering())
+
+    def get_keyset_ordering(self):
+        return self.SORT_ORDERINGS[self.list_params['sort']]
 
     def get_permissions(self):
         '''This function checks whether the user is an admin or memeber depending on the request method'''
@@ -98,11 +187,68 @@ class MovieListCreateAPIView(generics.ListCreateAPIView):
         else:
             return [permissions.AllowAny()]
         
-class MovieRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class MovieSearchAPIView(RowListMixin, SparseFieldsetViewMixin, VersionedCacheMixin, generics.ListAPIView):
+    '''This view searches the movie catalog and lists the matches by relevance, optionally within a genre or release year'''
+    serializer_class = MovieSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        '''This function validates the search parameters and ranks the matching movies'''
+        params = MovieSearchQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        movies = Movie.objects.all()
+        if 'genre' in params.validated_data:
+            movies = movies.filter(genre__iexact=params.validated_data['genre'])
+        if 'year' in params.validated_data:
+            movies = movies.filter(release_date__year=params.validated_data['year'])
+        if 'reviews' in self.requested_fields:
+            movies = movies_with_review_preview(movies)
+        return search_movies(params.validated_data['q'], self.only_requested_columns(movies))
+
+class LeaderboardAPIView(VersionedCacheMixin, generics.ListAPIView):
+    '''This view pages through a leaderboard, top_rated or trending, as last ranked by refresh_leaderboards'''
+    serializer_class = LeaderboardEntrySerializer
+    permission_classes = [AllowAny]
+    pagination_class = LeaderboardKeysetPagination
+
+    def get_queryset(self):
+        '''This function reads one page of the board in rank order together with its movies'''
+        if self.kwargs['board'] not in dict(LeaderboardEntry.BOARD_CHOICES):
+            raise Http404
+        return LeaderboardEntry.objects.filter(board=self.kwargs['board']).select_related('movie')
+
+class MovieLookupMixin:
+    '''Resolves the slug or title of the movie in the URL to its id once per request, through the shared resolver'''
+
+    @cached_property
+    def movie_id(self):
+        return resolve_movie_id(self.kwargs['title'])
+
+    def get_movie_id(self):
+        '''This function returns the movie id, or answers 404 when no movie has the slug or title'''
+        if self.movie_id is None:
+            raise Http404('No Movie matches the given query.')
+        return self.movie_id
+
+
+class MovieRetrieveUpdateDestroyAPIView(
+    SparseFieldsetViewMixin, VersionedCacheMixin, generics.RetrieveUpdateDestroyAPIView
+):
     '''This view retrieves details of a particular movie, and also allows for updating or deleting movies (admin only)'''
-    queryset = Movie.objects.all()
     serializer_class = MovieDetailSerializer
-    lookup_field = 'title'
+    cache_version_scope = 'movie'
+
+    def get_queryset(self):
+        '''This function prefetches the latest reviews of the movie and their users, unless they were left out'''
+        return movies_for_fieldset(self)
+
+    def get_object(self):
+        '''This function reads the movie by its slug or title through the shared resolver, in one query'''
+        movie = get_movie(self.get_queryset(), self.kwargs['title'])
+        if movie is None:
+            raise Http404('No Movie matches the given query.')
+        self.check_object_permissions(self.request, movie)
+        return movie
 
     def get_permissions(self):
         '''This function checks whether a user is admin or member depending on the request method'''
@@ -111,14 +257,128 @@ class MovieRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
         else:
             return [permissions.AllowAny()]
         
-class ReviewListCreateAPIView(generics.ListCreateAPIView):
+class MovieBatchAPIView(RowListMixin, SparseFieldsetViewMixin, VersionedCacheMixin, generics.GenericAPIView):
+    '''This view fetches many movies by id or title in one query (GET), or applies many movie edits at once (PATCH)
+
+    Every movie asked for gets a result with its own status code, in the order it was asked for.
+    Edits are checked one by one against the permissions of the movie detail view and the ones
+    allowed and valid are saved in one transaction.
+    '''
+    serializer_class = MovieDetailSerializer
+    edit_permission_classes = [IsAdminUserRole]
+
+    def get_queryset(self):
+        return movies_for_fieldset(self)
+
+    def get_permissions(self):
+        if self.request.method == 'PATCH':
+            return [IsAuthenticated()]
+        return [AllowAny()]
+
+    def get(self, request, *args, **kwargs):
+        params = MovieBatchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(params.validated_data['id']))
+        keys = list(dict.fromkeys(params.validated_data['title']))
+        movies = self.get_queryset().filter(Q(pk__in=ids) | Q(slug__in=keys) | Q(title__in=keys))
+        rows = self.row_queryset(movies, 'title', 'slug')
+        if rows is not None:
+            rows = list(rows)
+            data = self.requested_serializer.rows_to_representation(rows)
+            found = [(row['id'], row['title'], row['slug']) for row in rows]
+        else:
+            movies = list(movies)
+            data = self.get_serializer(movies, many=True).data
+            found = [(movie.pk, movie.title, movie.slug) for movie in movies]
+        rows = dict(zip([movie_id for movie_id, _, _ in found], data))
+        # a slug wins over a title that happens to read the same
+        by_key = {title: movie_id for movie_id, title, _ in found}
+        by_key.update({slug: movie_id for movie_id, _, slug in found})
+
+        def result(movie_id):
+            if movie_id not in rows:
+                return {'status': status.HTTP_404_NOT_FOUND}
+            return {'status': status.HTTP_200_OK, 'movie': rows[movie_id]}
+
+        return Response({'results': (
+            [{'id': movie_id, **result(movie_id)} for movie_id in ids]
+            + [{'title': key, **result(by_key.get(key))} for key in keys]
+        )})
+
+    def patch(self, request, *args, **kwargs):
+        params = MovieBatchEditSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        edits = params.validated_data['movies']
+        permissions = [permission() for permission in self.edit_permission_classes]
+        results = []
+        with transaction.atomic():
+            movies = Movie.objects.in_bulk([edit['id'] for edit in edits])
+            for edit in edits:
+                movie = movies.get(edit['id'])
+                if movie is None:
+                    results.append({'id': edit['id'], 'status': status.HTTP_404_NOT_FOUND})
+                    continue
+                if not has_item_permission(permissions, request, self, movie):
+                    results.append({'id': movie.pk, 'status': status.HTTP_403_FORBIDDEN})
+                    continue
+                fields = {name: value for name, value in edit.items() if name != 'id'}
+                serializer = MovieSerializer(movie, data=fields, partial=True, context=self.get_serializer_context())
+                if not serializer.is_valid():
+                    results.append({'id': movie.pk, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+                    continue
+                serializer.save()
+                results.append({'id': movie.pk, 'status': status.HTTP_200_OK, 'movie': serializer.data})
+        return Response({'results': results})
+
+class SimilarMovieListAPIView(MovieLookupMixin, VersionedCacheMixin, generics.ListAPIView):
+    '''This view lists the movies rated most like a movie, read from the neighbours refresh_similar_movies stores'''
+    serializer_class = SimilarMovieSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+    cache_version_scope = 'movie'
+
+    def get_queryset(self):
+        '''This function reads the stored neighbours of the movie, best first, in one query'''
+        return (
+            MovieSimilarity.objects.filter(movie_id=self.get_movie_id())
+            .select_related('similar')
+            .order_by('-score', 'similar_id')[:settings.SIMILAR_MOVIES_COUNT]
+        )
+
+class ReviewListCreateAPIView(
+    RowListMixin, SparseFieldsetViewMixin, MovieLookupMixin, VersionedCacheMixin, generics.ListCreateAPIView
+):
     '''This view lists reviews for a movie or lets a member create a review '''
     serializer_class = ReviewSerializer
+    pagination_class = ReviewKeysetPagination
+    cache_version_scope = 'movie'
+    throttle_scopes = {'POST': 'review_write'}
+    # both sort orders page on an index over the movie and the sort column with the id as tiebreak
+    SORT_ORDERINGS = {
+        'newest': ('-created_at', '-id'),
+        'helpful': ('-helpful_votes', '-id'),
+    }
+
+    @cached_property
+    def list_params(self):
+        '''This function validates the sort query parameter once per request'''
+        params = ReviewListQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
 
     def get_queryset(self):
-        '''This function gets the reviews for a movie using the title as a look up'''
-        movie = get_object_or_404(Movie, title=self.kwargs['title'])
-        return Review.objects.filter(movie=movie)
+        '''This function gets the reviews for a movie using its slug or title as a look up'''
+        return self.reviews_of(self.get_movie_id())
+
+    def reviews_of(self, movie_id):
+        '''This function reads the reviews of the movie, joined with their users only when those are shown'''
+        reviews = Review.objects.filter(movie_id=movie_id)
+        if 'user' in self.requested_fields:
+            reviews = reviews.select_related('user')
+        return self.only_requested_columns(reviews, *self.get_keyset_ordering())
+
+    def get_keyset_ordering(self):
+        return self.SORT_ORDERINGS[self.list_params['sort']]
 
     def get_permissions(self):
         '''This function checks for whether a user is a member if they are creating a review'''
@@ -126,15 +386,25 @@ class ReviewListCreateAPIView(generics.ListCreateAPIView):
             return [IsMember()]
         return [AllowAny()]
 
+    def get_serializer_context(self):
+        # the movie comes from the URL, the serializer does not look up one from the body
+        return {**super().get_serializer_context(), 'movie_id': self.movie_id}
+
     def perform_create(self, serializer):
-        '''This function creates a new review for a movie using the title as a look up'''
-        movie = get_object_or_404(Movie, title=self.kwargs['title'])
-        serializer.save(user=self.request.user, movie=movie)
+        '''This function creates a new review for the movie the URL resolved to'''
+        serializer.save(user=self.request.user, movie_id=self.get_movie_id())
 
-class ReviewRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ReviewRetrieveUpdateDestroyAPIView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
     '''This view retrieves reviews for a movie, updates or delete a review (review owner or admin)'''
-    queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    throttle_scopes = {'PUT': 'review_write', 'PATCH': 'review_write'}
+
+    def get_queryset(self):
+        '''This function reads only the columns of the fields asked for, joining the user only when shown'''
+        reviews = Review.objects.all()
+        if 'user' in self.requested_fields:
+            reviews = reviews.select_related('user')
+        return self.only_requested_columns(reviews)
 
     def get_permissions(self):
         '''This function checks for the permissions of a user depending on the request method'''
@@ -144,6 +414,172 @@ class ReviewRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
             return [IsAdminOrReviewOwner()]
         return [AllowAny()]
         
+class CommentThreadMixin:
+    '''Pages through comments depth first and returns every page nested, down to the ?depth= levels asked for'''
+    serializer_class = ReviewCommentSerializer
+    pagination_class = CommentKeysetPagination
+
+    @cached_property
+    def thread_params(self):
+        params = CommentThreadQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def list(self, request, *args, **kwargs):
+        '''This function reads one page of the thread in a single query and nests it'''
+        page = self.paginate_queryset(self.get_thread_queryset())
+        return self.get_paginated_response(nest_comments(self.get_serializer(page, many=True).data))
+
+class ReviewBatchAPIView(APIView):
+    '''This view deletes many reviews in one transaction (DELETE), each one only when the review detail view would.
+
+    Every review asked for gets a result with its own status code, in the order it was asked for.
+    '''
+    permission_classes = [IsAuthenticated]
+    delete_permission_classes = [IsAdminOrReviewOwner]
+
+    def delete(self, request):
+        params = ReviewBatchDeleteSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(params.validated_data['reviews']))
+        permissions = [permission() for permission in self.delete_permission_classes]
+        with transaction.atomic():
+            reviews = Review.objects.select_related('user').in_bulk(ids)
+            statuses = {
+                pk: status.HTTP_204_NO_CONTENT if has_item_permission(permissions, request, self, review)
+                else status.HTTP_403_FORBIDDEN
+                for pk, review in reviews.items()
+            }
+            allowed = [pk for pk, code in statuses.items() if code == status.HTTP_204_NO_CONTENT]
+            Review.objects.filter(pk__in=allowed).delete()
+        return Response({'results': [
+            {'id': pk, 'status': statuses.get(pk, status.HTTP_404_NOT_FOUND)} for pk in ids
+        ]})
+
+class ReviewCommentListCreateAPIView(CommentThreadMixin, generics.ListCreateAPIView):
+    '''This view pages through the comment thread of a review, or lets a user comment or reply'''
+
+    @cached_property
+    def review(self):
+        return get_object_or_404(Review.objects.only('pk'), pk=self.kwargs['pk'])
+
+    def get_thread_queryset(self):
+        '''This function reads the thread from the path index, only down to the requested depth'''
+        comments = ReviewComment.objects.filter(review_id=self.kwargs['pk']).select_related('user')
+        if 'depth' in self.thread_params:
+            comments = comments.filter(depth__lte=self.thread_params['depth'])
+        return comments
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # an empty first page is also what a missing review looks like, only then is the review checked
+        if not response.data['results'] and self.paginator.position is None:
+            get_object_or_404(Review.objects.only('pk'), pk=self.kwargs['pk'])
+        return response
+
+    def get_permissions(self):
+        '''This function checks whether the user is signed in when they are commenting'''
+        if self.request.method == 'POST':
+            return [IsAuthenticated()]
+        return [AllowAny()]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == 'POST':
+            context['review'] = self.review
+        return context
+
+    def perform_create(self, serializer):
+        '''This function saves the comment with its place in the thread'''
+        data = serializer.validated_data
+        serializer.instance = add_comment(self.review, self.request.user, data['body'], data.get('parent'))
+
+class ReviewCommentAPIView(CommentThreadMixin, generics.DestroyAPIView):
+    '''This view pages through a comment with its replies, or deletes it together with them (comment owner or admin)'''
+    queryset = ReviewComment.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    def get_thread_queryset(self):
+        '''This function reads the subtree of the comment as one range of the path index'''
+        root = get_object_or_404(ReviewComment, pk=self.kwargs['pk'])
+        return subtree(root, self.thread_params.get('depth')).select_related('user')
+
+    def get_permissions(self):
+        '''This function checks for the permissions of a user depending on the request method'''
+        if self.request.method == 'DELETE':
+            return [IsAdminOrReviewOwner()]
+        return [AllowAny()]
+
+class ReviewVoteAPIView(APIView):
+    '''This view lets an authenticated user upvote a review with POST or take the upvote back with DELETE'''
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        review = get_object_or_404(Review.objects.only('pk'), pk=pk)
+        created = cast_vote(review, request.user)
+        # the count shown on the review catches up when the vote shards are next folded
+        return Response({'voted': True}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def delete(self, request, pk):
+        review = get_object_or_404(Review.objects.only('pk'), pk=pk)
+        withdraw_vote(review, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class FollowAPIView(APIView):
+    '''This view lets an authenticated user follow another user with POST or unfollow them with DELETE'''
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, username):
+        followed = get_object_or_404(User.objects.only('pk'), username=username)
+        if followed.pk == request.user.pk:
+            return Response({'detail': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        created = follow(request.user, followed)
+        return Response({'following': True}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def delete(self, request, username):
+        followed = get_object_or_404(User.objects.only('pk'), username=username)
+        unfollow(request.user, followed)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class FeedAPIView(generics.ListAPIView):
+    '''This view pages through the reviews of the users the user follows, newest first'''
+    serializer_class = FeedReviewSerializer
+    pagination_class = FeedKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        '''This function pages the feed's rows, then reads the reviews of the page in one query'''
+        rows = self.paginator.paginate_querysets(feed_querysets(request.user), request, view=self)
+        reviews = Review.objects.select_related('user', 'movie').in_bulk([row['review_id'] for row in rows])
+        # a review deleted since the rows were read is left out of the page
+        page = [reviews[row['review_id']] for row in rows if row['review_id'] in reviews]
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+class WatchlistAPIView(generics.ListAPIView):
+    '''This view pages through the user's watchlist, or adds (POST) or removes (DELETE) a batch of movies by title'''
+    serializer_class = WatchlistEntrySerializer
+    pagination_class = WatchlistKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        '''This function reads the user's watchlist together with its movies'''
+        return WatchlistEntry.objects.filter(user=self.request.user).select_related('movie')
+
+    def get_titles(self, request):
+        params = WatchlistChangeSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        return params.validated_data['movies']
+
+    def post(self, request):
+        added, not_found = add_to_watchlist(request.user, self.get_titles(request))
+        return Response({'added': added, 'not_found': not_found})
+
+    def delete(self, request):
+        removed = remove_from_watchlist(request.user, self.get_titles(request))
+        return Response({'removed': removed})
+
 class AdminCreateUserAPIView(generics.CreateAPIView):
     '''This view is to create a new admin (admin only)'''
     queryset = User.objects.all()
@@ -153,5 +589,19 @@ class AdminCreateUserAPIView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(role='admin')
 
-        
+class ReviewExportAPIView(APIView):
+    '''This view streams every review, optionally filtered by movie, user or creation window, as NDJSON or CSV (admin only)'''
+    permission_classes = [IsAdminUserRole]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
 
+    def get(self, request):
+        params = ReviewExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        reviews = params.filter_queryset(Review.objects.all())
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            export_reviews(reviews, export_format, settings.REVIEW_EXPORT_CHUNK_SIZE),
+            content_type=request.accepted_renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="reviews.{export_format}"'
+        return response
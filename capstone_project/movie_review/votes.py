@@ -0,0 +1,82 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .cache import bump_versions
+from .models import Review, ReviewVote, ReviewVoteShard
+
+
+def add_to_vote_shard(review_id, delta):
+    '''Counts a vote change on one of REVIEW_VOTE_SHARDS random counter rows of the review.
+
+    The review row itself is never locked, so voters on a popular review only contend when they
+    pick the same shard. fold_review_votes moves the shard counts onto the review later.
+    '''
+    shard = random.randrange(settings.REVIEW_VOTE_SHARDS)
+    shards = ReviewVoteShard.objects.filter(review_id=review_id, shard=shard)
+    if shards.update(delta=F('delta') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ReviewVoteShard.objects.create(review_id=review_id, shard=shard, delta=delta)
+    except IntegrityError:
+        # another voter created the shard in the meantime
+        shards.update(delta=F('delta') + delta)
+
+
+def cast_vote(review, user):
+    '''Upvotes the review as the user, returns False when the user had already upvoted it'''
+    with transaction.atomic():
+        vote, created = ReviewVote.objects.get_or_create(review=review, user=user)
+    return created
+
+
+def withdraw_vote(review, user):
+    '''Takes back the user's upvote of the review, returns False when there was none'''
+    with transaction.atomic():
+        deleted, _ = ReviewVote.objects.filter(review=review, user=user).delete()
+    return bool(deleted)
+
+
+def _by_pk(values, field):
+    '''A CASE expression adding values[pk] to the field of every row, for a single UPDATE over many rows'''
+    return Case(
+        *[When(pk=pk, then=F(field) + Value(value)) for pk, value in values.items()],
+        default=F(field),
+        output_field=IntegerField(),
+    )
+
+
+def fold_review_votes(batch_size=1000):
+    '''Adds the counts piled up on the vote shards to helpful_votes on their reviews, returns the reviews updated.
+
+    Every shard is decremented by exactly what was folded rather than reset, so votes landing on it
+    meanwhile are kept for the next fold. Each batch of shards is folded in one transaction.
+    '''
+    updated = set()
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            shards = list(
+                ReviewVoteShard.objects.filter(pk__gt=last_id).exclude(delta=0)
+                .order_by('pk').values_list('pk', 'review_id', 'delta')[:batch_size]
+            )
+            if not shards:
+                break
+            totals = defaultdict(int)
+            for pk, review_id, delta in shards:
+                totals[review_id] += delta
+            ReviewVoteShard.objects.filter(pk__in=[pk for pk, _, _ in shards]).update(
+                delta=_by_pk({pk: -delta for pk, _, delta in shards}, 'delta')
+            )
+            reviews = Review.objects.filter(pk__in=totals)
+            reviews.update(helpful_votes=_by_pk(totals, 'helpful_votes'))
+            bump_versions(movie_ids=set(reviews.values_list('movie_id', flat=True)))
+        updated.update(totals)
+        last_id = shards[-1][0]
+    # emptied shards are recreated by the next vote landing on them
+    ReviewVoteShard.objects.filter(delta=0).delete()
+    return updated
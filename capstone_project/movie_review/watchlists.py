@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import delete_now_and_on_commit
+from .models import Movie, WatchlistEntry
+from .routers import replica_may_lag
+
+
+def watchlist_cache_key(user_id):
+    return f'movie_review:watchlist:{user_id}'
+
+
+def watchlist_ids(request):
+    '''The ids of the movies on the requesting user's watchlist, None for anonymous requests.
+
+    The set is read once per request, from the cache when it has it, so flagging every movie of
+    a page costs at most one query however many movies the page lists.
+    '''
+    if request is None or not request.user.is_authenticated:
+        return None
+    ids = getattr(request, '_watchlist_ids', None)
+    if ids is None:
+        key = watchlist_cache_key(request.user.pk)
+        stored = cache.get(key)
+        if stored is None:
+            stored = sorted(WatchlistEntry.objects.filter(user=request.user).values_list('movie_id', flat=True))
+            if not replica_may_lag(key):
+                cache.set(key, stored, settings.WATCHLIST_CACHE_TIMEOUT)
+        ids = request._watchlist_ids = frozenset(stored)
+    return ids
+
+
+def invalidate_watchlist(user_id):
+    delete_now_and_on_commit([watchlist_cache_key(user_id)])
+
+
+def add_to_watchlist(user, titles):
+    '''Adds the movies with the given titles to the user's watchlist, returns (added titles, unknown titles)'''
+    movies = dict(Movie.objects.filter(title__in=titles).values_list('title', 'pk'))
+    with transaction.atomic():
+        present = WatchlistEntry.objects.filter(user=user, movie_id__in=movies.values()).values_list('movie_id', flat=True)
+        present = set(present)
+        added = [title for title, pk in movies.items() if pk not in present]
+        # a concurrent request adding the same movie is not an error, the entry exists either way
+        WatchlistEntry.objects.bulk_create(
+            [WatchlistEntry(user=user, movie_id=movies[title]) for title in added], ignore_conflicts=True,
+        )
+        invalidate_watchlist(user.pk)
+    return added, [title for title in dict.fromkeys(titles) if title not in movies]
+
+
+def remove_from_watchlist(user, titles):
+    '''Removes the movies with the given titles from the user's watchlist, returns how many were on it'''
+    with transaction.atomic():
+        removed, _ = WatchlistEntry.objects.filter(user=user, movie__title__in=titles).delete()
+        invalidate_watchlist(user.pk)
+    return removed